@@ -1,13 +1,20 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+import os
+import subprocess
+import sys
+
 block_cipher = None
 
+# 打包前预编译UI（ui/ui_main_window.py），程序启动时无需再用QUiLoader解析.ui文件
+subprocess.run([sys.executable, os.path.join(SPECPATH, 'tools', 'build_ui.py')], check=False)
+
 a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
     datas=[('ui/main_window.ui', 'ui')],
-    hiddenimports=[],
+    hiddenimports=['ui.ui_main_window'],  # 预编译UI在函数内延迟导入，显式声明
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
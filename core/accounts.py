@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .profile import AccountProfile
+from .proxy import ProxyPool
+
+'''多账号并发抓取：每个账号一个独立会话（浏览器用户数据目录、Cookie、调试端口、代理出口、限速）
+    1.账号之间互不影响：各自启动浏览器，抓取各自的“我的喜欢/我的收藏”（user/self 即该浏览器中登录的账号）
+    2.所有账号同时抓取，总耗时取决于最慢的账号，而不是所有账号耗时之和；同一账号的多个列表依次抓取
+    3.结果按账号标记：AccountResult(account, tab, items, error, seconds)
+    4.每个账号只需登录一次（用户数据目录持久化），之后直接并发抓取；未登录的账号跳过，不影响其他账号
+    账号配置文件（JSON）示例：
+        [{"name": "a", "proxy": "http://1.2.3.4:8080", "request_interval": 1.5},
+         {"name": "b", "port": 9412}]
+    命令行用法：
+        python -m core.accounts login --accounts accounts.json --account a
+        python -m core.accounts crawl --accounts accounts.json --likes --favorites --output result.json
+'''
+
+TABS = ('likes', 'favorites')
+TAB_NAMES = {'likes': '我的喜欢', 'favorites': '我的收藏'}
+BASE_PORT = 9400  # 未指定调试端口的账号从这里开始依次分配
+
+
+class AccountConfig:
+    """单个账号的会话配置"""
+    def __init__(self, name, proxy=None, port=None, request_interval=0, base_dir=None):
+        """
+        :param name: 账号名称，同时作为账号配置目录名（见 AccountProfile）
+        :param proxy: 该账号固定使用的代理地址，为空时从全局代理池按账号分配（未配置代理时直连）
+        :param port: 浏览器调试端口，为空时自动分配；同时运行的账号端口不能相同
+        :param request_interval: 两次加载列表页之间的最小间隔（秒），0表示不限
+        """
+        self.name = name
+        self.proxy = proxy
+        self.port = port
+        self.request_interval = request_interval
+        self.base_dir = base_dir
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data.get('name'):
+            raise ValueError(f"账号配置缺少name: {data}")
+        return cls(name=str(data['name']), proxy=data.get('proxy'), port=data.get('port'),
+                   request_interval=float(data.get('request_interval') or 0), base_dir=data.get('base_dir'))
+
+
+def load_accounts(path):
+    """读取账号配置文件，返回 [AccountConfig]"""
+    with open(path, 'r', encoding='utf-8') as f:
+        accounts = [AccountConfig.from_dict(data) for data in json.load(f)]
+    names = [account.name for account in accounts]
+    if len(set(names)) != len(names):
+        raise ValueError("账号配置中有重复的name")
+    return accounts
+
+
+class AccountResult:
+    """一个账号一个列表的抓取结果"""
+    def __init__(self, account, tab, items=None, error=None, seconds=0.0):
+        self.account = account
+        self.tab = tab
+        self.items = items or []
+        self.error = error
+        self.seconds = seconds
+
+    def to_dict(self):
+        return {
+            'account': self.account,
+            'tab': self.tab,
+            'error': self.error,
+            'seconds': round(self.seconds, 2),
+            'items': [{'aweme_id': item.aweme_id, 'title': item.title, 'url': item.url, 'data_size': item.data_size,
+                       'cover': item.cover} for item in self.items],
+        }
+
+
+class MultiAccountCrawler:
+    """多账号并发抓取喜欢/收藏，每个账号在独立线程中使用独立的爬虫实例"""
+    def __init__(self, accounts, export_dir=None, spider_factory=None):
+        """
+        :param accounts: [AccountConfig]
+        :param export_dir: 元数据导出目录，每个账号导出到 {账号名}.jsonl，为空时不导出
+        :param spider_factory: 创建爬虫的函数 spider_factory(account, port)，默认按账号配置创建 DouyinSpider
+        """
+        self.accounts = list(accounts)
+        self.export_dir = export_dir
+        self.spider_factory = spider_factory or self._create_spider
+        self.spiders = {}  # {账号名: 爬虫}
+        self._lock = threading.Lock()
+        self._cancelled = False
+
+    def _create_spider(self, account, port):
+        from .spider import DouyinSpider
+        proxy_pool = ProxyPool([account.proxy], strategy='sticky') if account.proxy else None
+        spider = DouyinSpider(profile=AccountProfile(account.name, account.base_dir), port=port,
+                              proxy_pool=proxy_pool)
+        spider.request_interval = account.request_interval
+        if self.export_dir:
+            os.makedirs(self.export_dir, exist_ok=True)
+            spider.export_path = os.path.join(self.export_dir, f"{account.name}.jsonl")
+        return spider
+
+    def spider(self, account):
+        """账号对应的爬虫（第一次使用时创建）"""
+        with self._lock:
+            if account.name not in self.spiders:
+                port = account.port or BASE_PORT + self.accounts.index(account)
+                spider = self.spider_factory(account, port)
+                # 抓取失败时抛出异常，结果中记录为该账号的错误，而不是“成功抓取0个视频”
+                spider.raise_errors = True
+                self.spiders[account.name] = spider
+            return self.spiders[account.name]
+
+    def crawl(self, tabs=TABS):
+        """所有账号同时抓取，返回 [AccountResult]（按账号配置顺序）"""
+        self._cancelled = False
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, len(self.accounts))) as executor:
+            futures = [executor.submit(self._crawl_account, account, tabs) for account in self.accounts]
+            try:
+                results = [result for future in futures for result in future.result()]
+            except KeyboardInterrupt:
+                self.cancel()
+                raise
+        wall = time.monotonic() - start
+        busy = sum(result.seconds for result in results)
+        print(f"🏁 {len(self.accounts)} 个账号抓取完成，共 {sum(len(r.items) for r in results)} 个视频，"
+              f"总用时 {wall:.1f}秒（各账号累计 {busy:.1f}秒）")
+        return results
+
+    def _crawl_account(self, account, tabs):
+        spider = self.spider(account)
+        spider.cancel_flag = False
+        try:
+            # 先用保存的Cookie判断，无效时从用户数据目录启动浏览器再确认一次
+            logged_in = spider.ensure_login(headless=True)
+            error = None if logged_in else "未登录"
+        except Exception as e:
+            error = f"检查登录状态失败: {e}"
+        if error:
+            spider.close_browser()
+            print(f"⚠️ [{account.name}] {error}，已跳过（请先运行 login 登录该账号）")
+            return [AccountResult(account.name, tab, error=error) for tab in tabs]
+        results = []
+        for tab in tabs:
+            if self._cancelled:
+                break
+            start = time.monotonic()
+            try:
+                items = spider.get_likes_videos() if tab == 'likes' else spider.get_favorites_videos()
+                result = AccountResult(account.name, tab, items, seconds=time.monotonic() - start)
+            except Exception as e:
+                result = AccountResult(account.name, tab, error=str(e), seconds=time.monotonic() - start)
+            if result.error:
+                print(f"❌ [{account.name}] {TAB_NAMES[tab]} 抓取失败: {result.error}")
+            else:
+                print(f"✅ [{account.name}] {TAB_NAMES[tab]}: {len(result.items)} 个视频，用时 {result.seconds:.1f}秒")
+            results.append(result)
+        return results
+
+    def cancel(self):
+        """取消所有账号的抓取"""
+        self._cancelled = True
+        with self._lock:
+            spiders = list(self.spiders.values())
+        for spider in spiders:
+            spider.cancel_token.cancel()
+
+
+def login(account, timeout=300):
+    """打开账号的浏览器供手动登录，检测到登录后保存Cookie并关闭浏览器，返回是否登录成功"""
+    crawler = MultiAccountCrawler([account])
+    spider = crawler.spider(account)
+    try:
+        spider.create_browser(False)
+        spider.page.get('https://www.douyin.com/')
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if spider.check_login_status():
+                print(f"✅ 账号 {account.name} 已登录")
+                return True
+            time.sleep(2)
+        print(f"⚠️ 账号 {account.name} 登录超时")
+        return False
+    finally:
+        spider.close_browser()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多账号并发抓取喜欢/收藏")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    login_parser = sub.add_parser('login', help="打开浏览器登录一个账号")
+    login_parser.add_argument('--accounts', required=True, help="账号配置文件（JSON）")
+    login_parser.add_argument('--account', required=True, help="要登录的账号名称")
+    login_parser.add_argument('--timeout', type=float, default=300, help="等待登录的秒数")
+
+    crawl = sub.add_parser('crawl', help="所有账号同时抓取")
+    crawl.add_argument('--accounts', required=True, help="账号配置文件（JSON）")
+    crawl.add_argument('--likes', action='store_true', help="抓取我的喜欢")
+    crawl.add_argument('--favorites', action='store_true', help="抓取我的收藏")
+    crawl.add_argument('--export', help="元数据导出目录（每个账号一个 .jsonl 文件）")
+    crawl.add_argument('--output', help="把按账号标记的结果保存为JSON")
+    crawl.add_argument('--headless', action='store_true', help="使用无头浏览器抓取")
+
+    args = parser.parse_args()
+    accounts = load_accounts(args.accounts)
+    if args.command == 'login':
+        account = next((account for account in accounts if account.name == args.account), None)
+        if account is None:
+            parser.error(f"账号配置中没有 {args.account}")
+        login(account, args.timeout)
+        return
+    tabs = tuple(tab for tab in TABS if getattr(args, tab)) or TABS
+    crawler = MultiAccountCrawler(accounts, export_dir=args.export)
+    if args.headless:
+        for account in accounts:
+            crawler.spider(account).headless = True
+    results = crawler.crawl(tabs)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump([result.to_dict() for result in results], f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
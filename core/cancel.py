@@ -0,0 +1,66 @@
+import threading
+
+
+class CancelToken:
+    """取消令牌：在线程之间传递取消信号，并能打断正在进行的阻塞等待
+        1.cancel() 设置取消状态，同时执行所有已登记的回调（关闭响应流、退出浏览器等）
+        2.sleep() 代替 time.sleep()，取消时立即醒来并抛出 InterruptedError
+        3.register() 登记取消回调，用于释放套接字、浏览器等资源
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        """是否已取消"""
+        return self._event.is_set()
+
+    def cancel(self):
+        """触发取消，回调只会执行一次"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        # 回调在锁外执行，避免回调内部再调用register/unregister时死锁
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"执行取消回调出错: {e}")
+
+    def raise_if_cancelled(self):
+        """已取消则抛出 InterruptedError"""
+        if self._event.is_set():
+            raise InterruptedError("操作已取消")
+
+    def sleep(self, seconds):
+        """可被取消打断的等待，取消时立即抛出 InterruptedError"""
+        if self._event.wait(seconds):
+            raise InterruptedError("操作已取消")
+
+    def wait(self, seconds):
+        """可被取消打断的等待，返回值表示是否已取消（不抛异常）"""
+        return self._event.wait(seconds)
+
+    def register(self, callback):
+        """登记取消回调；如果已经取消，则立即执行"""
+        with self._lock:
+            if not self._event.is_set():
+                # 同一回调只登记一次（例如浏览器被重复创建时）
+                if callback not in self._callbacks:
+                    self._callbacks.append(callback)
+                return callback
+        callback()
+        return callback
+
+    def unregister(self, callback):
+        """移除取消回调（资源已正常释放时调用）"""
+        with self._lock:
+            try:
+                self._callbacks.remove(callback)
+            except ValueError:
+                pass
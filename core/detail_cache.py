@@ -0,0 +1,184 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from .export import aweme_record
+from .links import canonical_key
+from .models import VideoItem
+from .refresh import play_url_expiry
+
+'''单个视频详情的本地缓存（SQLite文件）
+    解析单个视频需要启动浏览器并等待详情接口，几分钟前解析过的视频再解析一次也要等好几秒；
+    这里把解析结果按视频ID缓存，链接（包括短链接）记录为别名，再次解析时直接从磁盘读取，不启动浏览器
+    1.元数据（标题、作者、统计等）缓存 ttl 秒；播放地址带签名很快过期，单独判断：
+      地址过期（按地址中的过期时间，没有时按 play_ttl）后视为未命中，重新抓取并更新缓存
+    2.总大小超过 max_bytes 时按最近访问时间淘汰（LRU），过期条目在写入时顺带清理
+    3.统计命中/未命中/播放地址过期/淘汰次数，见 stats()
+'''
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.douyin_downloader', 'detail_cache.db')
+
+
+class DetailCache:
+    """视频详情缓存，线程安全、多进程安全"""
+    def __init__(self, path=None, ttl=7 * 24 * 3600, play_ttl=1800, play_margin=300, max_bytes=64 * 1024 * 1024):
+        """
+        :param ttl: 元数据有效期（秒）
+        :param play_ttl: 地址中没有过期时间时，播放地址的有效期（秒）
+        :param play_margin: 播放地址距离过期不足多少秒时视为已过期（留出下载时间）
+        :param max_bytes: 缓存数据总大小上限（字节）
+        """
+        self.path = path or DEFAULT_PATH
+        self.ttl = ttl
+        self.play_ttl = play_ttl
+        self.play_margin = play_margin
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'play_expired': 0, 'evictions': 0}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS details (
+                    aweme_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    fetched REAL NOT NULL,
+                    play_expires REAL NOT NULL,
+                    accessed REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_details_accessed ON details(accessed);
+                CREATE TABLE IF NOT EXISTS aliases (
+                    key TEXT PRIMARY KEY,
+                    aweme_id TEXT NOT NULL
+                );
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    @staticmethod
+    def _key(url):
+        kind, value = canonical_key(url)
+        return kind, f"{kind}:{value}"
+
+    def _lookup_id(self, conn, url_or_id):
+        if str(url_or_id).isdigit():
+            return str(url_or_id)
+        kind, key = self._key(url_or_id)
+        if kind == 'video':
+            return key.split(':', 1)[1]
+        row = conn.execute("SELECT aweme_id FROM aliases WHERE key = ?", (key,)).fetchone()
+        return row['aweme_id'] if row else None
+
+    def _load(self, url_or_id):
+        """读取未过期的缓存条目，返回 (数据, 播放地址是否有效) 或 None"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            aweme_id = self._lookup_id(conn, url_or_id)
+            row = conn.execute("SELECT * FROM details WHERE aweme_id = ?", (aweme_id,)).fetchone() if aweme_id else None
+            if row is None:
+                return None
+            if row['fetched'] + self.ttl <= now:
+                conn.execute("DELETE FROM details WHERE aweme_id = ?", (aweme_id,))
+                return None
+            conn.execute("UPDATE details SET accessed = ? WHERE aweme_id = ?", (now, aweme_id))
+        return json.loads(row['data']), row['play_expires'] - self.play_margin > now
+
+    def get(self, url_or_id):
+        """按链接或视频ID取可直接下载的视频（元数据和播放地址都有效），否则返回None"""
+        entry = self._load(url_or_id)
+        if entry is None:
+            self._count('misses')
+            return None
+        data, play_valid = entry
+        if not play_valid:
+            # 元数据仍有效，但播放地址已过期，需要重新抓取
+            self._count('play_expired')
+            return None
+        self._count('hits')
+        return VideoItem(url=data['url'], title=data['title'], aweme_id=data['aweme_id'], data_size=data['data_size'],
+                         cover=data.get('cover'))
+
+    def get_record(self, url_or_id):
+        """按链接或视频ID取完整元数据记录（与导出格式相同），不要求播放地址有效"""
+        entry = self._load(url_or_id)
+        return entry[0]['record'] if entry else None
+
+    def put(self, video_info, item, urls=()):
+        """缓存一个视频的详情
+            :param video_info: 详情接口返回的 aweme_detail
+            :param item: 从中解析出的 VideoItem
+            :param urls: 指向该视频的链接（如输入的短链接），记录为别名
+        """
+        if not item.aweme_id:
+            return
+        aweme_id = str(item.aweme_id)
+        now = time.time()
+        data = json.dumps({
+            'aweme_id': aweme_id,
+            'title': item.title,
+            'url': item.url,
+            'data_size': item.data_size,
+            'cover': item.cover,
+            'record': aweme_record(video_info),
+        }, ensure_ascii=False)
+        play_expires = play_url_expiry(item.url) or now + self.play_ttl
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO details (aweme_id, data, size, fetched, play_expires, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (aweme_id, data, len(data.encode('utf-8')), now, play_expires, now)
+            )
+            for url in urls:
+                kind, key = self._key(url)
+                if kind != 'video':
+                    conn.execute("INSERT OR REPLACE INTO aliases (key, aweme_id) VALUES (?, ?)", (key, aweme_id))
+        self.evict()
+
+    def evict(self):
+        """清理过期条目，总大小超过上限时按最近访问时间淘汰"""
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = conn.execute("DELETE FROM details WHERE fetched <= ?", (time.time() - self.ttl,)).rowcount
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM details").fetchone()[0]
+                if total > self.max_bytes:
+                    excess = total - self.max_bytes
+                    victims = []
+                    for row in conn.execute("SELECT aweme_id, size FROM details ORDER BY accessed"):
+                        if excess <= 0:
+                            break
+                        victims.append((row['aweme_id'],))
+                        excess -= row['size']
+                    conn.executemany("DELETE FROM details WHERE aweme_id = ?", victims)
+                    removed += len(victims)
+                if removed:
+                    # 指向已删除条目的别名一并清理
+                    conn.execute("DELETE FROM aliases WHERE aweme_id NOT IN (SELECT aweme_id FROM details)")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if removed:
+            self._count('evictions', removed)
+
+    def stats(self):
+        """返回统计 {hits, misses, play_expired, evictions, hit_rate, entries, bytes}"""
+        with self._lock:
+            result = dict(self._counters)
+        lookups = result['hits'] + result['misses'] + result['play_expired']
+        result['hit_rate'] = result['hits'] / lookups if lookups else 0.0
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM details").fetchone()
+        result['entries'], result['bytes'] = row[0], row[1]
+        return result
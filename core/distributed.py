@@ -0,0 +1,445 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+
+from .cancel import CancelToken
+from .links import canonical_key, canonical_url
+from .models import VideoItem
+
+'''分布式抓取/下载协调：协调者把任务放进任务队列，多个工作进程（可以在不同机器上）租用任务、发送心跳、上报结果
+    任务类型：
+        profile    —— 用户主页，抓取后展开为多个 video 任务
+        collection —— 我的收藏/我的喜欢（payload中的tab为 favorites/likes），同样展开为 video 任务
+        video      —— 下载单个视频，以 aweme_id 作为唯一键，重复添加/重复完成都是幂等的
+    任务存储可替换（TaskStore），默认提供 SqliteTaskStore，单机多进程或共享目录下即可使用，也方便离线测试
+    命令行用法：
+        python -m core.distributed add --db tasks.db 链接1 链接2 ...
+        python -m core.distributed add --db tasks.db --favorites --likes
+        python -m core.distributed worker --db tasks.db --save-path D:/videos --port 9333
+        python -m core.distributed stats --db tasks.db
+'''
+
+TASK_KINDS = ('profile', 'collection', 'video')
+
+
+class Task:
+    """任务数据模型"""
+    def __init__(self, task_id, kind, key, payload, attempts=0):
+        self.id = task_id
+        self.kind = kind
+        self.key = key
+        self.payload = payload
+        self.attempts = attempts
+
+
+class TaskStore:
+    """任务存储接口，自定义存储（如Redis、数据库服务）实现以下方法即可"""
+    def add_task(self, kind, key, payload):
+        """添加任务，key相同的任务只会存在一个；返回是否新增"""
+        raise NotImplementedError
+
+    def lease(self, worker_id, kinds=TASK_KINDS, limit=1, lease_seconds=120, max_attempts=3):
+        """租用最多limit个待处理（或租约已过期）的任务，返回 [Task]
+            租约过期（工作进程崩溃）同样计入尝试次数，已达到 max_attempts 的过期任务标记为失败，不再重新分配
+        """
+        raise NotImplementedError
+
+    def heartbeat(self, task_id, worker_id, lease_seconds=120):
+        """延长租约，返回False表示租约已丢失（任务已被其他工作进程接手）"""
+        raise NotImplementedError
+
+    def complete(self, task_id, worker_id, result=None):
+        """标记任务完成，返回False表示租约已丢失"""
+        raise NotImplementedError
+
+    def fail(self, task_id, worker_id, error, max_attempts=3):
+        """标记任务失败，未超过最大尝试次数时重新变为待处理"""
+        raise NotImplementedError
+
+    def record_item(self, aweme_id, worker_id, result=None):
+        """记录视频已完成（幂等），返回是否是第一次记录"""
+        raise NotImplementedError
+
+    def is_item_done(self, aweme_id):
+        raise NotImplementedError
+
+    def stats(self):
+        """返回 {状态: 数量}"""
+        raise NotImplementedError
+
+
+class SqliteTaskStore(TaskStore):
+    """基于SQLite文件的任务存储，多进程安全（租用任务在写事务中完成）"""
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL UNIQUE,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    lease_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    updated REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, kind);
+                CREATE TABLE IF NOT EXISTS done_items (
+                    aweme_id TEXT PRIMARY KEY,
+                    worker TEXT,
+                    result TEXT,
+                    finished REAL
+                );
+            """)
+
+    def _connect(self):
+        # 每次操作使用独立连接，连接不跨线程共享；timeout为等待其他进程释放写锁的时间
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def add_task(self, kind, key, payload):
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO tasks (kind, key, payload, updated) VALUES (?, ?, ?, ?)",
+                (kind, key, json.dumps(payload, ensure_ascii=False), time.time())
+            )
+            return cursor.rowcount > 0
+
+    def lease(self, worker_id, kinds=TASK_KINDS, limit=1, lease_seconds=120, max_attempts=3):
+        now = time.time()
+        placeholders = ','.join('?' * len(kinds))
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE 立即获取写锁，保证同一个任务不会被两个工作进程同时租到
+            conn.execute("BEGIN IMMEDIATE")
+            # 每次执行都让工作进程崩溃的任务不能无限循环：租约过期且尝试次数已用完时标记为失败
+            conn.execute(
+                f"UPDATE tasks SET status = 'failed', error = ?, worker = NULL, updated = ? "
+                f"WHERE kind IN ({placeholders}) AND status = 'running' AND lease_until < ? AND attempts >= ?",
+                ("租约多次过期（工作进程可能在执行时崩溃）", now, *kinds, now, max_attempts)
+            )
+            rows = conn.execute(
+                f"SELECT id, kind, key, payload, attempts FROM tasks "
+                f"WHERE kind IN ({placeholders}) AND (status = 'pending' OR (status = 'running' AND lease_until < ?)) "
+                f"ORDER BY id LIMIT ?",
+                (*kinds, now, limit)
+            ).fetchall()
+            for row in rows:
+                conn.execute(
+                    "UPDATE tasks SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1, updated = ? "
+                    "WHERE id = ?",
+                    (worker_id, now + lease_seconds, now, row['id'])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return [Task(row['id'], row['kind'], row['key'], json.loads(row['payload']), row['attempts'] + 1)
+                for row in rows]
+
+    def _update_owned(self, task_id, worker_id, sql, params):
+        """只更新仍由该工作进程持有的任务，返回是否更新成功"""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                sql + " WHERE id = ? AND worker = ? AND status = 'running'",
+                (*params, task_id, worker_id)
+            )
+            return cursor.rowcount > 0
+
+    def heartbeat(self, task_id, worker_id, lease_seconds=120):
+        now = time.time()
+        return self._update_owned(task_id, worker_id, "UPDATE tasks SET lease_until = ?, updated = ?",
+                                  (now + lease_seconds, now))
+
+    def complete(self, task_id, worker_id, result=None):
+        return self._update_owned(task_id, worker_id, "UPDATE tasks SET status = 'done', result = ?, updated = ?",
+                                  (json.dumps(result, ensure_ascii=False), time.time()))
+
+    def fail(self, task_id, worker_id, error, max_attempts=3):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT attempts FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            status = 'failed' if row and row['attempts'] >= max_attempts else 'pending'
+        return self._update_owned(task_id, worker_id, "UPDATE tasks SET status = ?, error = ?, worker = NULL, updated = ?",
+                                  (status, str(error), time.time()))
+
+    def record_item(self, aweme_id, worker_id, result=None):
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO done_items (aweme_id, worker, result, finished) VALUES (?, ?, ?, ?)",
+                (str(aweme_id), worker_id, json.dumps(result, ensure_ascii=False), time.time())
+            )
+            return cursor.rowcount > 0
+
+    def is_item_done(self, aweme_id):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT 1 FROM done_items WHERE aweme_id = ?", (str(aweme_id),)).fetchone() is not None
+
+    def stats(self):
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT kind, status, COUNT(*) AS n FROM tasks GROUP BY kind, status").fetchall()
+            done_items = conn.execute("SELECT COUNT(*) FROM done_items").fetchone()[0]
+        result = {f"{row['kind']}:{row['status']}": row['n'] for row in rows}
+        result['done_items'] = done_items
+        return result
+
+
+class Coordinator:
+    """协调者：把链接/收藏/喜欢转换为任务放入任务存储"""
+    def __init__(self, store):
+        self.store = store
+
+    def submit_url(self, url):
+        """提交一个视频或用户主页链接（需为解析后的长链接），返回是否新增"""
+        kind, value = canonical_key(url)
+        if kind == 'video':
+            # 单个视频页面：先抓取详情得到播放地址，因此按profile同样的流程由工作进程展开
+            return self.store.add_task('profile', f'page:{value}', {'url': canonical_url(url)})
+        if kind == 'user':
+            return self.store.add_task('profile', f'user:{value}', {'url': canonical_url(url)})
+        raise ValueError(f"不支持的链接: {url}")
+
+    def submit_collection(self, tab, account='default'):
+        """提交我的收藏(favorites)/我的喜欢(likes)任务"""
+        if tab not in ('favorites', 'likes'):
+            raise ValueError(f"不支持的列表: {tab}")
+        return self.store.add_task('collection', f'{account}:{tab}', {'tab': tab, 'account': account})
+
+    def submit_videos(self, video_items):
+        """提交视频下载任务，以aweme_id去重，返回新增数量"""
+        added = 0
+        for video in video_items:
+            key = f'video:{video.aweme_id or video.url}'
+            payload = {'url': video.url, 'title': video.title, 'aweme_id': video.aweme_id,
+                       'data_size': video.data_size}
+            if self.store.add_task('video', key, payload):
+                added += 1
+        return added
+
+
+class Worker:
+    """工作进程：循环租用任务并执行，执行期间后台线程定时发送心跳，租约丢失时取消当前任务"""
+    def __init__(self, store, save_path, worker_id=None, kinds=TASK_KINDS, spider_factory=None,
+                 lease_seconds=120, batch_size=4, idle_exit=None):
+        """
+        :param spider_factory: 创建爬虫实例的函数，默认 DouyinSpider()
+        :param batch_size: 一次租用的下载任务数量（并发下载）
+        :param idle_exit: 连续空闲多少秒后退出，None表示一直运行
+        """
+        self.store = store
+        self.save_path = save_path
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.kinds = kinds
+        self.spider_factory = spider_factory
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self.idle_exit = idle_exit
+        self.max_attempts = 3  # 任务最多尝试次数（执行失败和租约过期都计入）
+        self.coordinator = Coordinator(store)
+        self.cancel_token = CancelToken()
+        self._spider = None
+
+    @property
+    def spider(self):
+        if self._spider is None:
+            if self.spider_factory:
+                self._spider = self.spider_factory()
+            else:
+                from .spider import DouyinSpider
+                self._spider = DouyinSpider()
+            # 抓取失败时抛出异常（而不是返回空列表），任务才会按失败重试，不会被当作0个视频完成
+            self._spider.raise_errors = True
+        return self._spider
+
+    def stop(self):
+        """停止工作进程（当前任务会被中断，租约到期后由其他工作进程重新执行）"""
+        self.cancel_token.cancel()
+
+    def run(self):
+        print(f"🚀 工作进程 {self.worker_id} 启动")
+        idle_since = time.monotonic()
+        while not self.cancel_token.cancelled:
+            # 优先处理展开类任务（抓取），再处理下载任务
+            tasks = self.store.lease(self.worker_id, [k for k in self.kinds if k != 'video'], 1, self.lease_seconds,
+                                     self.max_attempts)
+            if not tasks and 'video' in self.kinds:
+                tasks = self.store.lease(self.worker_id, ['video'], self.batch_size, self.lease_seconds,
+                                         self.max_attempts)
+            if not tasks:
+                if self.idle_exit is not None and time.monotonic() - idle_since > self.idle_exit:
+                    break
+                self.cancel_token.wait(2)
+                continue
+            idle_since = time.monotonic()
+            self._run_tasks(tasks)
+        print(f"🛑 工作进程 {self.worker_id} 退出")
+
+    def _run_tasks(self, tasks):
+        """执行一组任务，期间定时发送心跳"""
+        lost = threading.Event()
+        finished = threading.Event()
+        cancel_callbacks = []
+
+        def heartbeat():
+            while not finished.wait(self.lease_seconds / 3):
+                for task in tasks:
+                    if not self.store.heartbeat(task.id, self.worker_id, self.lease_seconds):
+                        print(f"⚠️ 任务 {task.key} 的租约已丢失，中断执行")
+                        lost.set()
+                        for callback in cancel_callbacks:
+                            callback()
+                        return
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            if tasks[0].kind == 'video':
+                self._download(tasks, cancel_callbacks)
+            else:
+                for task in tasks:
+                    self._expand(task, cancel_callbacks)
+        finally:
+            finished.set()
+            thread.join()
+
+    def _expand(self, task, cancel_callbacks):
+        """执行抓取任务，把抓到的视频作为下载任务放回队列"""
+        spider = self.spider
+        spider.cancel_flag = False
+        cancel_callbacks.append(spider.cancel_token.cancel)
+        try:
+            if task.kind == 'collection':
+                if task.payload['tab'] == 'favorites':
+                    items = spider.get_favorites_videos()
+                else:
+                    items = spider.get_likes_videos()
+            elif canonical_key(task.payload['url'])[0] == 'video':
+                items = spider.get_single_video(task.payload['url'])
+            else:
+                items = spider.get_user_videos(task.payload['url'])
+            if spider.cancel_flag:
+                return
+            # 已完成的视频不再重复加入队列
+            items = [item for item in items if not (item.aweme_id and self.store.is_item_done(item.aweme_id))]
+            added = self.coordinator.submit_videos(items)
+            self.store.complete(task.id, self.worker_id, {'videos': len(items), 'added': added})
+            print(f"✅ {task.key}: 抓取到 {len(items)} 个视频，新增下载任务 {added} 个")
+        except Exception as e:
+            if spider.cancel_flag:
+                # 租约丢失或工作进程停止，任务由租约过期后重新分配
+                return
+            print(f"❌ {task.key} 执行失败: {e}")
+            self.store.fail(task.id, self.worker_id, e, self.max_attempts)
+
+    def _download(self, tasks, cancel_callbacks):
+        """批量执行下载任务，完成结果按aweme_id幂等记录"""
+        from .downloader import Downloader
+        from .refresh import PlayUrlRefresher
+
+        pending = []
+        for task in tasks:
+            aweme_id = task.payload.get('aweme_id')
+            if aweme_id and self.store.is_item_done(aweme_id):
+                # 其他工作进程已完成该视频（例如本任务租约曾过期被重新分配）
+                self.store.complete(task.id, self.worker_id, {'skipped': True})
+            else:
+                pending.append(task)
+        if not pending:
+            return
+        videos = [VideoItem(url=t.payload['url'], title=t.payload['title'], aweme_id=t.payload.get('aweme_id'),
+                            data_size=t.payload.get('data_size')) for t in pending]
+        # 下载任务可能在队列中等待了很久，播放地址过期时由本进程的爬虫刷新
+        self.spider.cancel_flag = False
+        refresher = PlayUrlRefresher(self.spider.refresh_videos, cancel=self.spider.cancel_token.cancel)
+        downloader = Downloader(videos, self.save_path, refresher=refresher)
+        cancel_callbacks.append(downloader.cancel)
+        self.cancel_token.register(downloader.cancel)
+        errors = []
+        downloader.error.connect(errors.append)
+        try:
+            # 在当前线程中同步执行下载（不启动QThread）
+            downloader.run()
+        finally:
+            self.cancel_token.unregister(downloader.cancel)
+        for task, video in zip(pending, videos):
+            success, file_path = downloader.results.get(video.aweme_id or video.url, (False, None))
+            if success:
+                if video.aweme_id:
+                    self.store.record_item(video.aweme_id, self.worker_id, {'file': file_path})
+                self.store.complete(task.id, self.worker_id, {'file': file_path})
+            elif not downloader.cancel_flag:
+                self.store.fail(task.id, self.worker_id, errors[0] if errors else "下载失败", self.max_attempts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分布式抓取/下载")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    add = sub.add_parser('add', help="添加任务")
+    add.add_argument('--db', required=True, help="任务数据库文件")
+    add.add_argument('--favorites', action='store_true', help="添加我的收藏")
+    add.add_argument('--likes', action='store_true', help="添加我的喜欢")
+    add.add_argument('--account', default='default', help="收藏/喜欢所属账号")
+    add.add_argument('urls', nargs='*', help="视频或用户主页长链接")
+
+    worker = sub.add_parser('worker', help="运行工作进程")
+    worker.add_argument('--db', required=True, help="任务数据库文件")
+    worker.add_argument('--save-path', required=True, help="视频保存目录，或 s3://bucket/前缀 直接上传到对象存储")
+    worker.add_argument('--kinds', default=','.join(TASK_KINDS), help="处理的任务类型，逗号分隔")
+    worker.add_argument('--port', type=int, help="浏览器调试端口（同一台机器多个工作进程时需不同）")
+    worker.add_argument('--profile', default='default', help="账号配置名称")
+    worker.add_argument('--batch-size', type=int, default=4, help="一次租用的下载任务数")
+    worker.add_argument('--idle-exit', type=float, help="空闲多少秒后退出")
+    worker.add_argument('--export', help="抓取时逐条导出视频元数据的文件（.jsonl/.csv/.parquet）")
+    worker.add_argument('--headless', action='store_true', help="抓取时使用无头浏览器（没有显示器的服务器）")
+
+    stats = sub.add_parser('stats', help="查看任务统计")
+    stats.add_argument('--db', required=True, help="任务数据库文件")
+
+    args = parser.parse_args()
+    store = SqliteTaskStore(args.db)
+    if args.command == 'add':
+        coordinator = Coordinator(store)
+        added = sum(coordinator.submit_url(url) for url in args.urls)
+        if args.favorites:
+            added += coordinator.submit_collection('favorites', args.account)
+        if args.likes:
+            added += coordinator.submit_collection('likes', args.account)
+        print(f"新增任务 {added} 个")
+    elif args.command == 'worker':
+        from .profile import AccountProfile
+        from .spider import DouyinSpider
+        profile = AccountProfile(args.profile)
+
+        def spider_factory():
+            spider = DouyinSpider(profile=profile, port=args.port)
+            spider.export_path = args.export
+            if args.headless:
+                spider.headless = True
+            return spider
+
+        Worker(
+            store, args.save_path, kinds=tuple(k for k in args.kinds.split(',') if k in TASK_KINDS),
+            spider_factory=spider_factory,
+            batch_size=args.batch_size, idle_exit=args.idle_exit
+        ).run()
+    else:
+        for name, count in sorted(store.stats().items()):
+            print(f"{name}: {count}")
+
+
+if __name__ == '__main__':
+    main()
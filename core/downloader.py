@@ -1,6 +1,18 @@
 import requests
 from PySide6.QtCore import QThread, Signal
 import os
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .cancel import CancelToken
+from .integrity import IntegrityError, IntegrityIndex, StreamVerifier, verify_file
+from .filenames import FilenamePlanner
+from .storage import create_sink
+from .refresh import EXPIRED_STATUS, is_expired
+from .ratelimit import bandwidth_limiter
+from .proxy import proxy_pool as default_proxy_pool, is_proxy_failure
 
 
 class Downloader(QThread):
@@ -8,68 +20,336 @@ class Downloader(QThread):
     progress = Signal(int, int, bool)  # 当前序号, 总数, 是否成功
     finished = Signal(int)  # 参数为成功下载的数量
     error = Signal(str) # 参数为错误信息
+    postprocess_progress = Signal(int, int, str)  # 后处理已完成数, 总数, 说明（任务、文件、耗时）
 
-    def __init__(self, video_items, save_path):
+    HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Referer': 'https://www.douyin.com/',
+        'Accept': '*/*',
+        'Connection': 'keep-alive'
+    }
+    ORDERS = ('original', 'smallest', 'largest')  # 下载顺序：原顺序 / 小文件优先 / 大文件优先
+
+    def __init__(self, video_items, save_path, order='original', chunk_size=1024 * 1024,
+                 reserve_bytes=200 * 1024 * 1024, prefetch_workers=8, max_workers=3, limiter=None, retries=2,
+                 profile=None, proxy_pool=None, sink=None, postprocessor=None, refresher=None):
+        """
+        :param order: 下载顺序，见 ORDERS（并发下载时为开始下载的顺序）
+        :param chunk_size: 每次读取/写入的块大小（字节），大块可减少系统调用次数
+        :param reserve_bytes: 下载完成后磁盘至少保留的剩余空间（字节）
+        :param prefetch_workers: 预取文件大小时的并发数
+        :param max_workers: 同时下载的文件数
+        :param limiter: 带宽限速器，默认使用全局共享的 bandwidth_limiter
+        :param retries: 校验失败或传输中断的文件重新排队下载的次数
+        :param profile: 账号配置 AccountProfile，下载请求会带上其中保存的Cookie
+        :param proxy_pool: 代理出口池，默认使用全局共享的 proxy_pool（未配置代理时直连）
+        :param sink: 存储后端，默认按 save_path 创建（s3:// 开头为对象存储，否则为本地目录）
+        :param postprocessor: 下载后处理 PostProcessor，每下载完成一个文件就提交处理（只支持本地保存）
+        :param refresher: 播放地址刷新器 PlayUrlRefresher，下载前刷新即将过期的地址，收到403/410时强制刷新后重试
+        """
         super().__init__()
         self.video_items = video_items
         self.save_path = save_path
-        self.cancel_flag = False
+        self.order = order if order in self.ORDERS else 'original'
+        self.chunk_size = chunk_size
+        self.reserve_bytes = reserve_bytes
+        self.prefetch_workers = prefetch_workers
+        self.max_workers = max(1, max_workers)
+        self.limiter = limiter or bandwidth_limiter
+        self.retries = retries
+        self.index = None  # 保存目录的校验索引，run()开始时加载
+        self.profile = profile
+        self.proxy_pool = proxy_pool or default_proxy_pool
+        self.sink = sink
+        self._own_sink = None  # 由下载器自己创建的存储后端，结束时关闭
+        self.postprocessor = postprocessor
+        self.refresher = refresher
+        self.results = {}  # 每个视频的下载结果 {视频ID(没有时为视频地址): (是否成功, 文件路径)}
+        self.cancel_token = CancelToken()  # 取消令牌，取消时会立即关闭正在传输的响应流
+        if refresher and refresher.cancel:
+            self.cancel_token.register(refresher.cancel)
+        self.timeout = (10, 15)  # (连接超时, 读取超时)，保证阻塞读取有上限
+
+    @property
+    def cancel_flag(self):
+        """取消标志（兼容旧接口）"""
+        return self.cancel_token.cancelled
 
     def run(self):
         """执行下载任务"""
         success_count = 0
-        total = len(self.video_items)
-        # failed_items = []
-        
-        for i,video in enumerate(self.video_items):
+        # 复用同一个会话（连接池），取消时关闭会话释放所有套接字
+        session = requests.Session()
+        if self.profile:
+            self.profile.apply_to_session(session)
+        self.cancel_token.register(session.close)
+        try:
+            if self.sink is None:
+                self.sink = self._own_sink = create_sink(self.save_path)
+            self.index = IntegrityIndex(self.sink.state_dir)
+            # 规划阶段：预取大小、检查磁盘空间、确定下载顺序
+            plan = self._plan(session)
+        except Exception as e:
+            # 包括磁盘/网络错误，以及对象存储的配置和访问错误
+            self.cancel_token.unregister(session.close)
+            session.close()
+            self._close_sink()
+            if not self.cancel_flag:
+                self.error.emit(str(e))
+            return
+        total = len(plan)
+        done_count = 0
+        postprocessor = self._start_postprocessor()
+        lock = threading.Lock()
+        # 任务队列：(视频, 文件路径, 预计大小, 是否已完整下载, 已尝试次数)，校验失败的文件会重新放回队尾
+        tasks = queue.Queue()
+        for video, file_path, size, complete in plan:
+            tasks.put((video, file_path, size, complete, 0))
+        if self.refresher:
+            self.refresher.track([video for video, _, _, complete in plan if not complete])
+
+        def worker():
+            nonlocal done_count, success_count
+            while not self.cancel_flag:
+                try:
+                    video, file_path, size, complete, attempts = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                success = False
+                try:
+                    # 规划阶段已确认文件存在且校验通过,则跳过下载
+                    if complete:
+                        success = True
+                    else:
+                        if self.refresher:
+                            # 地址即将过期时在下载前刷新（连同其他即将过期的视频一起）
+                            self.refresher.ensure_fresh(video)
+                        success = self._download_file(session, video.url, self.HEADERS, file_path, size,
+                                                      video.aweme_id)
+                except (IntegrityError, requests.RequestException) as e:
+                    if self._is_url_expired(e) and self.refresher and self.refresher.ensure_fresh(video, force=True):
+                        # 地址过期，刷新后重新排队，不计入重试次数
+                        print(f"🔄 {video.title} 播放地址已过期，刷新后重新下载")
+                        tasks.put((video, file_path, size, False, attempts))
+                        continue
+                    if not self.cancel_flag and attempts < self.retries:
+                        print(f"⚠️ {video.title} 下载不完整({e})，重新排队（第{attempts + 1}次重试）")
+                        tasks.put((video, file_path, size, False, attempts + 1))
+                        continue
+                    print(f"下载失败 {video.title}: {e}")
+                except Exception as e:
+                    # 可以选择记录错误日志
+                    print(f"下载失败 {video.title}: {e}")
+                # 取消导致的中断不算失败，也不再更新进度
+                if self.cancel_flag:
+                    return
+                if self.refresher:
+                    self.refresher.finish(video)
+                if success and postprocessor:
+                    # 交给后处理进程池，与后续文件的下载同时进行
+                    postprocessor.submit(file_path)
+                with lock:
+                    done_count += 1
+                    if success:
+                        success_count += 1
+                    current = done_count
+                    self.results[video.aweme_id or video.url] = (success, file_path)
+                # 更新进度 - 成功/失败
+                self.progress.emit(current, total, success)
+
+        try:
+            # 多个文件并发下载，总带宽由共享的限速器控制
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for _ in range(self.max_workers):
+                    executor.submit(worker)
+        finally:
+            self.cancel_token.unregister(session.close)
+            session.close()
+            self._save_index()
+            self._close_sink()
+            if postprocessor:
+                # 等待后处理结束再通知完成；取消时丢弃还没开始的处理任务
+                postprocessor.close(cancel=self.cancel_flag)
+        self.finished.emit(success_count)
+
+    @staticmethod
+    def _is_url_expired(error):
+        """下载错误是否说明播放地址已过期（CDN返回403/410）"""
+        response = getattr(error, 'response', None)
+        return isinstance(error, requests.HTTPError) and response is not None \
+            and response.status_code in EXPIRED_STATUS
+
+    def _start_postprocessor(self):
+        if not self.postprocessor:
+            return None
+        if not self.sink.is_local:
+            print("⚠️ 下载后处理只支持保存到本地目录，已跳过")
+            return None
+
+        def report(done, total, result):
+            status = "完成" if result['ok'] else "失败"
+            name = os.path.basename(result['source'] or '')
+            self.postprocess_progress.emit(done, total, f"{result['task']} {status}（{result['seconds']:.1f}秒）{name}")
+
+        self.postprocessor.progress = report
+        return self.postprocessor.start()
+
+    def _close_sink(self):
+        if self._own_sink:
+            self._own_sink.close()
+            self.sink = self._own_sink = None
+
+    def _save_index(self):
+        try:
+            self.index.save()
+        except OSError as e:
+            print(f"保存校验索引失败: {e}")
+
+    def _is_complete(self, planner, name):
+        """文件是否已完整下载：查目录扫描索引，校验索引中校验通过则直接信任；
+            存在但没有校验记录（旧版本下载的文件）或已被修改时，用mmap校验一次并记录结果
+        """
+        if not planner.exists(name):
+            return False
+        if not self.sink.is_local:
+            # 对象存储中的文件只有在下载校验通过后才会提交，存在即完整
+            return True
+        file_path = self.sink.location(name)
+        if self.index.is_verified(file_path, planner.stat(name)):
+            return True
+        try:
+            result = verify_file(file_path)
+        except OSError as e:
+            print(f"校验已存在的文件失败: {e}")
+            return False
+        self.index.record(file_path, result)
+        if not result['ok']:
+            print(f"⚠️ 已存在的文件校验失败，将重新下载: {os.path.basename(file_path)}（{result['error']}）")
+        return result['ok']
+
+    def _plan(self, session):
+        """下载规划：返回 [(视频, 文件路径, 预计大小, 是否已完整下载)]
+            1.扫描一次保存目录，为每个视频分配不冲突的文件名，并判断是否已下载
+            2.预取待下载文件的大小（优先使用抖音数据中的 data_size，没有则发HEAD请求）
+            3.检查目标磁盘剩余空间是否足够，不够时在下载前就报错，而不是下到一半磁盘写满
+            4.按设定的顺序排列
+        """
+        files = None if self.sink.is_local else self.sink.list_files()
+        planner = FilenamePlanner(self.save_path, self.index, files)
+        plan = []
+        for video in self.video_items:
+            name = planner.plan(video)
+            plan.append((video, self.sink.location(name), self._is_complete(planner, name)))
+        # 已完整下载的文件不需要下载，也不需要预取大小
+        pending = [(video, path) for video, path, complete in plan if not complete]
+
+        def fetch_size(video):
+            if getattr(video, 'data_size', None):
+                return video.data_size
             if self.cancel_flag:
-                break
+                return None
+            proxy = self.proxy_pool.acquire(video.aweme_id or video.url)
+            start = time.monotonic()
             try:
-                # 更新进度 - 开始下载
-                self.progress.emit(i, total, False)
-                
-                # 下载逻辑
-                url = video.url
-                file_path = os.path.join(self.save_path, f"{video.title}.mp4")
-
-                # 检查文件是否已存在,已存在则跳过下载
-                if os.path.exists(file_path):
-                    success_count += 1
-                    self.progress.emit(i + 1, total, True)
-                    continue
-
-                
-                # 下载视频内容
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                    'Referer': 'https://www.douyin.com/',
-                    'Accept': '*/*',
-                    'Connection': 'keep-alive'
-                }
-
-                # 创建临时文件路径
-                response = requests.get(url, stream=True, headers=headers)
-                response.raise_for_status()
-                
-                # 写入文件
-                with open(file_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                success_count += 1
-                
-                # 更新进度 - 成功
-                self.progress.emit(i+1, total, True)
-                
-            except Exception as e:
-                # 更新进度 - 失败
-                self.progress.emit(i+1, total, False)
-                # 可以选择记录错误日志
-                
-        self.finished.emit(success_count)
+                response = session.head(video.url, headers=self.HEADERS, allow_redirects=True, timeout=self.timeout,
+                                        proxies=proxy.requests_proxies if proxy else None)
+                self.proxy_pool.report(proxy, not is_proxy_failure(response), time.monotonic() - start)
+                length = response.headers.get('Content-Length')
+                return int(length) if response.ok and length else None
+            except (requests.RequestException, ValueError) as e:
+                if isinstance(e, requests.RequestException):
+                    self.proxy_pool.report(proxy, False)
+                print(f"预取文件大小失败: {e}")
+                return None
 
-    def cancel(self):
-        """取消下载"""
-        self.cancel_flag = True
-    
+        with ThreadPoolExecutor(max_workers=self.prefetch_workers) as executor:
+            sizes = dict(zip((id(video) for video, _ in pending),
+                             executor.map(fetch_size, [video for video, _ in pending])))
 
-            
\ No newline at end of file
+        required = sum(size or 0 for size in sizes.values())
+        unknown = sum(1 for size in sizes.values() if not size)
+        if not self.sink.is_local:
+            # 直接上传到对象存储，不占用本地磁盘
+            print(f"📋 下载规划: 待下载 {len(pending)} 个，预计 {required / 1024 / 1024:.1f}MB"
+                  f"（{unknown} 个大小未知），直接上传到 {self.sink.location('')}")
+            free = None
+        else:
+            free = shutil.disk_usage(self.save_path).free
+            print(f"📋 下载规划: 待下载 {len(pending)} 个，预计 {required / 1024 / 1024:.1f}MB"
+                  f"（{unknown} 个大小未知），剩余空间 {free / 1024 / 1024:.1f}MB")
+        if free is not None and required + self.reserve_bytes > free:
+            raise OSError(
+                f"磁盘空间不足：预计需要 {required / 1024 / 1024:.1f}MB，"
+                f"剩余 {free / 1024 / 1024:.1f}MB（需保留 {self.reserve_bytes / 1024 / 1024:.0f}MB）"
+            )
+
+        plan = [(video, path, sizes.get(id(video)), complete) for video, path, complete in plan]
+        if self.order != 'original':
+            # 大小未知的排在最后；sort是稳定排序，大小相同时保持原顺序
+            reverse = self.order == 'largest'
+            plan.sort(key=lambda entry: (entry[2] is None, -(entry[2] or 0) if reverse else (entry[2] or 0)))
+        return plan
+
+    def _download_file(self, session, url, headers, file_path, size=None, aweme_id=None):
+        """下载单个文件并同步校验，返回False表示被取消，校验失败抛出IntegrityError（不完整的文件会被删除）"""
+        # 按视频分配出口（sticky模式下同一个视频的重试固定走同一个代理，直到该代理被淘汰）
+        proxy = self.proxy_pool.acquire(aweme_id or url)
+        start = time.monotonic()
+        try:
+            response = session.get(url, stream=True, headers=headers, timeout=self.timeout,
+                                   proxies=proxy.requests_proxies if proxy else None)
+        except requests.RequestException:
+            if not self.cancel_flag:
+                self.proxy_pool.report(proxy, False)
+            raise
+        # 响应头到达的时间作为该出口的延迟
+        # 签名过期的地址返回403不是出口的问题，不计入代理失败
+        self.proxy_pool.report(proxy, not is_proxy_failure(response) or is_expired(url),
+                               time.monotonic() - start)
+        # 取消时直接关闭响应，打断正在阻塞的读取
+        self.cancel_token.register(response.close)
+        completed = False
+        try:
+            response.raise_for_status()
+            length = response.headers.get('Content-Length')
+            expected = int(length) if length and length.isdigit() else None
+            size = expected or size
+            # 写入时同步计算哈希、核对长度、检查MP4结构，不需要写完后再读一遍
+            verifier = StreamVerifier(expected)
+            # 写入存储后端（本地文件缓冲区与块大小一致；对象存储按分片边下载边上传）
+            writer = self.sink.open_writer(os.path.basename(file_path), size, buffering=self.chunk_size)
+            try:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if self.cancel_flag:
+                        return False
+                    # 按全局限速等待令牌，取消时立即中断
+                    self.limiter.consume(len(chunk), self.cancel_token)
+                    writer.write(chunk)
+                    verifier.update(chunk)
+                if self.cancel_flag:
+                    return False
+                result = verifier.result()
+                if result['ok']:
+                    # 校验通过才提交，对象存储中的文件在提交前对外不可见
+                    writer.commit()
+                    completed = True
+                self.index.record(file_path, result, aweme_id)
+                if not completed:
+                    raise IntegrityError(result['error'])
+                return completed
+            finally:
+                # 失败或取消时丢弃不完整的文件，避免下次被“已存在”检查误判为成功
+                if not completed:
+                    writer.abort()
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+            # 传输中途断开/超时也计入该出口的失败
+            if not self.cancel_flag:
+                self.proxy_pool.report(proxy, False)
+            raise
+        finally:
+            self.cancel_token.unregister(response.close)
+            response.close()
+
+    def cancel(self):
+        """取消下载，立即中断当前传输"""
+        self.cancel_token.cancel()
@@ -0,0 +1,206 @@
+import csv
+import json
+import os
+import threading
+import time
+
+'''视频元数据流式导出：抓取时每解析一条视频数据就写出一条，不需要把整个列表保存在内存中
+    支持格式（按文件扩展名选择）：
+        .jsonl   —— 每行一个JSON对象，追加写入
+        .csv     —— 固定列，嵌套字段（清晰度列表）以JSON字符串保存，追加写入
+        .parquet —— 列式存储，按行组分批写入（需要安装 pyarrow），每次抓取生成一个新文件
+'''
+
+# 导出字段（CSV列顺序、Parquet字段顺序）
+FIELDS = [
+    'aweme_id', 'desc', 'create_time', 'duration',
+    'author_uid', 'author_sec_uid', 'author_nickname',
+    'digg_count', 'comment_count', 'share_count', 'collect_count', 'play_count',
+    'width', 'height', 'ratio', 'data_size', 'play_url', 'cover_url',
+    'music_id', 'music_title', 'variants', 'exported_at',
+]
+
+
+def _first_url(addr):
+    urls = (addr or {}).get('url_list') or []
+    return urls[0] if urls else None
+
+
+def cover_url(video_info):
+    """列表缩略图使用的封面地址：优先 cover（尺寸较小），没有时使用 origin_cover"""
+    video = video_info.get('video') or {}
+    return _first_url(video.get('cover')) or _first_url(video.get('origin_cover'))
+
+
+def aweme_record(video_info):
+    """把接口返回的一条aweme数据整理为扁平的导出记录"""
+    video = video_info.get('video') or {}
+    play_addr = video.get('play_addr') or {}
+    author = video_info.get('author') or {}
+    stats = video_info.get('statistics') or {}
+    music = video_info.get('music') or {}
+    variants = []
+    for bit_rate in video.get('bit_rate') or []:
+        addr = bit_rate.get('play_addr') or {}
+        variants.append({
+            'gear_name': bit_rate.get('gear_name'),
+            'quality_type': bit_rate.get('quality_type'),
+            'bit_rate': bit_rate.get('bit_rate'),
+            'width': addr.get('width'),
+            'height': addr.get('height'),
+            'data_size': addr.get('data_size'),
+            'url': _first_url(addr),
+        })
+    play_urls = play_addr.get('url_list') or []
+    return {
+        'aweme_id': str(video_info.get('aweme_id') or ''),
+        'desc': video_info.get('desc'),
+        'create_time': video_info.get('create_time'),
+        'duration': video.get('duration') or video_info.get('duration'),
+        'author_uid': str(author.get('uid') or ''),
+        'author_sec_uid': author.get('sec_uid'),
+        'author_nickname': author.get('nickname'),
+        'digg_count': stats.get('digg_count'),
+        'comment_count': stats.get('comment_count'),
+        'share_count': stats.get('share_count'),
+        'collect_count': stats.get('collect_count'),
+        'play_count': stats.get('play_count'),
+        'width': play_addr.get('width') or video.get('width'),
+        'height': play_addr.get('height') or video.get('height'),
+        'ratio': video.get('ratio'),
+        'data_size': play_addr.get('data_size'),
+        'play_url': next((url for url in play_urls if 'v3-web.douyinvod.com' in url), play_urls[0] if play_urls else None),
+        'cover_url': _first_url(video.get('origin_cover')) or _first_url(video.get('cover')),
+        'music_id': str(music.get('id') or ''),
+        'music_title': music.get('title'),
+        'variants': variants,
+        'exported_at': int(time.time()),
+    }
+
+
+class MetadataExporter:
+    """导出器基类：write()线程安全，close()后再写入会被忽略"""
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def write(self, record):
+        with self._lock:
+            if self._closed:
+                return
+            self._write(record)
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._close()
+        print(f"💾 已导出 {self.count} 条元数据到 {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write(self, record):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+
+class JsonlExporter(MetadataExporter):
+    def __init__(self, path):
+        super().__init__(path)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def _close(self):
+        self._file.close()
+
+
+class CsvExporter(MetadataExporter):
+    def __init__(self, path):
+        super().__init__(path)
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        # utf-8-sig 让Excel能正确识别中文
+        self._file = open(path, 'a', encoding='utf-8-sig' if is_new else 'utf-8', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDS, extrasaction='ignore')
+        if is_new:
+            self._writer.writeheader()
+
+    def _write(self, record):
+        row = dict(record)
+        row['variants'] = json.dumps(row['variants'], ensure_ascii=False)
+        self._writer.writerow(row)
+
+    def _close(self):
+        self._file.close()
+
+
+class ParquetExporter(MetadataExporter):
+    """Parquet导出：缓存 row_group_size 条记录后写出一个行组，内存占用与总条数无关"""
+    def __init__(self, path, row_group_size=5000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("导出Parquet需要安装pyarrow: pip install pyarrow")
+        # Parquet文件不能追加，已存在时生成带时间戳的新文件
+        if os.path.exists(path):
+            root, ext = os.path.splitext(path)
+            path = f"{root}-{time.strftime('%Y%m%d-%H%M%S')}{ext}"
+        super().__init__(path)
+        self._pa = pa
+        self.row_group_size = row_group_size
+        variant_type = pa.struct([
+            ('gear_name', pa.string()), ('quality_type', pa.int64()), ('bit_rate', pa.int64()),
+            ('width', pa.int64()), ('height', pa.int64()), ('data_size', pa.int64()), ('url', pa.string()),
+        ])
+        types = {
+            'create_time': pa.int64(), 'duration': pa.int64(),
+            'digg_count': pa.int64(), 'comment_count': pa.int64(), 'share_count': pa.int64(),
+            'collect_count': pa.int64(), 'play_count': pa.int64(),
+            'width': pa.int64(), 'height': pa.int64(), 'data_size': pa.int64(),
+            'variants': pa.list_(variant_type), 'exported_at': pa.int64(),
+        }
+        self._schema = pa.schema([(name, types.get(name, pa.string())) for name in FIELDS])
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._buffer = []
+
+    def _write(self, record):
+        self._buffer.append(record)
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            table = self._pa.Table.from_pylist(self._buffer, schema=self._schema)
+            self._writer.write_table(table)
+            self._buffer = []
+
+    def _close(self):
+        self._flush()
+        self._writer.close()
+
+
+EXPORTERS = {
+    '.jsonl': JsonlExporter,
+    '.csv': CsvExporter,
+    '.parquet': ParquetExporter,
+}
+
+
+def create_exporter(path):
+    """按扩展名创建导出器"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in EXPORTERS:
+        raise ValueError(f"不支持的导出格式: {ext}，支持 {', '.join(EXPORTERS)}")
+    return EXPORTERS[ext](path)
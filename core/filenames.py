@@ -0,0 +1,120 @@
+import os
+import re
+
+'''文件名规划
+    1.清理标题中的非法字符，并按UTF-8字节数截断（Linux文件名上限是255字节，中文一个字占3字节，按字符数截断会超限）
+    2.启动时扫描一次保存目录建立内存索引，之后“是否已下载”的判断都是O(1)查表，不再逐个调用os.path.exists
+    3.标题重复时在文件名后追加视频ID，避免不同视频互相覆盖/被误判为已下载；没有视频ID时追加序号
+    4.文件名冲突按不区分大小写比较（Windows上 Hello.mp4 和 hello.mp4 是同一个文件）
+'''
+
+MAX_NAME_BYTES = 240  # 文件名（含扩展名）最大字节数，比255留一些余量
+EXTENSION = '.mp4'
+
+# 预编译的清理规则：非法字符/控制字符替换为下划线，结尾的空格和点在Windows上会被去掉
+INVALID_CHARS_PATTERN = re.compile(r'[\\/:*?"<>|!\n#\x00-\x1f]')
+TRAILING_PATTERN = re.compile(r'[\s.]+$')
+RESERVED_NAME_PATTERN = re.compile(r'^(CON|PRN|AUX|NUL|COM\d|LPT\d)$', re.IGNORECASE)
+# 带视频ID后缀的文件名，如 "标题_7312345678901234567.mp4"
+ID_SUFFIX_PATTERN = re.compile(r'_(\d{15,})\.mp4$', re.IGNORECASE)
+
+
+def truncate_bytes(text, max_bytes):
+    """按UTF-8字节数截断，不会截断半个字符"""
+    encoded = text.encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return text
+    return encoded[:max_bytes].decode('utf-8', 'ignore')
+
+
+def sanitize_title(title, max_bytes=MAX_NAME_BYTES - len(EXTENSION)):
+    """清理标题中的非法字符并按字节数截断，结果可直接作为文件名主体"""
+    title = INVALID_CHARS_PATTERN.sub('_', title or '')
+    title = TRAILING_PATTERN.sub('', truncate_bytes(title, max_bytes))
+    if RESERVED_NAME_PATTERN.match(title):
+        title = '_' + title
+    return title
+
+
+class FilenamePlanner:
+    """保存目录的文件名规划器：一次扫描目录，之后在内存中分配文件名、判断是否已存在"""
+    def __init__(self, directory, index=None, files=None):
+        """
+        :param directory: 保存目录
+        :param index: 校验索引 IntegrityIndex，其中记录了文件对应的视频ID
+        :param files: 已知的文件列表 {文件名: 大小}（如对象存储中的文件），为空时扫描保存目录
+        """
+        self.directory = directory
+        if files is not None:
+            self._entries = dict(files)
+        else:
+            # 只扫描一次目录，DirEntry会缓存stat结果（Windows上不需要额外的系统调用）
+            self._entries = {}
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_file():
+                        self._entries[entry.name] = entry
+        self._folded = {name.casefold(): name for name in self._entries}  # 不区分大小写的文件名 -> 实际文件名
+        # 视频ID -> 文件名，来源：文件名中的ID后缀 + 校验索引中记录的ID
+        self._by_id = {}
+        self._owner = {}  # 文件名(casefold) -> 视频ID（本次已分配或已知的，没有视频ID的视频为None）
+        for name in self._entries:
+            match = ID_SUFFIX_PATTERN.search(name)
+            if match:
+                self._claim(name, match.group(1))
+        if index is not None:
+            for name, aweme_id in index.aweme_ids().items():
+                if name in self._entries:
+                    self._claim(name, aweme_id)
+
+    def _claim(self, name, aweme_id):
+        """记录文件名归属，aweme_id为空表示分配给了没有视频ID的视频"""
+        if aweme_id:
+            self._by_id[str(aweme_id)] = name
+        self._owner[name.casefold()] = str(aweme_id) if aweme_id else None
+
+    def exists(self, name):
+        """文件是否存在（查内存索引）"""
+        return name in self._entries
+
+    def stat(self, name):
+        """返回扫描时缓存的stat结果，文件不存在或不是本地文件时返回None"""
+        entry = self._entries.get(name)
+        return entry.stat() if isinstance(entry, os.DirEntry) else None
+
+    def have(self, aweme_id):
+        """该视频是否已有对应文件（O(1)）"""
+        name = self._by_id.get(str(aweme_id)) if aweme_id else None
+        return name is not None and name in self._entries
+
+    def plan(self, video):
+        """为视频分配文件名：已有文件的视频沿用原文件名，标题冲突时追加视频ID后缀"""
+        aweme_id = str(video.aweme_id) if video.aweme_id else None
+        if aweme_id and aweme_id in self._by_id:
+            return self._by_id[aweme_id]
+
+        base = sanitize_title(video.title) or aweme_id or 'video'
+        # 只是大小写不同的旧文件在Windows上就是同一个文件，沿用旧文件的实际文件名
+        name = self._folded.get((base + EXTENSION).casefold(), base + EXTENSION)
+        # 没有记录归属的同名旧文件，按原来的规则视为同一个视频（兼容旧版本下载的文件）
+        if name.casefold() not in self._owner:
+            self._claim(name, aweme_id)
+            return name
+
+        if not aweme_id:
+            # 没有视频ID的同名视频：追加序号，不同视频不共用一个文件
+            number = 2
+            while True:
+                suffix = f'_{number}{EXTENSION}'
+                name = sanitize_title(video.title, MAX_NAME_BYTES - len(suffix.encode('utf-8'))) + suffix
+                name = self._folded.get(name.casefold(), name)
+                if name.casefold() not in self._owner:
+                    self._claim(name, None)
+                    return name
+                number += 1
+
+        # 同名文件属于另一个视频：追加视频ID后缀
+        suffix = f'_{aweme_id}{EXTENSION}'
+        name = sanitize_title(video.title, MAX_NAME_BYTES - len(suffix.encode('utf-8'))) + suffix
+        self._claim(name, aweme_id)
+        return name
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+
+'''下载文件完整性校验
+    1.边下载边校验：在写入循环中同步计算SHA-256、核对Content-Length、检查MP4顶层box结构(ftyp/moov/mdat)，无需二次读取文件
+    2.校验结果记录在保存目录下的索引文件中，已存在的文件只有校验通过才会被跳过
+    3.校验文件库：使用mmap重新检查已下载的文件，命令行用法：python -m core.integrity 保存目录
+'''
+
+INDEX_FILE_NAME = '.douyin_verify.json'
+
+
+class IntegrityError(Exception):
+    """文件校验失败"""
+    pass
+
+
+class Mp4BoxChecker:
+    """增量式MP4顶层box结构检查，数据可以任意切块喂入"""
+    def __init__(self):
+        self.boxes = []  # 已识别的顶层box类型（按出现顺序）
+        self.error = None
+        self._position = 0  # 已喂入的总字节数
+        self._next_box = 0  # 下一个box头所在位置
+        self._header = b''  # 跨块的box头缓冲
+        self._to_end = False  # 最后一个box声明延伸到文件末尾(size=0)
+
+    def feed(self, chunk):
+        """喂入一块数据"""
+        view = memoryview(chunk)
+        end = self._position + len(view)
+        while not self.error and not self._to_end and self._next_box < end:
+            offset = max(self._next_box - self._position, 0)
+            # box头最长16字节（8字节基本头 + 8字节扩展大小），可能跨越多个数据块
+            need = 16 - len(self._header)
+            self._header += bytes(view[offset:offset + need])
+            if len(self._header) < 8:
+                break
+            size, box_type = struct.unpack('>I4s', self._header[:8])
+            if size == 1:
+                if len(self._header) < 16:
+                    break
+                size = struct.unpack('>Q', self._header[8:16])[0]
+                header_size = 16
+            else:
+                header_size = 8
+            if not all(32 <= c < 127 for c in box_type):
+                self.error = f"偏移 {self._next_box} 处的box类型无效"
+                break
+            self.boxes.append(box_type.decode('ascii'))
+            if size == 0:
+                self._to_end = True
+            elif size < header_size:
+                self.error = f"{box_type.decode('ascii')} box大小无效: {size}"
+            else:
+                self._next_box += size
+            self._header = b''
+        self._position = end
+
+    def finish(self):
+        """数据全部喂入后检查整体结构，返回错误信息，没有问题返回None"""
+        if self.error:
+            return self.error
+        if self._header or (not self._to_end and self._next_box != self._position):
+            return f"文件被截断：最后一个box应结束于 {self._next_box}，实际大小 {self._position}"
+        if not self.boxes or self.boxes[0] != 'ftyp':
+            return "缺少ftyp头，不是有效的MP4文件"
+        if 'moov' not in self.boxes:
+            return "缺少moov box"
+        if 'mdat' not in self.boxes and 'moof' not in self.boxes:
+            return "缺少mdat box"
+        return None
+
+
+class StreamVerifier:
+    """写入循环中的同步校验器：滚动哈希 + 长度核对 + MP4结构检查"""
+    def __init__(self, expected_size=None):
+        self.expected_size = expected_size
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._mp4 = Mp4BoxChecker()
+
+    def update(self, chunk):
+        self.size += len(chunk)
+        self._hash.update(chunk)
+        self._mp4.feed(chunk)
+
+    def result(self):
+        """返回校验结果字典 {ok, size, sha256, error}"""
+        error = None
+        if self.expected_size is not None and self.size != self.expected_size:
+            error = f"大小不一致：Content-Length为 {self.expected_size}，实际收到 {self.size}"
+        error = error or self._mp4.finish()
+        return {
+            'ok': error is None,
+            'size': self.size,
+            'sha256': self._hash.hexdigest(),
+            'error': error,
+        }
+
+
+def verify_file(file_path, block_size=4 * 1024 * 1024):
+    """使用mmap校验已存在的文件，返回与 StreamVerifier.result() 相同格式的结果"""
+    verifier = StreamVerifier()
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return verifier.result()  # 空文件不能mmap，直接按空数据校验（必然失败）
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, len(mapped), block_size):
+                    verifier.update(view[offset:offset + block_size])
+            finally:
+                view.release()
+    return verifier.result()
+
+
+class IntegrityIndex:
+    """保存目录下的校验索引：{文件名: {ok, size, sha256, error, mtime, aweme_id}}，线程安全"""
+    def __init__(self, directory):
+        self.path = os.path.join(directory, INDEX_FILE_NAME)
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dirty = False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 读取校验索引失败，将重新建立: {e}")
+
+    def record(self, file_path, result, aweme_id=None):
+        """记录一个文件的校验结果，aweme_id为该文件对应的视频ID（没有时保留原记录中的ID）"""
+        entry = dict(result)
+        try:
+            entry['mtime'] = os.stat(file_path).st_mtime
+        except OSError:
+            entry['mtime'] = None
+        name = os.path.basename(file_path)
+        with self._lock:
+            old = self._entries.get(name) or {}
+            entry['aweme_id'] = str(aweme_id) if aweme_id else old.get('aweme_id')
+            self._entries[name] = entry
+            self._dirty = True
+
+    def aweme_ids(self):
+        """返回 {文件名: 视频ID}，用于文件名规划时识别已下载的视频"""
+        with self._lock:
+            return {name: entry['aweme_id'] for name, entry in self._entries.items() if entry.get('aweme_id')}
+
+    def get(self, file_path):
+        with self._lock:
+            return self._entries.get(os.path.basename(file_path))
+
+    def is_verified(self, file_path, stat=None):
+        """文件存在、校验通过且之后没有被修改过
+            :param stat: 已知的stat结果（如目录扫描时缓存的），为空时调用os.stat
+        """
+        entry = self.get(file_path)
+        if not entry or not entry.get('ok'):
+            return False
+        if stat is None:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                return False
+        return stat.st_size == entry.get('size') and stat.st_mtime == entry.get('mtime')
+
+    def save(self):
+        """写回索引文件（先写临时文件再替换，避免写一半时中断损坏索引）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._entries, ensure_ascii=False)
+            self._dirty = False
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+
+def verify_library(directory, progress=None, cancel_token=None):
+    """重新校验目录下所有mp4文件并更新索引，返回 (通过数, [(文件名, 错误信息)])
+        :param progress: 进度回调 progress(当前序号, 总数)
+    """
+    index = IntegrityIndex(directory)
+    names = sorted(name for name in os.listdir(directory) if name.lower().endswith('.mp4'))
+    ok_count = 0
+    bad = []
+    try:
+        for i, name in enumerate(names, 1):
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            file_path = os.path.join(directory, name)
+            try:
+                result = verify_file(file_path)
+            except OSError as e:
+                result = {'ok': False, 'size': None, 'sha256': None, 'error': str(e)}
+            index.record(file_path, result)
+            if result['ok']:
+                ok_count += 1
+            else:
+                bad.append((name, result['error']))
+            if progress:
+                progress(i, len(names))
+    finally:
+        index.save()
+    return ok_count, bad
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("用法: python -m core.integrity 保存目录")
+        sys.exit(2)
+    ok_count, bad = verify_library(sys.argv[1])
+    for name, error in bad:
+        print(f"❌ {name}: {error}")
+    print(f"✅ 校验通过 {ok_count} 个，失败 {len(bad)} 个")
+    sys.exit(1 if bad else 0)
@@ -0,0 +1,117 @@
+import os
+import threading
+from collections import Counter
+
+'''抓取时拦截非必要资源（通过CDP）
+    打开主页/喜欢/收藏页面只是为了捕获 aweme/v1/web/... 接口返回的JSON，但浏览器仍会下载并解码自动播放的视频、
+    缩略图和字体，每次滚动都浪费带宽和CPU。这里在抓取期间：
+    1.按资源类型拦截：图片、媒体、字体（Fetch.enable 只暂停这几类请求，接口请求(XHR/Fetch)完全不经过拦截）
+    2.按地址拦截：视频流、图片CDN、字体文件、埋点上报等（Network.setBlockedURLs）
+    3.统计拦截数量和页面实际传输的数据量（按列表页平均），用于对比开启前后的效果
+    登录页需要显示二维码图片，只在抓取时开启。
+    拦截会改变页面行为（依赖图片/视频加载事件的懒加载、滚动触发），默认不开启；
+    设置环境变量 DOUYIN_BLOCK_RESOURCES=1 开启，开启前后可对比列表抓取日志中的页数和视频数
+'''
+
+BLOCKED_RESOURCE_TYPES = ('Image', 'Media', 'Font')
+BLOCKED_URL_PATTERNS = (
+    '*douyinvod.com*',  # 视频流
+    '*douyinpic.com*',  # 封面/头像图片
+    '*.woff2*', '*.woff*', '*.ttf*', '*.otf*',
+    '*mcs.zijieapi.com*', '*mon.zijieapi.com*',  # 埋点/监控上报
+)
+# 即使匹配到拦截规则也放行的地址（监听的接口）
+ALLOWED_PATTERNS = ('/aweme/v1/web/',)
+
+
+class ResourceBlocker:
+    """资源拦截器，一个爬虫共用一个，可以同时挂到多个页面/标签页上"""
+    def __init__(self, resource_types=BLOCKED_RESOURCE_TYPES, url_patterns=BLOCKED_URL_PATTERNS,
+                 allowed=ALLOWED_PATTERNS):
+        self.resource_types = tuple(resource_types)
+        self.url_patterns = tuple(url_patterns)
+        self.allowed = tuple(allowed)
+        self._lock = threading.Lock()
+        self.blocked = Counter()  # {资源类型: 拦截数量}
+        self.transferred = 0  # 页面实际传输的字节数（含响应头，压缩后大小）
+        self.requests = 0  # 完成加载的请求数
+
+    @classmethod
+    def from_env(cls):
+        """根据环境变量创建：DOUYIN_BLOCK_RESOURCES=1 时开启，默认不拦截（返回None）"""
+        if os.environ.get('DOUYIN_BLOCK_RESOURCES', '').strip().lower() in ('1', 'true', 'yes', 'on'):
+            return cls()
+        return None
+
+    def snapshot(self):
+        """当前的累计统计，传给 report() 计算一次抓取的增量（多个标签页并发抓取时统计是共享的）"""
+        with self._lock:
+            return Counter(self.blocked), self.requests, self.transferred
+
+    def attach(self, page):
+        """在页面上开启拦截，失败时返回False（不影响抓取，只是不拦截）"""
+        try:
+            driver = page.driver
+            driver.set_callback('Fetch.requestPaused', lambda **event: self._on_paused(driver, event))
+            driver.set_callback('Network.loadingFinished', self._on_finished)
+            driver.set_callback('Network.loadingFailed', self._on_failed)
+            page.run_cdp('Network.enable')
+            page.run_cdp('Network.setBlockedURLs', urls=list(self.url_patterns))
+            page.run_cdp('Fetch.enable', patterns=[
+                {'urlPattern': '*', 'resourceType': resource_type, 'requestStage': 'Request'}
+                for resource_type in self.resource_types
+            ])
+            return True
+        except Exception as e:
+            print(f"⚠️ 开启资源拦截失败，将不拦截: {e}")
+            return False
+
+    def detach(self, page):
+        """关闭拦截（例如登录页需要显示二维码图片）"""
+        try:
+            page.run_cdp('Fetch.disable')
+            page.run_cdp('Network.setBlockedURLs', urls=[])
+            driver = page.driver
+            for event in ('Fetch.requestPaused', 'Network.loadingFinished', 'Network.loadingFailed'):
+                driver.set_callback(event, None)
+        except Exception as e:
+            print(f"⚠️ 关闭资源拦截失败: {e}")
+
+    def _on_paused(self, driver, event):
+        request_id = event.get('requestId')
+        url = event.get('request', {}).get('url', '')
+        try:
+            if any(pattern in url for pattern in self.allowed):
+                driver.run('Fetch.continueRequest', requestId=request_id)
+                return
+            driver.run('Fetch.failRequest', requestId=request_id, errorReason='BlockedByClient')
+        except Exception:
+            return  # 页面已关闭等情况，请求会随页面一起结束
+        with self._lock:
+            self.blocked[event.get('resourceType', 'Other')] += 1
+
+    def _on_finished(self, **event):
+        with self._lock:
+            self.requests += 1
+            self.transferred += int(event.get('encodedDataLength') or 0)
+
+    def _on_failed(self, **event):
+        if event.get('blockedReason'):
+            # 被 setBlockedURLs 拦截的请求
+            with self._lock:
+                self.blocked[event.get('type', 'Other')] += 1
+
+    def report(self, since=None, pages=0):
+        """
+        :param since: snapshot() 的返回值，为空时报告累计统计
+        :param pages: 期间加载的列表页数，大于0时同时报告每页平均传输量
+        """
+        blocked, requests, transferred = self.snapshot()
+        if since:
+            blocked, requests, transferred = blocked - since[0], requests - since[1], transferred - since[2]
+        mb = 1024 * 1024
+        detail = '，'.join(f"{name} {count}" for name, count in blocked.most_common()) or '无'
+        text = f"拦截 {sum(blocked.values())} 个请求（{detail}），实际传输 {requests} 个请求 {transferred / mb:.1f}MB"
+        if pages:
+            text += f"，平均每页 {transferred / pages / mb:.2f}MB"
+        return text
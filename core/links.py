@@ -0,0 +1,72 @@
+import re
+
+'''抖音链接提取与规范化
+    1.从任意文本（分享口令、聊天记录导出等）中一次性扫描出全部抖音短链接/长链接
+    2.把链接规范化为(类型, ID)，用于去重：同一个视频/用户的不同链接只处理一次
+'''
+
+# 一个预编译的扫描器同时匹配短链接和长链接，遇到空白或中文标点即结束
+DOUYIN_URL_PATTERN = re.compile(
+    r'https://(?:v\.douyin\.com|www\.douyin\.com)/[^\s，。！？、；：“”‘’（）《》【】]+'
+)
+# 规范化用的预编译正则
+VIDEO_ID_PATTERN = re.compile(r'/(?:video|note)/(\d+)|[?&](?:modal_id|aweme_id)=(\d+)')
+USER_ID_PATTERN = re.compile(r'/user/([\w-]+)')
+SHORT_CODE_PATTERN = re.compile(r'^https://v\.douyin\.com/([\w-]+)')
+
+
+def extract_douyin_urls(text):
+    """提取文本中的全部抖音链接（保持出现顺序，原样去重），短链接和长链接都会返回"""
+    urls = []
+    seen = set()
+    for match in DOUYIN_URL_PATTERN.finditer(text or ''):
+        url = match.group(0).rstrip('/')  # 去除可能的多余斜杠
+        if url not in seen:
+            seen.add(url)
+            urls.append(url)
+    return urls
+
+
+def extract_douyin_url(text):
+    """提取文本中的第一个抖音链接，优先短链接；都没有时返回空字符串"""
+    urls = extract_douyin_urls(text)
+    for url in urls:
+        if url.startswith('https://v.douyin.com/'):
+            return url
+    return urls[0] if urls else ""
+
+
+def canonical_key(url):
+    """把链接规范化为去重键：('video', 视频ID) / ('user', sec_uid) / ('short', 短码) / ('url', 原链接)"""
+    match = VIDEO_ID_PATTERN.search(url)
+    if match:
+        return ('video', match.group(1) or match.group(2))
+    match = USER_ID_PATTERN.search(url)
+    if match:
+        return ('user', match.group(1))
+    match = SHORT_CODE_PATTERN.search(url)
+    if match:
+        return ('short', match.group(1))
+    return ('url', url)
+
+
+def canonical_url(url):
+    """把视频/用户链接规范化为网页版地址（如 iesdouyin.com 分享页 -> www.douyin.com/video/ID），其他链接原样返回"""
+    kind, value = canonical_key(url)
+    if kind == 'video':
+        return f'https://www.douyin.com/video/{value}'
+    if kind == 'user':
+        return f'https://www.douyin.com/user/{value}'
+    return url
+
+
+def dedupe_urls(urls):
+    """按规范化键去重，保持原有顺序"""
+    result = []
+    seen = set()
+    for url in urls:
+        key = canonical_key(url)
+        if key not in seen:
+            seen.add(key)
+            result.append(url)
+    return result
@@ -1,5 +1,8 @@
 class VideoItem:
     """视频项数据模型"""
-    def __init__(self, url, title):
+    def __init__(self, url, title, aweme_id=None, data_size=None, cover=None):
         self.url = url
         self.title = title
+        self.aweme_id = aweme_id  # 视频ID，用于去重
+        self.data_size = data_size  # 视频文件大小（字节），来自抖音数据，用于下载前规划磁盘空间
+        self.cover = cover  # 封面图片地址，用于结果表格中的缩略图
@@ -0,0 +1,237 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+'''下载后处理（需要安装ffmpeg）：转封装为faststart MP4、截取封面、分离音频
+    1.同时运行的ffmpeg进程数默认等于CPU核数（转码在ffmpeg进程中进行，用线程等待即可）；下载完成一个文件就提交一个，与后续下载同时进行
+    2.输出保存在保存目录下的子目录中（faststart/、covers/、audio/），输出已存在且比源文件新时跳过
+    3.任务可扩展：继承 PostTask，实现 command() 返回ffmpeg参数即可
+    4.先输出到临时文件再改名，中途失败或取消不会留下不完整的输出；取消时终止正在运行的ffmpeg进程，不等待长时间的转码结束
+'''
+
+
+class PostTask:
+    """后处理任务基类"""
+    name = ''
+    folder = ''  # 输出子目录
+    suffix = ''  # 输出文件扩展名
+
+    def output_path(self, source):
+        directory, name = os.path.split(source)
+        return os.path.join(directory, self.folder, os.path.splitext(name)[0] + self.suffix)
+
+    def is_done(self, source):
+        """输出已存在且不早于源文件时视为已处理"""
+        try:
+            output = os.stat(self.output_path(source))
+            return output.st_size > 0 and output.st_mtime >= os.stat(source).st_mtime
+        except OSError:
+            return False
+
+    def command(self, source, output):
+        """返回ffmpeg参数（不含ffmpeg本身和通用参数）"""
+        raise NotImplementedError
+
+
+class FaststartTask(PostTask):
+    """转封装：把moov移到文件开头，在线播放不需要先下载完整文件（不重新编码）"""
+    name = 'faststart'
+    folder = 'faststart'
+    suffix = '.mp4'
+
+    def command(self, source, output):
+        return ['-i', source, '-map', '0', '-c', 'copy', '-movflags', '+faststart', output]
+
+
+class CoverTask(PostTask):
+    """截取第1秒的画面作为封面（第一帧经常是黑屏）"""
+    name = 'cover'
+    folder = 'covers'
+    suffix = '.jpg'
+
+    def command(self, source, output):
+        return ['-ss', '1', '-i', source, '-frames:v', '1', '-q:v', '2', output]
+
+
+class AudioTask(PostTask):
+    """分离音频（直接复制音频流，不重新编码）"""
+    name = 'audio'
+    folder = 'audio'
+    suffix = '.m4a'
+
+    def command(self, source, output):
+        return ['-i', source, '-vn', '-c:a', 'copy', output]
+
+
+DEFAULT_TASKS = (FaststartTask(), CoverTask(), AudioTask())
+
+
+class RunningProcesses:
+    """正在运行的ffmpeg进程，取消时全部终止"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._processes = set()
+        self.cancelled = False
+
+    def add(self, process):
+        with self._lock:
+            self._processes.add(process)
+            cancelled = self.cancelled
+        if cancelled:
+            # 取消之后才启动的进程同样立即终止
+            self._terminate(process)
+
+    def discard(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+    def terminate_all(self):
+        with self._lock:
+            self.cancelled = True
+            processes = list(self._processes)
+        for process in processes:
+            self._terminate(process)
+
+    @staticmethod
+    def _terminate(process):
+        try:
+            process.terminate()
+        except OSError:
+            pass
+
+
+def run_task(ffmpeg, task, source, running=None):
+    """执行一个后处理任务，返回结果字典 {task, source, ok, seconds, error}
+        :param running: RunningProcesses，记录正在运行的ffmpeg进程，取消时由它终止进程；
+                        进程被终止后在这里删除不完整的临时输出
+    """
+    output = task.output_path(source)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    root, ext = os.path.splitext(output)
+    tmp_output = f"{root}.part{ext}"  # 保留扩展名，ffmpeg根据扩展名确定输出格式
+    start = time.monotonic()
+    process = None
+    try:
+        process = subprocess.Popen([ffmpeg, '-y', '-v', 'error', *task.command(source, tmp_output)],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
+        if running is not None:
+            running.add(process)
+        _, stderr = process.communicate()
+        ok = process.returncode == 0 and os.path.exists(tmp_output)
+        error = None if ok else stderr.decode('utf-8', 'ignore').strip()[-500:] or f"退出码 {process.returncode}"
+        if ok:
+            os.replace(tmp_output, output)
+    except OSError as e:
+        ok, error = False, str(e)
+    finally:
+        if running is not None and process is not None:
+            running.discard(process)
+        if os.path.exists(tmp_output):
+            try:
+                os.remove(tmp_output)
+            except OSError as e:
+                print(f"⚠️ 删除不完整的后处理输出失败: {e}")
+    return {'task': task.name, 'source': source, 'ok': ok, 'seconds': time.monotonic() - start, 'error': error}
+
+
+class PostProcessor:
+    """后处理任务池：submit() 提交已下载完成的文件，close() 等待全部处理结束"""
+    def __init__(self, tasks=DEFAULT_TASKS, max_workers=None, ffmpeg=None, progress=None):
+        """
+        :param tasks: 对每个文件执行的任务列表
+        :param max_workers: 同时运行的ffmpeg进程数，默认等于CPU核数
+        :param ffmpeg: ffmpeg可执行文件路径，默认从PATH中查找
+        :param progress: 进度回调 progress(已完成数, 总数, 结果字典)，在后台线程中调用
+        """
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        if not self.ffmpeg:
+            raise RuntimeError("下载后处理需要安装ffmpeg并加入PATH")
+        self.tasks = tuple(tasks)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.progress = progress
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        # 已提交到进程池但未完成的任务数上限，避免下载很快时一次性堆积大量任务
+        self._slots = threading.BoundedSemaphore(self.max_workers * 2)
+        self._executor = None
+        self._thread = None
+        self._cancelled = False
+        self._running = RunningProcesses()
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='postprocess')
+        self._thread = threading.Thread(target=self._dispatch, daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, source):
+        """提交一个已下载完成的文件（立即返回）"""
+        self._queue.put(source)
+
+    def _dispatch(self):
+        while True:
+            source = self._queue.get()
+            if source is None or self._cancelled:
+                return
+            for task in self.tasks:
+                if task.is_done(source):
+                    with self._lock:
+                        self.skipped += 1
+                    continue
+                self._slots.acquire()
+                if self._cancelled:
+                    self._slots.release()
+                    return
+                try:
+                    future = self._executor.submit(run_task, self.ffmpeg, task, source, self._running)
+                except RuntimeError:
+                    # 取消时进程池已关闭
+                    self._slots.release()
+                    return
+                with self._lock:
+                    self.total += 1
+                future.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        self._slots.release()
+        if future.cancelled() or self._cancelled:
+            # 取消时被终止的任务不计为失败
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {'task': None, 'source': None, 'ok': False, 'seconds': 0, 'error': str(e)}
+        with self._lock:
+            self.done += 1
+            if not result['ok']:
+                self.failed += 1
+            done, total = self.done, self.total
+        if not result['ok']:
+            print(f"❌ 后处理失败 [{result['task']}] {result['source']}: {result['error']}")
+        if self.progress:
+            self.progress(done, total, result)
+
+    def close(self, cancel=False):
+        """停止接收新文件并等待已提交的任务完成
+            :param cancel: 为True时丢弃尚未开始的任务，并终止正在运行的ffmpeg（不完整的输出会被删除）
+        """
+        if self._executor is None:
+            return
+        if cancel:
+            self._cancelled = True
+            # 先丢弃排队中的任务，释放等待中的提交线程，再终止正在运行的进程
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._running.terminate_all()
+        self._queue.put(None)
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        print(f"🎬 后处理完成: 成功 {self.done - self.failed} 个，失败 {self.failed} 个，跳过已处理 {self.skipped} 个")
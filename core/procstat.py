@@ -0,0 +1,189 @@
+import os
+import sys
+
+'''进程资源统计（不依赖第三方库）
+    1.读取当前进程的常驻内存(RSS)，用于报告每次抓取的内存峰值
+    2.统计浏览器进程树（主进程 + 渲染/GPU等子进程）的内存和CPU时间，供浏览器资源看门狗使用
+'''
+
+
+def current_rss(pid=None):
+    """返回进程当前的常驻内存（字节），pid为空表示当前进程；无法获取时返回0"""
+    try:
+        if sys.platform.startswith('linux'):
+            with open(f"/proc/{pid or 'self'}/statm", 'r') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        if sys.platform == 'win32':
+            return _windows_rss(pid)
+        if pid is None:
+            # macOS等平台只能拿到历史峰值（macOS单位为字节）
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def _windows_rss(pid=None):
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ('cb', wintypes.DWORD),
+            ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t),
+        ]
+
+    kernel32 = ctypes.windll.kernel32
+    psapi = ctypes.windll.psapi
+    if pid is None:
+        handle = kernel32.GetCurrentProcess()
+        close = False
+    else:
+        handle = kernel32.OpenProcess(0x0400 | 0x0010, False, pid)  # QUERY_INFORMATION | VM_READ
+        if not handle:
+            return 0
+        close = True
+    try:
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        if psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return 0
+    finally:
+        if close:
+            kernel32.CloseHandle(handle)
+
+
+class PeakRssTracker:
+    """记录一段时间内（例如一次抓取）的内存峰值：在关键位置调用sample()采样"""
+    def __init__(self):
+        self.start = current_rss()
+        self.peak = self.start
+
+    def sample(self):
+        rss = current_rss()
+        if rss > self.peak:
+            self.peak = rss
+        return rss
+
+    def report(self):
+        """返回可读的统计文本"""
+        mb = 1024 * 1024
+        return f"开始 {self.start / mb:.1f}MB，峰值 {self.peak / mb:.1f}MB（增长 {(self.peak - self.start) / mb:.1f}MB）"
+
+
+def child_pids(pid):
+    """返回进程的全部子孙进程ID（Linux读取/proc，Windows使用进程快照；其他平台返回空列表）"""
+    try:
+        if sys.platform.startswith('linux'):
+            parents = {}
+            for name in os.listdir('/proc'):
+                if not name.isdigit():
+                    continue
+                try:
+                    with open(f"/proc/{name}/stat", 'r') as f:
+                        # 进程名可能包含空格和括号，从最后一个右括号之后开始解析
+                        fields = f.read().rsplit(')', 1)[1].split()
+                    parents.setdefault(int(fields[1]), []).append(int(name))
+                except (OSError, IndexError, ValueError):
+                    continue
+        elif sys.platform == 'win32':
+            parents = _windows_parent_map()
+        else:
+            return []
+    except OSError:
+        return []
+    result = []
+    stack = [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def _windows_parent_map():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESSENTRY32(ctypes.Structure):
+        _fields_ = [
+            ('dwSize', wintypes.DWORD),
+            ('cntUsage', wintypes.DWORD),
+            ('th32ProcessID', wintypes.DWORD),
+            ('th32DefaultHeapID', ctypes.c_size_t),
+            ('th32ModuleID', wintypes.DWORD),
+            ('cntThreads', wintypes.DWORD),
+            ('th32ParentProcessID', wintypes.DWORD),
+            ('pcPriClassBase', ctypes.c_long),
+            ('dwFlags', wintypes.DWORD),
+            ('szExeFile', ctypes.c_char * 260),
+        ]
+
+    kernel32 = ctypes.windll.kernel32
+    snapshot = kernel32.CreateToolhelp32Snapshot(0x00000002, 0)  # TH32CS_SNAPPROCESS
+    if snapshot in (0, -1):
+        return {}
+    parents = {}
+    try:
+        entry = PROCESSENTRY32()
+        entry.dwSize = ctypes.sizeof(entry)
+        ok = kernel32.Process32First(snapshot, ctypes.byref(entry))
+        while ok:
+            parents.setdefault(entry.th32ParentProcessID, []).append(entry.th32ProcessID)
+            ok = kernel32.Process32Next(snapshot, ctypes.byref(entry))
+    finally:
+        kernel32.CloseHandle(snapshot)
+    return parents
+
+
+def cpu_seconds(pid):
+    """返回进程累计使用的CPU时间（秒，用户态+内核态）；无法获取时返回0"""
+    try:
+        if sys.platform.startswith('linux'):
+            with open(f"/proc/{pid}/stat", 'r') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            # utime、stime 是第14、15个字段（去掉pid和进程名后的下标为11、12），单位为时钟滴答
+            return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        if sys.platform == 'win32':
+            return _windows_cpu_seconds(pid)
+    except (OSError, IndexError, ValueError):
+        pass
+    return 0.0
+
+
+def _windows_cpu_seconds(pid):
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+    if not handle:
+        return 0.0
+    try:
+        creation, exit_time, kernel, user = (wintypes.FILETIME() for _ in range(4))
+        if not kernel32.GetProcessTimes(handle, ctypes.byref(creation), ctypes.byref(exit_time),
+                                        ctypes.byref(kernel), ctypes.byref(user)):
+            return 0.0
+        # FILETIME单位为100纳秒
+        total = 0
+        for t in (kernel, user):
+            total += (t.dwHighDateTime << 32) + t.dwLowDateTime
+        return total / 1e7
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def process_tree_usage(pid):
+    """返回进程树（进程本身及全部子孙进程）的 (常驻内存字节数, 累计CPU秒数)"""
+    pids = [pid] + child_pids(pid)
+    return sum(current_rss(p) for p in pids), sum(cpu_seconds(p) for p in pids)
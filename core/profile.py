@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+
+'''账号配置目录：每个账号一个持久化的浏览器用户数据目录 + Cookie文件
+    1.浏览器每次都使用同一个用户数据目录启动，登录状态和磁盘缓存都会保留，启动更快
+    2.浏览器关闭前把Cookie保存到 cookies.json，不启动浏览器的HTTP请求（短链接解析、下载）也能复用
+    3.通过Cookie快速判断登录是否仍然有效，不需要打开页面查找“退出登录”等元素
+'''
+
+DEFAULT_BASE_DIR = os.path.join(os.path.expanduser('~'), '.douyin_downloader', 'profiles')
+# 登录后才会下发的Cookie，任意一个有效即认为已登录
+LOGIN_COOKIE_NAMES = ('sessionid', 'sessionid_ss', 'sid_tt', 'sid_guard')
+
+
+class AccountProfile:
+    """单个账号的持久化配置：浏览器用户数据目录 + Cookie文件"""
+    def __init__(self, name='default', base_dir=None):
+        self.name = name
+        self.directory = os.path.join(base_dir or DEFAULT_BASE_DIR, name)
+        self.user_data_dir = os.path.join(self.directory, 'browser')
+        self.cookie_file = os.path.join(self.directory, 'cookies.json')
+        self._lock = threading.Lock()
+        self._cookies = None  # 第一次使用时从文件加载
+
+    def ensure_dirs(self):
+        os.makedirs(self.user_data_dir, exist_ok=True)
+
+    @property
+    def cookies(self):
+        """Cookie列表：[{name, value, domain, path, expires}]，expires为空表示会话Cookie"""
+        with self._lock:
+            if self._cookies is None:
+                try:
+                    with open(self.cookie_file, 'r', encoding='utf-8') as f:
+                        self._cookies = json.load(f)
+                except FileNotFoundError:
+                    self._cookies = []
+                except (OSError, ValueError) as e:
+                    print(f"⚠️ 读取Cookie文件失败: {e}")
+                    self._cookies = []
+            return list(self._cookies)
+
+    def save_cookies(self, cookies):
+        """保存Cookie（来自浏览器 page.cookies(all_domains=True, all_info=True)）"""
+        cleaned = []
+        for cookie in cookies:
+            cleaned.append({
+                'name': cookie.get('name'),
+                'value': cookie.get('value'),
+                'domain': cookie.get('domain', ''),
+                'path': cookie.get('path', '/'),
+                'expires': cookie.get('expires') or cookie.get('expiry'),
+            })
+        self.ensure_dirs()
+        tmp_path = self.cookie_file + '.tmp'
+        with self._lock:
+            self._cookies = cleaned
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(cleaned, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cookie_file)
+
+    def clear_cookies(self):
+        """清除保存的Cookie（退出登录/登录失效时）"""
+        with self._lock:
+            self._cookies = []
+            try:
+                os.remove(self.cookie_file)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _is_alive(cookie, now):
+        expires = cookie.get('expires')
+        # 会话Cookie（expires为空或-1）在浏览器关闭后即失效，不作为登录依据
+        try:
+            return bool(cookie.get('value')) and expires is not None and float(expires) > now
+        except (TypeError, ValueError):
+            return False
+
+    def has_valid_session(self, cookies=None):
+        """根据Cookie判断登录是否仍然有效（不访问网络）
+            :param cookies: 要检查的Cookie列表，默认检查已保存的Cookie
+        """
+        now = time.time()
+        for cookie in (self.cookies if cookies is None else cookies):
+            if cookie.get('name') in LOGIN_COOKIE_NAMES and 'douyin.com' in (cookie.get('domain') or '') \
+                    and self._is_alive(cookie, now):
+                return True
+        return False
+
+    def apply_to_session(self, session):
+        """把保存的未过期Cookie加入 requests.Session，供不启动浏览器的HTTP请求使用"""
+        now = time.time()
+        for cookie in self.cookies:
+            if not cookie.get('name'):
+                continue
+            try:
+                if cookie.get('expires') not in (None, -1) and float(cookie['expires']) <= now:
+                    continue
+            except (TypeError, ValueError):
+                # 过期时间格式错误时忽略过期时间，不影响其他Cookie
+                pass
+            session.cookies.set(cookie['name'], cookie.get('value') or '',
+                                domain=cookie.get('domain') or '', path=cookie.get('path') or '/')
+        return session
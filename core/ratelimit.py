@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+'''全局带宽限制：令牌桶算法，所有下载线程共享同一个限速器
+    1.手动限速：界面上的限速设置，修改后立即对正在进行的下载生效
+    2.分时段限速：例如白天限速、夜间全速，可通过环境变量 DOUYIN_BANDWIDTH_SCHEDULE 配置，
+      格式为 "开始-结束=KB/s" 用逗号分隔，0表示不限速，例如 "08:00-23:00=2048,23:00-08:00=0"
+    两者同时生效时取更严格的限制
+'''
+
+
+class BandwidthSchedule:
+    """分时段限速表"""
+    def __init__(self, windows=None):
+        # windows: [(开始分钟数, 结束分钟数, 字节/秒)]，结束小于开始表示跨越午夜
+        self.windows = windows or []
+
+    @classmethod
+    def parse(cls, text):
+        """解析 "08:00-23:00=2048,23:00-08:00=0" 格式（速率单位KB/s）"""
+        windows = []
+        for part in (text or '').split(','):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                span, rate = part.split('=')
+                start, end = span.split('-')
+                windows.append((cls._to_minutes(start), cls._to_minutes(end), int(rate) * 1024))
+            except ValueError:
+                raise ValueError(f"限速时段格式错误: {part}，应为 HH:MM-HH:MM=KB/s")
+        return cls(windows)
+
+    @staticmethod
+    def _to_minutes(text):
+        hour, minute = text.strip().split(':')
+        return int(hour) * 60 + int(minute)
+
+    def rate_at(self, now=None):
+        """返回指定时间的限速（字节/秒），不在任何时段内返回0（不限速）"""
+        now = now or datetime.now()
+        minutes = now.hour * 60 + now.minute
+        for start, end, rate in self.windows:
+            if start <= end:
+                if start <= minutes < end:
+                    return rate
+            elif minutes >= start or minutes < end:
+                return rate
+        return 0
+
+
+class BandwidthLimiter:
+    """令牌桶限速器，线程安全"""
+    def __init__(self, rate=0, schedule=None):
+        """
+        :param rate: 手动限速（字节/秒），0表示不限速
+        :param schedule: 分时段限速表 BandwidthSchedule
+        """
+        self._lock = threading.Lock()
+        self._rate = rate
+        self.schedule = schedule or BandwidthSchedule()
+        self._tokens = 0.0
+        self._last = time.monotonic()
+
+    def set_rate(self, rate):
+        """修改手动限速（字节/秒），立即生效"""
+        with self._lock:
+            self._rate = max(0, int(rate))
+
+    def set_schedule(self, schedule):
+        """修改分时段限速表，立即生效"""
+        with self._lock:
+            self.schedule = schedule
+
+    @property
+    def rate(self):
+        """当前生效的限速（字节/秒），0表示不限速"""
+        rates = [r for r in (self._rate, self.schedule.rate_at()) if r > 0]
+        return min(rates) if rates else 0
+
+    def consume(self, size, cancel_token=None):
+        """消耗 size 字节的令牌，令牌不足时阻塞等待
+            允许令牌透支（单个数据块可以大于桶容量），透支部分通过等待偿还；
+            等待分成小段，期间限速被修改或任务被取消都能及时响应
+        """
+        with self._lock:
+            if not self.rate:
+                return
+            self._refill()
+            self._tokens -= size
+        while True:
+            with self._lock:
+                rate = self.rate
+                if not rate:
+                    # 改为不限速，清空欠账直接放行
+                    self._tokens = 0.0
+                    return
+                self._refill()
+                if self._tokens >= 0:
+                    return
+                wait = -self._tokens / rate
+            wait = min(wait, 0.2)
+            if cancel_token:
+                cancel_token.sleep(wait)
+            else:
+                time.sleep(wait)
+
+    def _refill(self):
+        """按经过的时间补充令牌，桶容量为1秒的流量（需持有锁）"""
+        now = time.monotonic()
+        rate = self.rate
+        self._tokens = min(self._tokens + (now - self._last) * rate, float(rate))
+        self._last = now
+
+
+def _load_schedule():
+    """从环境变量读取分时段限速表，格式错误时忽略"""
+    try:
+        return BandwidthSchedule.parse(os.environ.get('DOUYIN_BANDWIDTH_SCHEDULE', ''))
+    except ValueError as e:
+        print(f"⚠️ {e}")
+        return BandwidthSchedule()
+
+
+# 全局共享的限速器，所有下载任务共用
+bandwidth_limiter = BandwidthLimiter(schedule=_load_schedule())
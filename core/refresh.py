@@ -0,0 +1,128 @@
+import re
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+
+'''播放地址即时刷新
+    抓取到的播放地址(play_addr)带签名，几个小时后过期（CDN返回403/410），长时间的下载任务排在后面的视频会全部失败。
+    1.下载每个视频前检查地址中的过期时间，即将过期时连同其他即将过期的视频一起批量刷新
+    2.下载时收到403/410也会强制刷新一次后重试（不计入重试次数），不受刷新冷却时间限制
+    3.刷新方式可替换：默认由爬虫按视频ID打开视频页，从详情接口(aweme/v1/web/aweme/detail/)中取新地址
+'''
+
+# 查询参数中的过期时间（Unix时间戳）
+EXPIRY_PARAMS = ('x-expires', 'expires', 'expire')
+# douyinvod地址路径中的过期时间：/{32位签名}/{8位十六进制时间戳}/video/...
+PATH_EXPIRY_PATTERN = re.compile(r'douyinvod\.com/[0-9a-f]{32}/([0-9a-f]{8})/', re.IGNORECASE)
+EXPIRED_STATUS = (403, 410)
+
+
+def play_url_expiry(url):
+    """返回播放地址的过期时间（Unix时间戳），地址中没有过期信息时返回None"""
+    if not url:
+        return None
+    query = parse_qs(urlsplit(url).query)
+    for name in EXPIRY_PARAMS:
+        value = (query.get(name) or [''])[0]
+        if value.isdigit():
+            return int(value)
+    match = PATH_EXPIRY_PATTERN.search(url)
+    return int(match.group(1), 16) if match else None
+
+
+def is_expired(url, margin=0):
+    """播放地址是否已过期（或将在 margin 秒内过期）；无法判断时返回False"""
+    expiry = play_url_expiry(url)
+    return expiry is not None and expiry - margin <= time.time()
+
+
+class PlayUrlRefresher:
+    """批量刷新视频播放地址，线程安全（同一时间只有一个批次在刷新，其他线程等待后直接使用新地址）"""
+    def __init__(self, fetch, batch_size=10, margin=300, cooldown=60, cancel=None):
+        """
+        :param fetch: 刷新函数 fetch([视频ID]) -> {视频ID: VideoItem}，例如 DouyinSpider.refresh_videos
+        :param batch_size: 每批刷新的视频数
+        :param margin: 距离过期不足多少秒时提前刷新（留出下载时间）
+        :param cooldown: 同一个视频两次刷新的最短间隔，避免地址本身无效时反复刷新
+        :param cancel: 取消正在进行的刷新的函数（下载取消时调用）
+        """
+        self.fetch = fetch
+        self.batch_size = batch_size
+        self.margin = margin
+        self.cooldown = cooldown
+        self.cancel = cancel
+        self.refreshed = 0  # 成功刷新的视频数
+        self.failed = 0  # 刷新失败（没取到新地址）的视频数
+        self._lock = threading.Lock()
+        self._pending = {}  # {id(video): video} 尚未下载的视频，用于凑批次
+        self._last_refresh = {}  # {视频ID: 上次刷新时间}
+        self._inflight = {}  # {视频ID: threading.Event} 正在刷新的视频，刷新完成时set
+        self._forced = {}  # {视频ID: 强制刷新得到的地址}
+
+    def track(self, videos):
+        """登记待下载的视频"""
+        with self._lock:
+            for video in videos:
+                self._pending[id(video)] = video
+
+    def finish(self, video):
+        """视频已下载完成（或放弃），不再参与批量刷新"""
+        with self._lock:
+            self._pending.pop(id(video), None)
+
+    def _can_refresh(self, video, now):
+        return bool(video.aweme_id) and now - self._last_refresh.get(str(video.aweme_id), 0) >= self.cooldown
+
+    def ensure_fresh(self, video, force=False):
+        """下载前调用：地址即将过期（或 force=True，例如收到403）时刷新，返回地址是否已更新
+            刷新（打开浏览器标签页）在锁外进行，不阻塞其他下载线程；同一视频正在被其他批次刷新时等待该批次完成
+        """
+        if not force and not is_expired(video.url, self.margin):
+            return False
+        old_url = video.url
+        key = str(video.aweme_id) if video.aweme_id else None
+        with self._lock:
+            now = time.monotonic()
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                # 等锁期间可能已被其他线程的批次刷新过
+                if not force and not is_expired(video.url, self.margin):
+                    return False
+                # 下载时地址已失效（403/410）：不受冷却时间限制，即使刚提前刷新过也立即再刷新一次；
+                # 但强制刷新得到的地址再次失效时不再绕过，避免地址本身无效时反复刷新
+                bypass = force and key is not None and self._forced.get(key) != old_url
+                if not bypass and not self._can_refresh(video, now):
+                    return False
+                batch = [video] + [other for other in self._pending.values()
+                                   if other is not video and is_expired(other.url, self.margin)
+                                   and self._can_refresh(other, now)][:self.batch_size - 1]
+                done = threading.Event()
+                for item in batch:
+                    self._last_refresh[str(item.aweme_id)] = now
+                    self._inflight[str(item.aweme_id)] = done
+        if inflight is not None:
+            inflight.wait()
+            return video.url != old_url
+        print(f"🔄 刷新 {len(batch)} 个视频的播放地址")
+        fresh = {}
+        try:
+            fresh = self.fetch([str(item.aweme_id) for item in batch]) or {}
+        except InterruptedError:
+            raise
+        except Exception as e:
+            print(f"❌ 刷新播放地址失败: {e}")
+        finally:
+            with self._lock:
+                for item in batch:
+                    new = fresh.get(str(item.aweme_id))
+                    if new and new.url:
+                        item.url = new.url
+                        item.data_size = new.data_size or item.data_size
+                        self.refreshed += 1
+                    else:
+                        self.failed += 1
+                    self._inflight.pop(str(item.aweme_id), None)
+                if bypass and video.url != old_url:
+                    self._forced[key] = video.url
+            done.set()
+        return video.url != old_url
@@ -1,7 +1,20 @@
 from DrissionPage import ChromiumPage,ChromiumOptions,SessionPage
-import re
 import traceback
 from .models import VideoItem
+from .cancel import CancelToken
+from .links import canonical_key, canonical_url, dedupe_urls
+from .filenames import sanitize_title, MAX_NAME_BYTES, EXTENSION
+from .profile import AccountProfile
+from .procstat import PeakRssTracker
+from .export import aweme_record, cover_url, create_exporter
+from .proxy import proxy_pool as default_proxy_pool, is_proxy_failure
+from .watchdog import BrowserWatchdog, ListingCheckpoint
+from .intercept import ResourceBlocker
+from .stealth import HeadlessProfile, headless_from_env
+from .sublistings import favorite_indexes, user_indexes, partition, sublisting_workers
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import threading
 import time 
 
 '''爬虫主程序，负责解析URL地址中包含的视频信息，包括视频标题、视频地址等
@@ -14,12 +27,56 @@ import time
     !!方法名前缀为下划线(_)，表明这是一个内部/私有方法，不建议从类外部直接调用
 '''
 class DouyinSpider:
-    def __init__(self):
+    def __init__(self, profile=None, port=None, proxy_pool=None, detail_cache=None, watchdog=None,
+                 resource_blocker=None):
+        # 账号配置：持久化的浏览器用户数据目录和Cookie，登录一次后无需重复登录
+        self.profile = profile or AccountProfile()
+        # 浏览器调试端口，为空时使用DrissionPage默认端口；同一台机器运行多个爬虫时需各自指定不同端口
+        self.port = port
+        # 代理出口池，默认使用全局共享的 proxy_pool；浏览器按账号固定使用一个出口（sticky），未配置代理时直连
+        self.proxy_pool = proxy_pool or default_proxy_pool
+        self.proxy = None  # 当前浏览器使用的代理
+        # 单个视频详情缓存 DetailCache，为空时不缓存；命中时不启动浏览器
+        self.detail_cache = detail_cache
+        # 浏览器资源看门狗：滚动列表时内存/CPU超限则重启浏览器并从分页游标处继续，默认限制见环境变量
+        self.watchdog = watchdog or BrowserWatchdog.from_env()
+        # 抓取时拦截图片/视频/字体等非必要资源（接口请求不受影响），为空时不拦截；默认不拦截，DOUYIN_BLOCK_RESOURCES=1 时开启
+        self.resource_blocker = resource_blocker or ResourceBlocker.from_env()
+        # 账号限速：两次加载列表页（滚动/续抓请求）之间的最小间隔（秒），0表示不限；多账号同时抓取时按账号分别设置
+        self.request_interval = 0
+        self._last_request = 0.0
+        self._pace_lock = threading.Lock()
+        self._seen_lock = threading.Lock()  # 多个标签页同时抓取时共享的已提取视频ID
         self.page = None  # 浏览器页面实例
         self.browser = None  # 浏览器实例（如果需要单独访问）
         self.is_headless = False
+        # 抓取使用的浏览器模式：True/False 覆盖各功能原来的默认模式，None表示保持默认（见环境变量 DOUYIN_HEADLESS）
+        self.headless = headless_from_env()
+        # 无头模式下对外呈现的桌面环境（UA/Client Hints、视口、navigator等保持一致）
+        self.headless_profile = HeadlessProfile()
+        self._stealth_tabs = set()  # 已应用伪装的标签页ID
         self.video_items = []
-        self.cancel_flag = False  # 添加取消标志
+        # 为True时抓取失败抛出异常（浏览器崩溃、没有收到任何列表数据等），而不是返回空列表；
+        # 分布式工作进程和多账号抓取需要区分“抓取失败”和“列表本来为空”
+        self.raise_errors = False
+        self.cancel_token = CancelToken()  # 取消令牌，取消时会立即打断等待并关闭浏览器
+        # 元数据导出文件（.jsonl/.csv/.parquet），为空时不导出；每解析一条视频就写出一条，抓取结束时关闭
+        self.export_path = None
+        self._exporter = None
+        self._export_lock = threading.Lock()
+
+    @property
+    def cancel_flag(self):
+        """取消标志（兼容旧接口），实际状态保存在 cancel_token 中"""
+        return self.cancel_token.cancelled
+
+    @cancel_flag.setter
+    def cancel_flag(self, value):
+        if value:
+            self.cancel_token.cancel()
+        elif self.cancel_token.cancelled:
+            # 重置取消状态：换一个新的令牌，旧令牌上的回调已全部执行完毕
+            self.cancel_token = CancelToken()
 
     def check_cancel(self):
         """检查是否需要取消操作"""
@@ -27,6 +84,24 @@ class DouyinSpider:
             self.close_browser()
             raise InterruptedError("操作已取消")
 
+    def _listen_steps(self, timeout=10, poll_interval=0.5, page=None):
+        """可被取消打断的 listen.steps(timeout=...) 替代实现
+            原来的 listen.steps(timeout=10) 会整段阻塞，取消最长要等10秒才生效；
+            这里把等待拆成 poll_interval 长度的小段，每段之间检查一次取消，
+            连续 timeout 秒没有新数据包时结束（与 listen.steps 的超时语义一致）
+        """
+        page = page or self.page
+        idle = 0
+        while idle < timeout:
+            self.check_cancel()
+            packet = page.listen.wait(timeout=poll_interval)
+            if packet:
+                idle = 0
+                yield packet
+                packet = None  # 不在生成器里继续持有已交出的数据包
+            else:
+                idle += poll_interval
+
     def create_browser(self, headless=False):           
         """创建浏览器实例，可复用已有实例，默认非无头模式"""
         # 如果已有浏览器且模式相同，直接返回
@@ -34,15 +109,24 @@ class DouyinSpider:
             return self.page
         
         # 关闭旧浏览器（如果存在）
-        if self.page:
-            try:
-                self.page.quit()
-            except Exception as e:
-                print(f"关闭浏览器出错: {e}")
+        self.close_browser()
         
-        # 创建新浏览器
+        # 创建新浏览器，使用账号的持久化用户数据目录（保留登录状态和磁盘缓存）
         co = ChromiumOptions()
-        co.headless(headless)
+        if headless:
+            self.headless_profile.configure(co)
+        else:
+            co.headless(False)
+        self.profile.ensure_dirs()
+        co.set_user_data_path(self.profile.user_data_dir)
+        if self.port:
+            co.set_local_port(self.port)
+        # 浏览器出口：同一账号固定使用同一个代理，登录状态不会因为IP频繁变化而失效
+        # 注意：Chromium的 --proxy-server 不支持在地址中带用户名密码，浏览器请使用无认证或IP白名单的代理
+        self.proxy = self.proxy_pool.acquire(key=self.profile.name)
+        if self.proxy:
+            co.set_proxy(self.proxy.url)
+            print(f"🌐 浏览器使用代理: {self.proxy.label}")
 
         headers = {
             'referer':'https://www.douyin.com',
@@ -54,101 +138,195 @@ class DouyinSpider:
         }
         # 创建ChromiumPage对象
         self.check_cancel()
-        self.page = ChromiumPage(co)
-        self.page.set.headers(headers)
+        try:
+            self.page = ChromiumPage(co)
+        except Exception:
+            # 启动失败可能是代理不可用，计入失败，连续失败后会自动换出口
+            self.proxy_pool.report(self.proxy, False)
+            raise
         self.is_headless = headless  # 记录当前模式
+        if headless:
+            # UA由伪装统一设置（与浏览器实际版本和Client Hints一致），不再用额外请求头覆盖
+            headers.pop('user-agent')
+            self._apply_stealth(self.page)
+        self.page.set.headers(headers)
+        # 取消时立即退出浏览器，打断正在进行的页面加载/等待并释放浏览器资源
+        self.cancel_token.register(self.close_browser)
         return self.page # 每次创建都会覆盖原来的实例，除非模式相同
 
     
     def check_login_status(self):
-        """检查登录状态（使用当前浏览器实例）"""
+        """检查登录状态：读取当前浏览器的Cookie判断（不打开页面、不查找元素），同时更新保存的Cookie；
+            浏览器未启动时直接检查保存的Cookie
+        """
         if not self.page:
-            raise RuntimeError("浏览器未初始化，请先调用 create_browser()")
+            return self.is_session_valid()
         try:
-            # 访问个人主页
-            if 'douyin.com/' not in self.page.url:
-                self.page.get('https://www.douyin.com/')
-            
-            # 检查是否存在登录元素
-            login_elements = [
-                'text=退出登录',
-                'text:保存登录信息'
-            ]
-        
-            for selector in login_elements:
-                try:
-                    if self.page.ele(selector, timeout=2):
-                        print('检测为已登录')
-                        return True
-                except:
-                    continue
-            print("检测为未登录")
-            return False
+            cookies = self.save_browser_cookies()
+            logged_in = self.profile.has_valid_session(cookies)
+            print('检测为已登录' if logged_in else "检测为未登录")
+            return logged_in
         except Exception as e:
             print(f"检查登录状态失败: {e}")
             return False
 
+    def is_session_valid(self):
+        """根据保存的Cookie快速判断登录是否有效，不启动浏览器"""
+        return self.profile.has_valid_session()
+
+    def ensure_login(self, headless=False):
+        """确认已登录：优先检查保存的Cookie；Cookie无效时启动浏览器从用户数据目录中再确认一次
+            返回是否已登录，浏览器（如果启动了）保持打开，后续操作可以直接复用
+        """
+        if self.is_session_valid():
+            return True
+        self.create_browser(headless=headless)
+        return self.check_login_status()
+
+    def save_browser_cookies(self):
+        """把当前浏览器的全部Cookie保存到账号配置中，返回Cookie列表"""
+        cookies = [dict(cookie) for cookie in self.page.cookies(all_domains=True, all_info=True)]
+        self.profile.save_cookies(cookies)
+        return cookies
+
+    def _export(self, video_info):
+        """把一条视频的完整元数据写入导出文件（第一次写入时才创建导出器）"""
+        if not self.export_path:
+            return
+        with self._export_lock:
+            if self._exporter is None:
+                try:
+                    self._exporter = create_exporter(self.export_path)
+                except (OSError, ValueError, RuntimeError) as e:
+                    # 导出失败不影响抓取，本次不再尝试导出
+                    print(f"⚠️ 创建导出文件失败，已关闭元数据导出: {e}")
+                    self.export_path = None
+                    return
+            exporter = self._exporter
+        exporter.write(aweme_record(video_info))
+
+    def close_exporter(self):
+        """关闭导出文件（Parquet在关闭时写出剩余行组和文件尾）"""
+        with self._export_lock:
+            exporter, self._exporter = self._exporter, None
+        if exporter:
+            try:
+                exporter.close()
+            except Exception as e:
+                print(f"关闭导出文件出错: {e}")
+
     def close_browser(self):
         """关闭浏览器"""
-        if self.page:
+        self.close_exporter()
+        self._quit_browser()
+
+    def _quit_browser(self):
+        """退出浏览器进程（保存Cookie），不影响元数据导出"""
+        # 先取出引用再关闭，取消回调可能在其他线程中同时调用本方法
+        page, self.page = self.page, None
+        if page:
+            self.is_headless = False
+            self._stealth_tabs.clear()
+            try:
+                # 关闭前保存Cookie，供下次快速检查登录状态和HTTP请求使用
+                self.profile.save_cookies([dict(cookie) for cookie in page.cookies(all_domains=True, all_info=True)])
+            except Exception as e:
+                print(f"保存Cookie出错: {e}")
             try:
                 # ✅ 确保页面存在再尝试关闭
-                if hasattr(self.page, 'quit'):
-                    self.page.quit()
-                self.page = None
-                self.is_headless = False
+                if hasattr(page, 'quit'):
+                    page.quit()
             except Exception as e:
                 print(f"关闭浏览器出错: {e}")
 
-    def get_single_video(self, url):
+    def get_cached_video(self, url):
+        """从详情缓存中取视频（链接可以是短链接），未命中或播放地址已过期时返回None"""
+        if not self.detail_cache:
+            return None
         try:
-            # 创建无头模式浏览器,调试时可以改成非无头模式查看效果
-            self.create_browser(headless=False)
-            self.page.listen.start('aweme/v1/web/aweme/detail/')            
-            self.page.get(url)
-            packets = self.page.listen.steps(timeout=10)
-            MAX_TITLE_LENGTH = 200
-            for idx, packet in enumerate(packets, 1):
-                try:             
-                    self.check_cancel()  # 添加取消检查
-                    json_data = packet.response.body
-                    # 注意：单个视频接口返回的是aweme_detail对象（非列表）,减少不必要的迭代（单个视频只需处理第一个有效数据包）
-                    if 'aweme_detail' in json_data:
-                        # video_info为字典
-                        video_info = json_data['aweme_detail']
-                        old_video_title = video_info.get('desc', '')
-                        
-                        # 清理非法字符作为文件名
-                        video_title = re.sub(r'[\\/:*?"<>|!\n#]', '_', old_video_title)
-                        # 截取标题长度，确保不超过Windows文件名限制
-                        if len(video_title) > MAX_TITLE_LENGTH:
-                            video_title = video_title[:MAX_TITLE_LENGTH]
-                        # 获取最高清视频地址
-                        url_list = video_info['video']['play_addr']['url_list']
-                        # 生成器表达式：(url for url in url_list if 'v3-web.douyinvod.com' in url) 是一个生成器表达式，它会遍历url_list中的每个URL，
-                        # next()函数：这个函数会从生成器中获取第一个满足条件的值
-                        # 默认值：next()的第二个参数None表示如果没有找到满足条件的URL，则返回None
-                        video_url = next((url for url in url_list if 'v3-web.douyinvod.com' in url), None)
-                                           
-                        # 如果没有找到v3-web.douyinvod.com的URL，打印错误信息
-                        if not video_url:
-                            print(f"⚠️ 未找到v3有效URL: {url_list}")
-
-                        # 直接返回结果，不再继续处理后续包
-                        return [VideoItem(url=video_url, title=video_title)]
+            item = self.detail_cache.get(url)
+        except Exception as e:
+            print(f"⚠️ 读取详情缓存失败: {e}")
+            return None
+        if item:
+            stats = self.detail_cache.stats()
+            print(f"⚡ 详情缓存命中: {item.title}（命中率 {stats['hit_rate']:.0%}，共 {stats['entries']} 条）")
+        return item
 
-                except Exception as e:
-                    print(f"❌ 处理第 {idx} 个数据包失败: {str(e)}")
-                    continue
-            print("⚠️ 未找到有效视频数据包")
-            return []
+    def get_single_video(self, url, aliases=()):
+        """获取单个视频，优先使用详情缓存
+            :param aliases: 同样指向该视频的其他链接（如解析前的短链接），写入缓存后用这些链接也能命中
+        """
+        cached = self.get_cached_video(url)
+        if cached:
+            return [cached]
+        try:
+            # 创建无头模式浏览器,调试时可以改成非无头模式查看效果
+            self.create_browser(headless=self._headless(False))
+            items = self._collect_single_video(self.page, url, aliases)
+            if not items and self.raise_errors:
+                raise RuntimeError("未找到有效视频数据包")
+            return items
         except Exception as e:
             print(f"❌ 获取视频失败: {str(e)}")
+            if self.raise_errors:
+                raise
             return []
         finally:
             self.close_browser()
             print('已关闭页面')
-        
+
+    def _collect_single_video(self, page, url, aliases=(), export=True):
+        """在指定页面/标签页中打开视频链接并提取视频信息（不负责创建和关闭浏览器）
+            :param export: 是否写入元数据导出文件（刷新播放地址时不写，避免重复记录）
+        """
+        page.listen.start('aweme/v1/web/aweme/detail/')            
+        self._prepare_page(page)
+        page.get(url)
+        packets = self._listen_steps(timeout=10, page=page)
+        for idx, packet in enumerate(packets, 1):
+            try:             
+                self.check_cancel()  # 添加取消检查
+                json_data = packet.response.body
+                # 注意：单个视频接口返回的是aweme_detail对象（非列表）,减少不必要的迭代（单个视频只需处理第一个有效数据包）
+                if 'aweme_detail' in json_data:
+                    # video_info为字典
+                    video_info = json_data['aweme_detail']
+                    if export:
+                        self._export(video_info)
+                    old_video_title = video_info.get('desc', '')
+                    
+                    # 清理非法字符作为文件名，并按字节数截断，确保不超过文件名长度限制
+                    video_title = sanitize_title(old_video_title)
+                    # 获取最高清视频地址
+                    url_list = video_info['video']['play_addr']['url_list']
+                    # 生成器表达式：(url for url in url_list if 'v3-web.douyinvod.com' in url) 是一个生成器表达式，它会遍历url_list中的每个URL，
+                    # next()函数：这个函数会从生成器中获取第一个满足条件的值
+                    # 默认值：next()的第二个参数None表示如果没有找到满足条件的URL，则返回None
+                    video_url = next((url for url in url_list if 'v3-web.douyinvod.com' in url), None)
+                                       
+                    # 如果没有找到v3-web.douyinvod.com的URL，打印错误信息
+                    if not video_url:
+                        print(f"⚠️ 未找到v3有效URL: {url_list}")
+
+                    item = VideoItem(url=video_url, title=video_title, aweme_id=video_info.get('aweme_id'),
+                                     data_size=video_info['video']['play_addr'].get('data_size'),
+                                     cover=cover_url(video_info))
+                    if self.detail_cache and video_url:
+                        try:
+                            self.detail_cache.put(video_info, item, [url, *aliases])
+                        except Exception as e:
+                            print(f"⚠️ 写入详情缓存失败: {e}")
+                    # 直接返回结果，不再继续处理后续包
+                    return [item]
+
+            except InterruptedError:
+                raise
+            except Exception as e:
+                print(f"❌ 处理第 {idx} 个数据包失败: {str(e)}")
+                continue
+        print("⚠️ 未找到有效视频数据包")
+        return []
         
     def resolve_url(self, url):
         try:
@@ -160,54 +338,416 @@ class DouyinSpider:
                 
             # 创建浏览器实例（如果还没有）
             if not hasattr(self, 'page') or not self.page:
-                self.create_browser(headless=True)
+                self.create_browser(headless=self._headless(True))
        
             self.page.get(url)
-            time.sleep(1)
+            self.cancel_token.sleep(1)
             final_url = self.page.url
             print(f"解析后的链接: {final_url}")
             return final_url
         
+        except InterruptedError:
+            raise
         except Exception as e:
             print(f"解析URL时出错: {str(e)}")
             return None           
+
+    def resolve_urls(self, urls, max_workers=8):
+        """批量解析链接，返回 {原链接: 最终链接}，解析失败的链接不在结果中
+            短链接通过HTTP重定向并发解析（不启动浏览器），HTTP解析失败的再逐个用浏览器解析
+        """
+        headers = {
+            'user-agent':'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36',
+        }
+        session = self.profile.apply_to_session(requests.Session())
+        self.cancel_token.register(session.close)
+
+        def resolve_by_redirect(url):
+            if not url.startswith('https://v.douyin.com/'):
+                return url  # 长链接无需解析
+            try:
+                self.check_cancel()
+                proxy = self.proxy_pool.acquire()
+                start = time.monotonic()
+                # HEAD请求只跟随重定向，不下载落地页内容
+                try:
+                    response = session.head(url, headers=headers, allow_redirects=True, timeout=10,
+                                            proxies=proxy.requests_proxies if proxy else None)
+                except requests.RequestException:
+                    self.proxy_pool.report(proxy, False)
+                    raise
+                self.proxy_pool.report(proxy, not is_proxy_failure(response), time.monotonic() - start)
+                final_url = canonical_url(response.url)
+                # 没有跳转到视频/用户页面（例如被风控拦截），交给浏览器解析
+                return final_url if canonical_key(final_url)[0] in ('video', 'user') else None
+            except InterruptedError:
+                raise
+            except Exception as e:
+                print(f"HTTP解析短链接失败 {url}: {e}")
+                return None
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                resolved = dict(zip(urls, executor.map(resolve_by_redirect, urls)))
+        finally:
+            self.cancel_token.unregister(session.close)
+            session.close()
+
+        results = {}
+        for url, final_url in resolved.items():
+            if not final_url:
+                final_url = self.resolve_url(url)
+            if final_url:
+                results[url] = final_url
+        print(f"✅ 批量解析完成: {len(results)}/{len(urls)}")
+        return results
+
+    def get_videos_batch(self, urls, max_workers=4, use_cache=True, export=True):
+        """批量获取多个视频/主页链接下的视频，每个链接在独立标签页中并发抓取，结果合并去重
+            :param urls: 已解析的最终链接（/video/ 或 /user/）
+            :param max_workers: 同时打开的标签页数量
+            :param use_cache: 视频链接是否先查详情缓存（刷新播放地址时需要跳过缓存）
+            :param export: 是否写入元数据导出文件；为False时（刷新播放地址）结束后也不关闭导出文件，只退出浏览器
+        """
+        urls = dedupe_urls(urls)
+        results = []
+        if use_cache and self.detail_cache:
+            remaining = []
+            for url in urls:
+                cached = self.get_cached_video(url) if canonical_key(url)[0] == 'video' else None
+                if cached:
+                    results.append([cached])
+                else:
+                    remaining.append(url)
+            urls = remaining
+        try:
+            if not urls:
+                return self._merge_batch(results)
+            self.create_browser(headless=self._headless(False))
+
+            def collect(url):
+                self.check_cancel()
+                tab = self.page.new_tab()
+                try:
+                    if canonical_key(url)[0] == 'video':
+                        return self._collect_single_video(tab, url, export=export)
+                    return self._collect_user_videos(tab, url)
+                except InterruptedError:
+                    raise
+                except Exception as e:
+                    print(f"❌ 获取链接视频失败 {url}: {e}")
+                    return []
+                finally:
+                    try:
+                        tab.close()
+                    except Exception:
+                        pass
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results += executor.map(collect, urls)
+        except Exception as e:
+            print(f"❌ 批量获取视频失败: {e}")
+            return []
+        finally:
+            if export:
+                self.close_browser()
+            else:
+                self._quit_browser()
+        return self._merge_batch(results)
+
+    def _merge_batch(self, results):
+        """合并批量抓取的结果，按视频ID去重（没有ID时按视频地址）"""
+        video_items = []
+        seen = set()
+        for items in results:
+            for item in items:
+                key = item.aweme_id or item.url
+                if key not in seen:
+                    seen.add(key)
+                    video_items.append(item)
+        print(f"✅ 批量获取完成，共 {len(video_items)} 个视频")
+        return video_items
         
+    def refresh_videos(self, aweme_ids, max_workers=4):
+        """按视频ID重新获取视频信息（播放地址带签名会过期，下载前用来换新地址）
+            每个视频在独立标签页中打开，从详情接口(aweme/v1/web/aweme/detail/)中取最新的播放地址，
+            返回 {视频ID: VideoItem}，获取失败的视频不在结果中
+        """
+        urls = [f"https://www.douyin.com/video/{aweme_id}" for aweme_id in aweme_ids]
+        items = self.get_videos_batch(urls, max_workers, use_cache=False, export=False)
+        return {str(item.aweme_id): item for item in items if item.aweme_id}
+
     def get_user_videos(self, url):
         try:
             # 创建无头模式浏览器
-            self.create_browser(headless=False)        
-            self.page.listen.start('aweme/v1/web/aweme/post/')
-            self.page.get(url)
-            self.check_cancel()  # 添加取消检查
-            self._scroll_to_bottom()
-            packets = self.page.listen.steps(timeout=10) #这里packets是生成器对象，listen.steps方法默认timeout=None，为None表示无限等待，此时的生成器是一个动态生成器，会持续阻塞等待新数据包，因此在后续的遍历中，会一直阻塞，导致后续逻辑无法执行，在这里需要手动设置timeout时间，来终止阻塞等待，timeout时间设置太短会导致数据包未获取完全，timeout时间设置太长会导致程序等待时间过长，因此需要根据实际情况来设置timeout时间
-        
-            # 遍历处理每个数据包
-            video_items = self._process_video_packets(packets)
-            return video_items
+            self.create_browser(headless=self._headless(False))        
+            # 主页视频列表，同时抓取主页合集
+            return self._collect_with_sublistings(url, 'aweme/v1/web/aweme/post/', user_indexes(url))
         except Exception as e:
             # print(f"获取个人视频失败: {e}")
+            if self.raise_errors:
+                raise
             return []
         finally:
             self.close_browser()
+
+    def _collect_user_videos(self, page, url):
+        """在指定页面/标签页中滚动用户主页并提取全部视频（不负责创建和关闭浏览器）"""
+        return self._collect_listing(page, url, 'aweme/v1/web/aweme/post/')
+
+    def _collect_listing(self, page, url, target, seen=None):
+        """打开列表页面，边滚动边处理监听到的数据包（不负责创建和关闭浏览器）
+            原来是先滚动到底，再一次性取出全部数据包，所有响应体都堆积在监听器里直到最后；
+            现在每滚动一次就取出并处理本次加载的数据包，处理完立即释放，内存占用与账号视频数量无关
+            :param seen: 与其他列表共享的已提取视频ID集合（同时抓取多个列表时去重）
+        """
+        page.listen.start(target)
+        self._prepare_page(page)
+        page.get(url)
+        self.check_cancel()  # 添加取消检查
+        checkpoint = ListingCheckpoint()
+        packets = self._stream_packets(page, url=url, target=target, checkpoint=checkpoint)
+        # 遍历处理每个数据包
+        video_items = self._process_video_packets(packets, seen)
+        if not checkpoint.pages and self.raise_errors:
+            # 列表为空时接口也会返回一页（aweme_list为空），一页都没有说明抓取失败
+            raise RuntimeError("没有收到列表数据（未登录、页面加载失败或接口超时）")
+        if video_items:
+            # 拿到数据说明当前出口可用（没拿到不一定是出口问题，例如列表本来为空，不计失败）
+            self.proxy_pool.report(self.proxy, True)
+        return video_items
+
+    def _stream_packets(self, page, settle=1, timeout=3, url=None, target=None, checkpoint=None):
+        """边滚动边产出数据包的生成器
+            调用方每处理完一个数据包才会取下一个，处理不过来时滚动自然暂停（背压），
+            监听器里缓存的最多只有一次滚动加载的数据包
+            :param settle: 每次滚动后等待新数据包的空闲时间（代替原来固定的等待1秒）
+            :param timeout: 滚动结束后等待剩余数据包的空闲时间（之前的数据包已边滚动边取走，不需要再等10秒）
+            :param url: 列表页面地址，和 target 一起提供时启用资源看门狗（超限时重启浏览器并从游标处继续）
+            :param checkpoint: 分页状态 ListingCheckpoint，由调用方提供时可在结束后查看收到的页数
+        """
+        watchdog = self.watchdog if url and target else None
+        checkpoint = checkpoint or ListingCheckpoint()
+        if watchdog:
+            watchdog.begin()
+        start = time.monotonic()
+        blocked_since = self.resource_blocker.snapshot() if self.resource_blocker else None
+        try:
+            for _ in self._scroll_steps(page):
+                for packet in self._listen_steps(timeout=settle, poll_interval=0.25, page=page):
+                    checkpoint.update(packet)
+                    yield packet
+                if not watchdog or not checkpoint.has_more:
+                    continue
+                reason = watchdog.check(self._browser_pid(page), checkpoint.pages)
+                if reason and checkpoint.resumable:
+                    yield from self._resume_listing(page, url, target, checkpoint, reason, timeout)
+                    return
+        finally:
+            if watchdog:
+                print(f"🐕 {watchdog.report()}")
+                traffic = f"，{self.resource_blocker.report(blocked_since, checkpoint.pages)}" if self.resource_blocker else ''
+                print(f"⏱️ 列表抓取用时 {time.monotonic() - start:.1f}秒，共 {checkpoint.pages} 页{traffic}")
+        for packet in self._listen_steps(timeout=timeout, page=page):
+            checkpoint.update(packet)
+            yield packet
+        #这里packets是生成器对象，listen.steps方法默认timeout=None，为None表示无限等待，此时的生成器是一个动态生成器，会持续阻塞等待新数据包，因此在后续的遍历中，会一直阻塞，导致后续逻辑无法执行，在这里需要手动设置timeout时间，来终止阻塞等待，timeout时间设置太短会导致数据包未获取完全，timeout时间设置太长会导致程序等待时间过长，因此需要根据实际情况来设置timeout时间
     
+    def _prepare_page(self, page):
+        """打开链接前准备页面/标签页：无头模式下应用伪装，开启资源拦截"""
+        if self.is_headless:
+            self._apply_stealth(page)
+        if self.resource_blocker:
+            self.resource_blocker.attach(page)
+
+    def _apply_stealth(self, page):
+        """在页面/标签页上应用无头模式伪装（每个标签页只需一次），失败时继续使用原始的无头浏览器"""
+        tab_id = getattr(page, 'tab_id', None)
+        if tab_id in self._stealth_tabs:
+            return
+        try:
+            self.headless_profile.apply(page)
+            self._stealth_tabs.add(tab_id)
+        except Exception as e:
+            print(f"⚠️ 应用无头模式伪装失败: {e}")
+
+    def _headless(self, default):
+        """抓取使用的浏览器模式：设置了 headless 时使用设置值，否则使用调用方原来的默认值"""
+        return default if self.headless is None else self.headless
+
+    @staticmethod
+    def _browser_pid(page):
+        """浏览器主进程ID，获取不到时返回None"""
+        try:
+            return page.browser.process_id
+        except Exception:
+            return None
+
+    def _recycle_page(self, page, reason):
+        """回收浏览器（主页面）或标签页（批量抓取时），返回新的页面"""
+        self.watchdog.record_recycle(reason)
+        print(f"♻️ 浏览器资源超限（{reason}），重启后从分页游标处继续抓取")
+        if page is self.page:
+            headless = self.is_headless
+            self._quit_browser()
+            return self.create_browser(headless=headless)
+        # 标签页：关闭后新开一个，释放该标签页的渲染进程
+        new_page = self.page.new_tab()
+        try:
+            page.close()
+        except Exception:
+            pass
+        return new_page
+
+    def _resume_listing(self, page, url, target, checkpoint, reason, timeout):
+        """回收浏览器后从游标处继续抓取：页面加载完第一页后，在页面中直接请求后续分页（由页面脚本签名），
+            请求结果同样被监听器捕获；不再滚动，页面中也不会再渲染新的缩略图。
+            页面请求失败时退回到从头滚动（已处理的视频由下游按视频ID去重）
+        """
+        while True:
+            page = self._recycle_page(page, reason)
+            self.watchdog.reset(checkpoint.pages)
+            page.listen.start(target)
+            self._prepare_page(page)
+            page.get(url)
+            # 页面自己请求的第一页已经处理过，不更新游标（下游按视频ID去重）
+            yield from self._listen_steps(timeout=1, poll_interval=0.25, page=page)
+            reason = None
+            while checkpoint.has_more and not reason:
+                self.check_cancel()
+                cursor = checkpoint.cursor
+                yield from self._request_page(page, checkpoint, timeout)
+                if checkpoint.cursor == cursor and checkpoint.has_more:
+                    print("⚠️ 按游标续抓失败，改为从头滚动")
+                    for _ in self._scroll_steps(page):
+                        yield from self._listen_steps(timeout=1, poll_interval=0.25, page=page)
+                    return
+                reason = self.watchdog.check(self._browser_pid(page), checkpoint.pages)
+            if not reason:
+                return
+
+    def _request_page(self, page, checkpoint, timeout=3):
+        """在页面中按游标直接请求下一页（由页面脚本签名，结果被监听器捕获），产出该页的数据包；
+            收到新游标或已是最后一页时结束，调用方比较请求前后的游标判断是否请求成功
+        """
+        cursor = checkpoint.cursor
+        self._pace()
+        page.run_js("const xhr = new XMLHttpRequest(); xhr.open('GET', arguments[0]);"
+                    "xhr.withCredentials = true; xhr.send();", checkpoint.next_url())
+        for packet in self._listen_steps(timeout=timeout, poll_interval=0.25, page=page):
+            checkpoint.update(packet)
+            yield packet
+            if checkpoint.cursor != cursor or not checkpoint.has_more:
+                break
+
+    def _paginate(self, page, listing, timeout=3):
+        """在已打开抖音页面的标签页中，从第一页开始按游标请求一个列表接口的全部分页，产出数据包"""
+        checkpoint = ListingCheckpoint.from_url(listing.url)
+        page.listen.start(listing.target)
+        while checkpoint.has_more:
+            self.check_cancel()
+            cursor = checkpoint.cursor
+            yield from self._request_page(page, checkpoint, timeout)
+            if checkpoint.cursor == cursor and checkpoint.has_more:
+                print(f"⚠️ {listing.label} 第 {checkpoint.pages + 1} 页请求失败，停止抓取该列表")
+                return
+
+    def _collect_with_sublistings(self, url, target, indexes):
+        """抓取主列表，同时发现并抓取可以独立分页的子列表（收藏夹、合集），结果合并去重（见 core/sublistings.py）
+            主列表在一个标签页中滚动抓取；另一个标签页请求索引接口得到所有子列表，
+            子列表按视频数量分组，每组一个标签页按游标请求分页，各标签页同时进行
+        """
+        # 主列表占一个标签页，其余标签页抓取子列表；默认只有一个标签页，不抓取子列表
+        workers = sublisting_workers() - 1
+        if workers < 1 or not indexes:
+            return self._collect_listing(self.page, url, target)
+        start = time.monotonic()
+        seen = set()  # 所有列表共享，同一个视频只提取和导出一次
+
+        def collect_main():
+            tab = self.page.new_tab()
+            try:
+                return self._collect_listing(tab, url, target, seen)
+            finally:
+                self._close_tab(tab)
+
+        def collect_group(tab, group):
+            try:
+                if tab is None:
+                    tab = self.page.new_tab()
+                    self._prepare_page(tab)
+                    tab.get(url)  # 打开抖音页面，分页请求由页面脚本签名
+                items = []
+                for listing in group:
+                    items += self._collect_sublisting(tab, listing, seen)
+                return items
+            finally:
+                if tab is not None:
+                    self._close_tab(tab)
+
+        with ThreadPoolExecutor(max_workers=workers + 1) as executor:
+            main = executor.submit(collect_main)
+            tab = self.page.new_tab()
+            listings = self._discover_sublistings(tab, url, indexes)
+            groups = partition(listings, workers)
+            if not groups:
+                self._close_tab(tab)
+            # 第一组复用发现子列表的标签页
+            futures = [executor.submit(collect_group, tab if i == 0 else None, group) for i, group in enumerate(groups)]
+            results = [main.result()] + [future.result() for future in futures]
+        video_items = [item for items in results for item in items]
+        print(f"✅ 共 {len(video_items)} 个视频（主列表 {len(results[0])} 个，{len(listings)} 个子列表中另有 "
+              f"{len(video_items) - len(results[0])} 个），{len(groups) + 1} 个标签页用时 {time.monotonic() - start:.1f}秒")
+        return video_items
+
+    def _discover_sublistings(self, tab, url, indexes):
+        """在标签页中请求索引接口，返回所有子列表；失败时返回已发现的部分（不影响主列表）"""
+        listings = []
+        try:
+            self._prepare_page(tab)
+            tab.get(url)
+            for index in indexes:
+                found = []
+                for packet in self._paginate(tab, index):
+                    found += index.parse(packet.response.body if packet.response else None)
+                print(f"📂 {index.label}: {len(found)} 个")
+                listings += found
+        except InterruptedError:
+            raise
+        except Exception as e:
+            print(f"⚠️ 获取子列表失败: {e}")
+        return listings
+
+    def _collect_sublisting(self, tab, listing, seen):
+        """抓取一个子列表的全部视频，返回其中尚未被其他列表提取的视频"""
+        try:
+            items = self._process_video_packets(self._paginate(tab, listing), seen)
+            print(f"📁 {listing.label}: 新增 {len(items)} 个视频")
+            return items
+        except InterruptedError:
+            raise
+        except Exception as e:
+            print(f"❌ 抓取{listing.label}失败: {e}")
+            return []
+
+    @staticmethod
+    def _close_tab(tab):
+        try:
+            tab.close()
+        except Exception:
+            pass
+
     def get_favorites_videos(self):
         try:
             # 创建无头模式浏览器
-            self.create_browser(headless=False)
-            self.page.listen.start('aweme/v1/web/aweme/listcollection/')
-            # 访问收藏页面
-            self.page.get("https://www.douyin.com/user/self?showTab=favorite_collection")             
-            self.check_cancel()  # 添加取消检查
-            # 滚动到页面底部加载所有收藏视频
-            self._scroll_to_bottom()
-            packets = self.page.listen.steps(timeout=10) #这里packets是生成器对象，listen.steps方法默认timeout=None，为None表示无限等待，此时的生成器是一个动态生成器，会持续阻塞等待新数据包，因此在后续的遍历中，会一直阻塞，导致后续逻辑无法执行，在这里需要手动设置timeout时间，来终止阻塞等待，timeout时间设置太短会导致数据包未获取完全，timeout时间设置太长会导致程序等待时间过长，因此需要根据实际情况来设置timeout时间
-            
-            # 遍历处理每个数据包
-            video_items = self._process_video_packets(packets)
-            return video_items
+            self.create_browser(headless=self._headless(False))
+            # 访问收藏页面，滚动到页面底部加载所有收藏视频，同时抓取收藏夹和收藏的合集
+            return self._collect_with_sublistings("https://www.douyin.com/user/self?showTab=favorite_collection",
+                                                  'aweme/v1/web/aweme/listcollection/', favorite_indexes())
         except Exception as e:
             print(f"获取收藏视频失败: {e}")
+            if self.raise_errors:
+                raise
             return []
         finally:
             self.close_browser()
@@ -216,31 +756,28 @@ class DouyinSpider:
     def get_likes_videos(self):
         try:
             # 创建无头模式浏览器
-            self.create_browser(headless=True)
-            # 使用auth_manager检查登录状态
-            self.page.listen.start('aweme/v1/web/aweme/favorite/')
-            # 访问喜欢页面
-            self.page.get("https://www.douyin.com/user/self?showTab=like")
-            self.check_cancel()  # 添加取消检查
-            # 滚动到页面底部加载所有收藏视频
-            self._scroll_to_bottom()
-            packets = self.page.listen.steps(timeout=10) #这里packets是生成器对象，listen.steps方法默认timeout=None，为None表示无限等待，此时的生成器是一个动态生成器，会持续阻塞等待新数据包，因此在后续的遍历中，会一直阻塞，导致后续逻辑无法执行，在这里需要手动设置timeout时间，来终止阻塞等待，timeout时间设置太短会导致数据包未获取完全，timeout时间设置太长会导致程序等待时间过长，因此需要根据实际情况来设置timeout时间
-        
-            # 遍历处理每个数据包
-            video_items = self._process_video_packets(packets)
-            return video_items
+            self.create_browser(headless=self._headless(True))
+            # 访问喜欢页面，滚动到页面底部加载所有喜欢视频
+            return self._collect_listing(self.page, "https://www.douyin.com/user/self?showTab=like",
+                                         'aweme/v1/web/aweme/favorite/')
         except Exception as e:
             print(f"获取喜欢视频失败: {e}")
+            if self.raise_errors:
+                raise
             return []
         finally:
             self.close_browser()
 
-    def _process_video_packets(self, packets):
-        """处理视频数据包，提取视频信息"""
+    def _process_video_packets(self, packets, seen=None):
+        """处理视频数据包，提取视频信息；数据包逐个处理，提取完即释放，并统计本次抓取的内存峰值
+            :param seen: 已提取的视频ID集合，多个列表同时抓取时共享（同一个视频只提取一次）
+        """
         video_items = []
-        MAX_TITLE_LENGTH = 200  # Windows文件名最大长度限制，文件名过长会导致后续下载失败
+        seen = set() if seen is None else seen  # 已提取的视频ID（浏览器回收后从头滚动时会重复收到之前的分页）
+        memory = PeakRssTracker()
         for idx, packet in enumerate(packets, 1):
             self.check_cancel()
+            memory.sample()
             try:
                 if not packet.response or not packet.response.body:
                     print(f"⚠️ 第 {idx} 个数据包无响应体")
@@ -255,13 +792,18 @@ class DouyinSpider:
                 self.check_cancel()
                 # 提取视频标题和链接并清洗
                 for video_info in aweme_list:
+                    aweme_id = video_info.get('aweme_id')
+                    with self._seen_lock:
+                        if aweme_id in seen:
+                            continue
+                        if aweme_id:
+                            seen.add(aweme_id)
+                    self._export(video_info)
                     old_video_title = video_info.get('desc', '')
-                    # 如果 old_video_title 不为空，则执行替换操作；否则结果为空字符串
-                    video_title = re.sub(r'[\\/:*?"<>|!\n#]', '_', old_video_title) if old_video_title else ''
-                    # 截取标题长度，确保不超过Windows文件名限制
-                    if len(video_title) > MAX_TITLE_LENGTH:
-                        print(f"📏 标题过长({len(video_title)}字符)，已截断至{MAX_TITLE_LENGTH}字符")
-                        video_title = video_title[:MAX_TITLE_LENGTH]
+                    # 清理非法字符，并按UTF-8字节数截断（预编译正则，中文标题不会超过文件名字节上限）
+                    video_title = sanitize_title(old_video_title)
+                    if len(old_video_title.encode('utf-8')) > MAX_NAME_BYTES - len(EXTENSION):
+                        print(f"📏 标题过长({len(old_video_title.encode('utf-8'))}字节)，已截断至{len(video_title.encode('utf-8'))}字节")
                     # 改进URL获取逻辑
                     url_list = video_info['video']['play_addr']['url_list']
                     video_url = None
@@ -283,17 +825,46 @@ class DouyinSpider:
                         if not video_url:
                             print(f"⚠️ 第 {idx} 个数据包中的视频URL为空")
                         continue
-                    video_item = VideoItem(url=video_url, title=video_title)
+                    video_item = VideoItem(url=video_url, title=video_title, aweme_id=video_info.get('aweme_id'),
+                                           data_size=video_info['video']['play_addr'].get('data_size'),
+                                           cover=cover_url(video_info))
                     video_items.append(video_item)
+            except InterruptedError:
+                raise
             except Exception as e:
                 print(f"❌ 处理第 {idx} 个数据包失败: {str(e)}")
                 traceback.print_exc()
+            finally:
+                # 释放本页响应体，避免在下一个数据包到来前一直持有
+                packet = json_data = aweme_list = None
         
+        memory.sample()
         print(f"✅ 成功提取 {len(video_items)} 个视频")
+        print(f"📈 本次抓取内存: {memory.report()}")
         return video_items
 
-    def _scroll_to_bottom(self):
-        """滚动加载所有视频列表内容"""
+    def _scroll_to_bottom(self, page=None):
+        """滚动加载所有视频列表内容，page为空时使用当前页面"""
+        scroll_count = 0
+        for _ in self._scroll_steps(page):
+            # 等待新内容加载，取消时立即醒来
+            self.cancel_token.sleep(1)  # 固定等待时间确保加载完成
+            scroll_count += 1
+        return scroll_count
+
+    def _pace(self):
+        """按 request_interval 限速：距离上次加载列表页不足间隔时等待（可被取消打断）"""
+        # 多个标签页同时请求时，各自预约下一个时间点，总请求频率仍不超过限制
+        with self._pace_lock:
+            now = time.monotonic()
+            wait = self._last_request + self.request_interval - now if self.request_interval else 0
+            self._last_request = now + max(wait, 0)
+        if wait > 0:
+            self.cancel_token.sleep(wait)
+
+    def _scroll_steps(self, page=None):
+        """滚动加载的生成器：每滚动一次产出一次，由调用方决定如何等待新内容加载（固定等待或处理数据包）"""
+        page = page or self.page
         # 记录滚动次数防止无限滚动
         scroll_count = 0
         max_scrolls = 50  # 最大滚动次数防止无限循环
@@ -301,24 +872,27 @@ class DouyinSpider:
         while scroll_count < max_scrolls:
             self.check_cancel()
             # 1. 检查是否已加载完成（存在结束元素）
-            end_element = self.page.ele('text:没有更多了', timeout=1)
+            end_element = page.ele('text:没有更多了', timeout=1)
             if end_element:
                 print("✅ 检测到结束元素，停止滚动")
                 break
             
             # 2. 确保tab元素可见（触发加载）
+            self._pace()
             try:
-                tab_element = self.page.ele('.user-page-footer', timeout=2)# 待验证：换一个不存在的元素，是否会执行滚动？
+                tab_element = page.ele('.user-page-footer', timeout=2)# 待验证：换一个不存在的元素，是否会执行滚动？
                 if tab_element:
                 # 滚动到元素位置（实现类似翻页效果）
-                    self.page.scroll.to_see(tab_element)
+                    page.scroll.to_see(tab_element)
                     print(f"🔄 滚动到页尾元素 ({scroll_count + 1}/{max_scrolls})")
                 self.check_cancel()
-                # 等待新内容加载
-                time.sleep(1)  # 固定等待时间确保加载完成
+            except InterruptedError:
+                raise
             except:
             # 如果找不到页尾元素
                 print("⚠️ 未找到页尾元素")           
+            # 等待新内容加载（交给调用方）
+            yield scroll_count
             
             # 3. 增加滚动计数
             scroll_count += 1
@@ -328,6 +902,5 @@ class DouyinSpider:
         if scroll_count >= max_scrolls:
             print(f"⚠️ 达到最大滚动次数 {max_scrolls}，停止滚动")
         else:
-            print(f"✅ 成功加载所有内容，共滚动 {scroll_count} 次")       
-        return scroll_count
+            print(f"✅ 成功加载所有内容，共滚动 {scroll_count} 次")
     
@@ -0,0 +1,266 @@
+import json
+import os
+import re
+
+'''无头模式伪装：让无头浏览器在网站看来与普通桌面Chrome一致
+    无头Chrome有几处明显特征，网站据此判断为自动化程序后不再返回视频数据（README中“无头模式解析不出视频”的原因）：
+      - UA中是 HeadlessChrome，Client Hints(sec-ch-ua)的品牌中同样带 Headless
+      - navigator.webdriver 为 true，WebGL渲染器是 SwiftShader，通知权限前后矛盾
+      - 默认视口 800x600，窗口/屏幕尺寸对不上
+      - 额外请求头里写死的UA版本与浏览器实际版本、Client Hints不一致
+    1.启动参数：新版无头模式(--headless=new)、固定窗口大小、语言、关闭 AutomationControlled
+    2.按浏览器实际版本生成UA和Client Hints（Network.setUserAgentOverride），请求头与 navigator 上的值一致
+    3.在每个页面的脚本执行前修补 navigator、权限、WebGL等属性（Page.addScriptToEvaluateOnNewDocument）
+    4.check_fingerprint() 检查页面中采集到的指纹是否自洽，tools/check_headless.py 用本地页面离线验证；
+      HeadlessProfile.fingerprint() 按伪装设置推算应当呈现的指纹，不启动浏览器也能检查伪装设置本身
+    环境变量 DOUYIN_HEADLESS=1 时所有抓取都使用无头模式，=0 时都使用可见浏览器，不设置时保持各功能原来的模式
+'''
+
+# 页面中采集指纹的脚本（结果写入 window.__fingerprint，离线检查页面和调试时使用）
+COLLECT_SCRIPT = r'''
+(async () => {
+  const result = {
+    userAgent: navigator.userAgent, webdriver: navigator.webdriver, languages: navigator.languages,
+    platform: navigator.platform, plugins: navigator.plugins.length,
+    hardwareConcurrency: navigator.hardwareConcurrency, deviceMemory: navigator.deviceMemory,
+    chrome: typeof window.chrome === 'object',
+    innerWidth: innerWidth, innerHeight: innerHeight, outerWidth: outerWidth, outerHeight: outerHeight,
+    screenWidth: screen.width, screenHeight: screen.height,
+    notification: typeof Notification === 'undefined' ? null : Notification.permission,
+  };
+  try {
+    result.permission = (await navigator.permissions.query({name: 'notifications'})).state;
+  } catch (e) { result.permission = null; }
+  if (navigator.userAgentData) {
+    result.brands = navigator.userAgentData.brands;
+    result.uaPlatform = navigator.userAgentData.platform;
+    result.mobile = navigator.userAgentData.mobile;
+  }
+  try {
+    const gl = document.createElement('canvas').getContext('webgl');
+    const info = gl.getExtension('WEBGL_debug_renderer_info');
+    result.webglVendor = gl.getParameter(info.UNMASKED_VENDOR_WEBGL);
+    result.webglRenderer = gl.getParameter(info.UNMASKED_RENDERER_WEBGL);
+  } catch (e) { result.webglVendor = result.webglRenderer = null; }
+  window.__fingerprint = result;
+})();
+'''
+
+# 每个页面脚本执行前注入的修补脚本，__XXX__ 占位符由 HeadlessProfile.script() 填充
+PATCH_SCRIPT = r'''
+(() => {
+  const define = (target, name, value) => {
+    try { Object.defineProperty(target, name, {get: () => value, configurable: true}); } catch (e) {}
+  };
+  define(Navigator.prototype, 'webdriver', false);
+  define(Navigator.prototype, 'languages', Object.freeze(__LANGUAGES__));
+  define(Navigator.prototype, 'hardwareConcurrency', __CONCURRENCY__);
+  define(Navigator.prototype, 'deviceMemory', __MEMORY__);
+  if (typeof window.chrome !== 'object') {
+    window.chrome = {app: {isInstalled: false}, runtime: {}};
+  }
+  if (!outerWidth || !outerHeight) {
+    define(window, 'outerWidth', innerWidth);
+    define(window, 'outerHeight', innerHeight + 85);
+  }
+  // 无头模式下 Notification.permission 为 denied，而 permissions.query 返回 prompt，真实浏览器两者一致
+  if (navigator.permissions && typeof Notification !== 'undefined') {
+    const query = Permissions.prototype.query;
+    Permissions.prototype.query = function (parameters) {
+      if (parameters && parameters.name === 'notifications') {
+        const state = Notification.permission === 'default' ? 'prompt' : Notification.permission;
+        return Promise.resolve({state: state, onchange: null});
+      }
+      return query.call(this, parameters);
+    };
+  }
+  // 无头模式使用软件渲染(SwiftShader)，改为常见的桌面显卡
+  for (const context of [window.WebGLRenderingContext, window.WebGL2RenderingContext]) {
+    if (!context) continue;
+    const getParameter = context.prototype.getParameter;
+    context.prototype.getParameter = function (name) {
+      if (name === 37445) return __WEBGL_VENDOR__;
+      if (name === 37446) return __WEBGL_RENDERER__;
+      return getParameter.call(this, name);
+    };
+  }
+})();
+'''
+
+
+PLATFORM = 'Win32'  # 与UA中的 Windows NT 10.0; Win64 对应的 navigator.platform
+
+
+def headless_from_env():
+    """读取 DOUYIN_HEADLESS：返回 True/False，未设置时返回None"""
+    value = os.environ.get('DOUYIN_HEADLESS', '').strip().lower()
+    if not value:
+        return None
+    return value not in ('0', 'false', 'no', 'off')
+
+
+class HeadlessProfile:
+    """无头浏览器对外呈现的桌面环境（Windows + Chrome），UA版本取浏览器实际版本"""
+    def __init__(self, width=1920, height=1080, languages=('zh-CN', 'zh'), hardware_concurrency=8, device_memory=8,
+                 webgl_vendor='Google Inc. (Intel)',
+                 webgl_renderer='ANGLE (Intel, Intel(R) UHD Graphics 630 Direct3D11 vs_5_0 ps_5_0, D3D11)'):
+        self.width = width
+        self.height = height
+        self.languages = tuple(languages)
+        self.hardware_concurrency = hardware_concurrency
+        self.device_memory = device_memory
+        self.webgl_vendor = webgl_vendor
+        self.webgl_renderer = webgl_renderer
+
+    @property
+    def accept_language(self):
+        """与 navigator.languages 一致的 Accept-Language，例如 zh-CN,zh;q=0.9"""
+        parts = [self.languages[0]]
+        for index, language in enumerate(self.languages[1:], 1):
+            parts.append(f"{language};q={max(1 - index / 10, 0.1):.1f}")
+        return ','.join(parts)
+
+    def configure(self, co):
+        """设置浏览器启动参数（ChromiumOptions）"""
+        co.headless(True)
+        co.set_argument('--headless=new')  # 新版无头模式与有界面的Chrome使用同一套渲染，插件等属性也一致
+        co.set_argument('--window-size', f"{self.width},{self.height}")
+        co.set_argument('--disable-blink-features', 'AutomationControlled')
+        co.set_argument('--lang', self.languages[0])
+
+    @staticmethod
+    def user_agent(version):
+        """与桌面Chrome相同格式的UA（Chrome的UA只包含主版本号）"""
+        major = version.split('.')[0]
+        return (f"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                f"Chrome/{major}.0.0.0 Safari/537.36")
+
+    @staticmethod
+    def client_hints(version):
+        """与UA一致的Client Hints（navigator.userAgentData 和 sec-ch-ua 系列请求头）"""
+        major = version.split('.')[0]
+        names = ('Not)A;Brand', 'Chromium', 'Google Chrome')
+        return {
+            'brands': [{'brand': name, 'version': '8' if name == 'Not)A;Brand' else major} for name in names],
+            'fullVersionList': [{'brand': name, 'version': '8.0.0.0' if name == 'Not)A;Brand' else version}
+                                for name in names],
+            'fullVersion': version,
+            'platform': 'Windows',
+            'platformVersion': '10.0.0',
+            'architecture': 'x86',
+            'bitness': '64',
+            'model': '',
+            'mobile': False,
+            'wow64': False,
+        }
+
+    def fingerprint(self, version):
+        """按伪装设置推算页面中应当采集到的指纹和请求头，返回 (指纹, 请求头)，格式与 COLLECT_SCRIPT 和本地检查页面记录的一致
+            UA、Client Hints、Accept-Language、视口取自 apply() 实际下发的值；webdriver、window.chrome、通知权限取修补脚本保证的值，
+            插件数量取新版无头模式的默认值
+        """
+        hints = self.client_hints(version)
+        user_agent = self.user_agent(version)
+        fingerprint = {
+            'userAgent': user_agent, 'webdriver': False, 'languages': list(self.languages), 'platform': PLATFORM,
+            'plugins': 5, 'hardwareConcurrency': self.hardware_concurrency, 'deviceMemory': self.device_memory,
+            'chrome': True, 'innerWidth': self.width, 'innerHeight': self.height,
+            'outerWidth': self.width, 'outerHeight': self.height, 'screenWidth': self.width, 'screenHeight': self.height,
+            'notification': 'default', 'permission': 'prompt',
+            'brands': hints['brands'], 'uaPlatform': hints['platform'], 'mobile': hints['mobile'],
+            'webglVendor': self.webgl_vendor, 'webglRenderer': self.webgl_renderer,
+        }
+        headers = {
+            'user-agent': user_agent,
+            'sec-ch-ua': ', '.join(f'"{item["brand"]}";v="{item["version"]}"' for item in hints['brands']),
+            'sec-ch-ua-mobile': '?1' if hints['mobile'] else '?0',
+            'sec-ch-ua-platform': f'"{hints["platform"]}"',
+            'accept-language': self.accept_language,
+        }
+        return fingerprint, headers
+
+    def script(self):
+        replacements = {
+            '__LANGUAGES__': json.dumps(list(self.languages)),
+            '__CONCURRENCY__': str(int(self.hardware_concurrency)),
+            '__MEMORY__': str(int(self.device_memory)),
+            '__WEBGL_VENDOR__': json.dumps(self.webgl_vendor),
+            '__WEBGL_RENDERER__': json.dumps(self.webgl_renderer),
+        }
+        source = PATCH_SCRIPT
+        for key, value in replacements.items():
+            source = source.replace(key, value)
+        return source
+
+    def apply(self, page):
+        """在页面/标签页上应用伪装（打开链接前调用），返回使用的UA"""
+        product = page.run_cdp('Browser.getVersion').get('product', '')
+        version = product.split('/')[-1] or '138.0.0.0'
+        user_agent = self.user_agent(version)
+        page.run_cdp('Network.setUserAgentOverride', userAgent=user_agent, acceptLanguage=self.accept_language,
+                     platform=PLATFORM, userAgentMetadata=self.client_hints(version))
+        page.run_cdp('Emulation.setDeviceMetricsOverride', width=self.width, height=self.height,
+                     deviceScaleFactor=1, mobile=False, screenWidth=self.width, screenHeight=self.height)
+        page.run_cdp('Page.addScriptToEvaluateOnNewDocument', source=self.script())
+        return user_agent
+
+
+def parse_sec_ch_ua(header):
+    """解析 sec-ch-ua 请求头：'"Chromium";v="138", ...' -> {品牌: 版本}"""
+    return dict(re.findall(r'"([^"]*)";\s*v="([^"]*)"', header or ''))
+
+
+def check_fingerprint(fingerprint, headers=None):
+    """检查页面中采集到的指纹（COLLECT_SCRIPT 的结果）是否像一个普通的桌面Chrome，返回问题列表（空列表表示通过）
+        :param headers: 同一页面请求的请求头（小写键），提供时同时检查请求头与页面中的值是否一致
+    """
+    problems = []
+    user_agent = fingerprint.get('userAgent') or ''
+    brands = {item['brand']: item['version'] for item in fingerprint.get('brands') or []}
+    if 'Headless' in user_agent or any('Headless' in brand for brand in brands):
+        problems.append(f"UA/品牌中带有Headless: {user_agent}")
+    if fingerprint.get('webdriver'):
+        problems.append("navigator.webdriver 为 true")
+    if not fingerprint.get('plugins'):
+        problems.append("navigator.plugins 为空")
+    if not fingerprint.get('chrome'):
+        problems.append("window.chrome 不存在")
+    if not fingerprint.get('languages'):
+        problems.append("navigator.languages 为空")
+    match = re.search(r'Chrome/(\d+)', user_agent)
+    if brands and (not match or brands.get('Chromium') != match.group(1)):
+        problems.append(f"UA版本与Client Hints不一致: {user_agent} / {brands}")
+    if 'Windows' in user_agent and not (fingerprint.get('platform') == 'Win32'
+                                        and fingerprint.get('uaPlatform', 'Windows') == 'Windows'):
+        problems.append(f"平台不一致: UA为Windows，platform={fingerprint.get('platform')}，"
+                        f"userAgentData.platform={fingerprint.get('uaPlatform')}")
+    if fingerprint.get('mobile'):
+        problems.append("userAgentData.mobile 为 true")
+    inner = (fingerprint.get('innerWidth') or 0, fingerprint.get('innerHeight') or 0)
+    outer = (fingerprint.get('outerWidth') or 0, fingerprint.get('outerHeight') or 0)
+    screen = (fingerprint.get('screenWidth') or 0, fingerprint.get('screenHeight') or 0)
+    if inner == (800, 600):
+        problems.append("视口为无头模式默认的 800x600")
+    if not all(outer) or outer[0] < inner[0] or outer[1] < inner[1]:
+        problems.append(f"窗口尺寸异常: inner={inner} outer={outer}")
+    if screen[0] < outer[0] or screen[1] < outer[1]:
+        problems.append(f"屏幕小于窗口: screen={screen} outer={outer}")
+    notification, permission = fingerprint.get('notification'), fingerprint.get('permission')
+    if notification == 'denied' and permission == 'prompt':
+        problems.append("通知权限前后矛盾（Notification.permission=denied，permissions.query=prompt）")
+    renderer = fingerprint.get('webglRenderer') or ''
+    if 'SwiftShader' in renderer or 'llvmpipe' in renderer:
+        problems.append(f"WebGL为软件渲染: {renderer}")
+    if headers:
+        if headers.get('user-agent') != user_agent:
+            problems.append(f"请求头UA与navigator.userAgent不一致: {headers.get('user-agent')}")
+        header_brands = parse_sec_ch_ua(headers.get('sec-ch-ua'))
+        if brands and header_brands != brands:
+            problems.append(f"sec-ch-ua与userAgentData.brands不一致: {header_brands} / {brands}")
+        platform = (headers.get('sec-ch-ua-platform') or '').strip('"')
+        if fingerprint.get('uaPlatform') and platform != fingerprint['uaPlatform']:
+            problems.append(f"sec-ch-ua-platform与userAgentData.platform不一致: {platform}")
+        language = (headers.get('accept-language') or '').split(',')[0].split(';')[0]
+        if fingerprint.get('languages') and language != fingerprint['languages'][0]:
+            problems.append(f"Accept-Language与navigator.languages不一致: {headers.get('accept-language')}")
+    return problems
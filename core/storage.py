@@ -0,0 +1,235 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+'''下载保存位置（存储后端）
+    1.LocalSink：本地目录，与以前一样写文件（预分配空间、失败时删除不完整文件）
+    2.S3Sink：S3兼容的对象存储（AWS S3、MinIO等），下载的数据块直接以分片上传(multipart upload)写入，
+      不经过本地磁盘；内存中最多缓存 max_pending_parts 个分片，上传慢时写入会等待（背压），
+      多个分片并行上传；校验失败或取消时中止上传，对象存储中不会出现不完整的文件
+    保存位置以 s3:// 开头时使用S3Sink（需要安装 boto3），例如 s3://bucket/douyin/，
+    MinIO等自建服务通过环境变量 DOUYIN_S3_ENDPOINT 指定地址（如 http://127.0.0.1:9000），
+    密钥使用boto3的标准配置（AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY 等）
+'''
+
+STATE_BASE_DIR = os.path.join(os.path.expanduser('~'), '.douyin_downloader', 'sinks')
+S3_URL_PATTERN = re.compile(r'^s3://([^/]+)/?(.*)$')
+
+
+class StorageSink:
+    """存储后端接口"""
+    is_local = False
+
+    @property
+    def state_dir(self):
+        """保存校验索引等状态文件的本地目录"""
+        raise NotImplementedError
+
+    def list_files(self):
+        """返回已存在的文件 {文件名: 大小}"""
+        raise NotImplementedError
+
+    def location(self, name):
+        """文件的完整位置（本地路径或 s3:// 地址），用于记录和显示"""
+        raise NotImplementedError
+
+    def open_writer(self, name, size=None, buffering=-1):
+        """打开一个写入器，数据写完后 commit() 才算保存成功，出错时 abort() 丢弃"""
+        raise NotImplementedError
+
+    def close(self):
+        """释放后端占用的资源（如上传线程池）"""
+        pass
+
+
+class LocalWriter:
+    def __init__(self, path, size=None, buffering=-1):
+        self.path = path
+        self.size = size
+        self._file = open(path, 'wb', buffering=buffering)
+        self._preallocate(size)
+
+    def _preallocate(self, size):
+        """预分配文件空间，减少碎片；不支持的平台/文件系统直接跳过"""
+        if not size or not hasattr(os, 'posix_fallocate'):
+            return
+        try:
+            os.posix_fallocate(self._file.fileno(), 0, size)
+        except OSError as e:
+            print(f"预分配文件空间失败: {e}")
+
+    def write(self, chunk):
+        self._file.write(chunk)
+
+    def commit(self):
+        # 实际大小与预分配大小不一致时截断多余部分
+        if self.size and self._file.tell() != self.size:
+            self._file.truncate()
+        self._file.close()
+
+    def abort(self):
+        """丢弃不完整的文件，避免下次被“已存在”检查误判为成功"""
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"删除不完整文件失败: {e}")
+
+
+class LocalSink(StorageSink):
+    is_local = True
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @property
+    def state_dir(self):
+        return self.directory
+
+    def list_files(self):
+        with os.scandir(self.directory) as it:
+            return {entry.name: entry.stat().st_size for entry in it if entry.is_file()}
+
+    def location(self, name):
+        return os.path.join(self.directory, name)
+
+    def open_writer(self, name, size=None, buffering=-1):
+        return LocalWriter(self.location(name), size, buffering)
+
+
+class S3Writer:
+    """流式分片上传：数据凑满一个分片就提交到上传线程池，未上传的分片数量有上限"""
+    def __init__(self, sink, key):
+        self.sink = sink
+        self.key = key
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._futures = []
+        # 已提交但未上传完成的分片数上限，内存占用最多为 (max_pending_parts + 1) × part_size
+        self._slots = threading.BoundedSemaphore(sink.max_pending_parts)
+
+    def write(self, chunk):
+        self._buffer += chunk
+        part_size = self.sink.part_size
+        while len(self._buffer) >= part_size:
+            with memoryview(self._buffer) as view:
+                data = bytes(view[:part_size])
+            del self._buffer[:part_size]
+            self._submit(data)
+
+    def _submit(self, data):
+        client = self.sink.client
+        if self._upload_id is None:
+            self._upload_id = client.create_multipart_upload(Bucket=self.sink.bucket, Key=self.key)['UploadId']
+        self._slots.acquire()  # 上传跟不上下载时在这里等待
+        self._check_failed()
+        future = self.sink.executor.submit(self._upload_part, len(self._futures) + 1, data)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def _upload_part(self, number, data):
+        response = self.sink.client.upload_part(Bucket=self.sink.bucket, Key=self.key, UploadId=self._upload_id,
+                                                PartNumber=number, Body=data)
+        return {'PartNumber': number, 'ETag': response['ETag']}
+
+    def _check_failed(self):
+        """有分片上传失败时尽早抛出，不再继续下载"""
+        for future in self._futures:
+            if future.done() and future.exception():
+                raise future.exception()
+
+    def commit(self):
+        client = self.sink.client
+        if self._upload_id is None:
+            # 小于一个分片的文件直接普通上传
+            client.put_object(Bucket=self.sink.bucket, Key=self.key, Body=bytes(self._buffer))
+        else:
+            if self._buffer:
+                self._submit(bytes(self._buffer))  # 最后一个分片允许小于最小分片大小
+            parts = [future.result() for future in self._futures]
+            client.complete_multipart_upload(Bucket=self.sink.bucket, Key=self.key, UploadId=self._upload_id,
+                                             MultipartUpload={'Parts': parts})
+        self._buffer = bytearray()
+
+    def abort(self):
+        self._buffer = bytearray()
+        if self._upload_id is None:
+            return
+        for future in self._futures:
+            future.cancel()
+        for future in self._futures:
+            if not future.cancelled():
+                future.exception()  # 等待正在上传的分片结束
+        try:
+            self.sink.client.abort_multipart_upload(Bucket=self.sink.bucket, Key=self.key, UploadId=self._upload_id)
+        except Exception as e:
+            print(f"中止分片上传失败（对象存储中可能残留未完成的分片）: {e}")
+
+
+class S3Sink(StorageSink):
+    """S3兼容的对象存储"""
+    def __init__(self, bucket, prefix='', endpoint_url=None, part_size=8 * 1024 * 1024, max_concurrency=4,
+                 max_pending_parts=4, client=None):
+        """
+        :param prefix: 对象键前缀（相当于目录）
+        :param endpoint_url: 自建服务（MinIO等）的地址，为空时使用AWS
+        :param part_size: 分片大小（S3要求除最后一个分片外不小于5MB）
+        :param max_concurrency: 所有文件共用的上传线程数
+        :param max_pending_parts: 每个文件最多缓存的待上传分片数
+        :param client: 已创建的boto3 S3客户端，为空时自动创建
+        """
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("保存到对象存储需要安装boto3: pip install boto3")
+            client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.part_size = max(part_size, 5 * 1024 * 1024)
+        self.max_pending_parts = max(1, max_pending_parts)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._state_dir = os.path.join(STATE_BASE_DIR, bucket, *[part for part in self.prefix.split('/') if part])
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        match = S3_URL_PATTERN.match(url)
+        if not match:
+            raise ValueError(f"对象存储地址格式错误: {url}，应为 s3://bucket/前缀")
+        kwargs.setdefault('endpoint_url', os.environ.get('DOUYIN_S3_ENDPOINT') or None)
+        return cls(match.group(1), match.group(2), **kwargs)
+
+    @property
+    def state_dir(self):
+        os.makedirs(self._state_dir, exist_ok=True)
+        return self._state_dir
+
+    def list_files(self):
+        files = {}
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get('Contents', []):
+                name = obj['Key'][len(self.prefix):]
+                if name and '/' not in name:
+                    files[name] = obj['Size']
+        return files
+
+    def location(self, name):
+        return f"s3://{self.bucket}/{self.prefix}{name}"
+
+    def open_writer(self, name, size=None, buffering=-1):
+        return S3Writer(self, self.prefix + name)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def create_sink(location):
+    """按保存位置创建存储后端：s3:// 开头为对象存储，其他为本地目录"""
+    if location.startswith('s3://'):
+        return S3Sink.from_url(location)
+    return LocalSink(location)
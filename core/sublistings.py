@@ -0,0 +1,102 @@
+import os
+from urllib.parse import urlencode, urlsplit
+
+'''可以独立分页的子列表：收藏夹、合集
+    收藏页的“视频”列表(listcollection)之外，用户建立的收藏夹和收藏的合集各有自己的分页接口；用户主页的合集也一样。
+    这些列表互不依赖，不需要在一个页面里依次滚动：
+    1.先请求索引接口（收藏夹列表/收藏的合集/主页合集），得到所有子列表的ID和视频数量
+    2.子列表按视频数量分成若干组，每组在一个标签页中由页面直接按游标请求分页（页面脚本签名），各组与主列表同时抓取
+    3.所有列表的结果按视频ID合并去重
+    一次列表抓取同时使用的标签页数量由环境变量 DOUYIN_SUBLISTING_WORKERS 配置：默认1，只抓取主列表（与以前相同）；
+    大于1时主列表占一个标签页，其余标签页抓取子列表。标签页越多，同一账号的请求频率越高、越容易被限流，请按需调大（如2~4）
+'''
+
+API_PREFIX = 'aweme/v1/web/'
+COMMON_PARAMS = {'device_platform': 'webapp', 'aid': '6383', 'channel': 'channel_pc_web'}
+
+# 子列表类型：{类型: (名称, 分页接口, ID参数名, 每页数量)}
+ENDPOINTS = {
+    'collects': ('收藏夹', 'collects/video/list/', 'collects_id', 10),
+    'mix': ('合集', 'mix/aweme/', 'mix_id', 20),
+}
+# 索引接口：{索引: (名称, 分页接口, 每页数量, 响应中的列表字段, 子列表类型)}
+INDEXES = {
+    'collects': ('收藏夹列表', 'collects/list/', 10, 'collects_list', 'collects'),
+    'collected_mixes': ('收藏的合集', 'mix/listcollection/', 12, 'mix_infos', 'mix'),
+    'user_mixes': ('主页合集', 'mix/list/', 12, 'mix_infos', 'mix'),
+}
+
+
+def sublisting_workers():
+    """一次列表抓取同时使用的标签页数量（环境变量 DOUYIN_SUBLISTING_WORKERS），1表示不抓取子列表"""
+    value = os.environ.get('DOUYIN_SUBLISTING_WORKERS')
+    try:
+        return max(1, int(value)) if value else 1
+    except ValueError:
+        print(f"⚠️ 环境变量 DOUYIN_SUBLISTING_WORKERS 格式错误: {value}")
+        return 1
+
+
+def api_url(path, **params):
+    return f"https://www.douyin.com/{API_PREFIX}{path}?{urlencode({**COMMON_PARAMS, **params})}"
+
+
+class Listing:
+    """一个可以按游标独立分页的列表接口，从第一页（cursor=0）开始"""
+    def __init__(self, label, path, params, count=0):
+        self.label = label
+        self.url = api_url(path, **params, cursor=0)
+        self.target = API_PREFIX + path  # 监听的接口
+        self.count = count  # 视频数量（未知时为0），用于在标签页之间分配
+
+
+def sublisting(kind, listing_id, name='', count=0):
+    """收藏夹/合集的视频列表"""
+    label, path, param, page_size = ENDPOINTS[kind]
+    return Listing(f"{label}「{name or listing_id}」", path, {param: listing_id, 'count': page_size}, count)
+
+
+class Index(Listing):
+    """子列表的索引（收藏夹列表、合集列表），每一页中列出若干子列表"""
+    def __init__(self, name, **params):
+        label, path, page_size, self.field, self.kind = INDEXES[name]
+        super().__init__(label, path, {**params, 'count': page_size})
+
+    def parse(self, body):
+        """从索引接口的一页响应中取出子列表"""
+        found = []
+        for info in (body or {}).get(self.field) or []:
+            if self.kind == 'collects':
+                listing_id = info.get('collects_id_str') or info.get('collects_id')
+                name, count = info.get('collects_name'), info.get('total_number')
+            else:
+                listing_id = info.get('mix_id')
+                name, count = info.get('mix_name'), (info.get('statis') or {}).get('updated_to_episode')
+            if listing_id:
+                found.append(sublisting(self.kind, str(listing_id), name, int(count or 0)))
+        return found
+
+
+def favorite_indexes():
+    """收藏页的子列表索引：收藏夹、收藏的合集"""
+    return [Index('collects'), Index('collected_mixes')]
+
+
+def user_indexes(url):
+    """用户主页的子列表索引：主页合集（链接中没有用户ID时为空）"""
+    parts = urlsplit(url).path.strip('/').split('/')
+    if len(parts) >= 2 and parts[0] == 'user' and parts[1] != 'self':
+        return [Index('user_mixes', sec_user_id=parts[1])]
+    return []
+
+
+def partition(listings, groups):
+    """按视频数量把子列表分成若干组（每组在一个标签页中依次抓取），各组的总量尽量接近；重复的子列表只保留一个"""
+    unique = list({listing.url: listing for listing in listings}.values())
+    result = [[] for _ in range(min(groups, len(unique)))]
+    loads = [0] * len(result)
+    for listing in sorted(unique, key=lambda listing: listing.count, reverse=True):
+        index = loads.index(min(loads))
+        result[index].append(listing)
+        loads[index] += max(listing.count, 1)
+    return result
@@ -0,0 +1,211 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+'''视频封面缩略图：按需加载 + 两级LRU缓存（内存 + 磁盘）
+    结果表格可能有上万行，不能一次性下载所有封面：
+    1.只加载当前可见的行（由界面调用 set_visible() 告知），快速滚动时已经滚出视口、还没开始下载的封面直接跳过
+    2.在后台线程池中下载和解码，不阻塞界面；同一个封面同时只下载一次
+    3.内存缓存保存解码后的缩略图（按占用字节数限制大小），磁盘缓存保存原始图片（按总大小限制，最久未使用的先删除），
+      再次显示、重新打开程序都不需要重新下载
+    4.下载失败的封面在一段时间内不再重试
+    缓存键使用视频ID（封面地址带签名会变化），没有视频ID时使用去掉参数的地址
+'''
+
+DEFAULT_DIR = os.path.join(os.path.expanduser('~'), '.douyin_downloader', 'thumbnails')
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36',
+    'Referer': 'https://www.douyin.com/',
+}
+
+
+def thumbnail_key(video):
+    """视频的缩略图缓存键，没有封面时返回None"""
+    if not getattr(video, 'cover', None):
+        return None
+    return str(video.aweme_id) if video.aweme_id else video.cover.split('?', 1)[0]
+
+
+class ThumbnailCache:
+    """封面缩略图加载器和两级缓存，线程安全"""
+    def __init__(self, decode=None, directory=None, memory_bytes=32 * 1024 * 1024, disk_bytes=256 * 1024 * 1024,
+                 max_workers=4, retry_after=300):
+        """
+        :param decode: 解码函数 decode(图片数据) -> (缩略图对象, 占用字节数)，在后台线程中调用，解码失败返回None；
+                       默认直接缓存原始数据
+        :param memory_bytes: 内存缓存上限（按 decode 返回的占用字节数计算）
+        :param disk_bytes: 磁盘缓存上限
+        :param retry_after: 下载失败后多少秒内不再重试
+        """
+        self.decode = decode or (lambda data: (data, len(data)))
+        self.directory = directory or DEFAULT_DIR
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # {键: (缩略图, 字节数)}，末尾为最近使用
+        self._memory_size = 0
+        self._pending = {}  # {键: [回调]}，正在下载或排队的封面
+        self._visible = set()  # 当前可见的键，排队中的任务开始时不在其中则跳过
+        self._failed = {}  # {键: 失败时间}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='thumbnail')
+        # 每个下载线程一个 requests.Session（Session不保证线程安全），close()时统一关闭
+        self._local = threading.local()
+        self._sessions = []
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'fetched': 0, 'failed': 0, 'skipped': 0}
+        os.makedirs(self.directory, exist_ok=True)
+        self._disk_size = sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+    def get(self, key):
+        """只查内存缓存，命中时返回缩略图（在界面线程中调用，不阻塞）"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            self._memory.move_to_end(key)
+            self.stats['memory_hits'] += 1
+            return entry[0]
+
+    def set_visible(self, keys):
+        """更新当前可见的键（滚动时调用），不可见的排队任务不会再下载"""
+        with self._lock:
+            self._visible = set(keys)
+
+    def request(self, key, url, callback):
+        """请求一个缩略图：内存命中时立即回调；否则在后台加载，完成后在后台线程中回调 callback(键, 缩略图)"""
+        cached = self.get(key)
+        if cached is not None:
+            callback(key, cached)
+            return
+        with self._lock:
+            failed_at = self._failed.get(key)
+            if failed_at and time.monotonic() - failed_at < self.retry_after:
+                return
+            self._visible.add(key)
+            if key in self._pending:
+                self._pending[key].append(callback)
+                return
+            self._pending[key] = [callback]
+        self._executor.submit(self._load, key, url)
+
+    def _load(self, key, url):
+        with self._lock:
+            if key not in self._visible:
+                # 排队期间已经滚出视口
+                self._pending.pop(key, None)
+                self.stats['skipped'] += 1
+                return
+        thumbnail = None
+        try:
+            data = self._read_disk(key)
+            if data is None:
+                data = self._fetch(url)
+                self._write_disk(key, data)
+            decoded = self.decode(data)
+            if decoded is not None:
+                thumbnail, size = decoded
+                self._put_memory(key, thumbnail, size)
+        except Exception as e:
+            print(f"⚠️ 加载封面失败: {e}")
+        with self._lock:
+            callbacks = self._pending.pop(key, [])
+            if thumbnail is None:
+                self._failed[key] = time.monotonic()
+                self.stats['failed'] += 1
+        if thumbnail is not None:
+            for callback in callbacks:
+                callback(key, thumbnail)
+
+    def _session(self):
+        """当前下载线程的Session（第一次使用时创建）"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            import requests
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def _fetch(self, url):
+        response = self._session().get(url, timeout=(5, 10))
+        response.raise_for_status()
+        with self._lock:
+            self.stats['fetched'] += 1
+        return response.content
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # 更新访问时间，淘汰时按修改时间排序（LRU）
+        except OSError:
+            return None
+        with self._lock:
+            self.stats['disk_hits'] += 1
+        return data
+
+    def _write_disk(self, key, data):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ 写入封面缓存失败: {e}")
+            return
+        with self._lock:
+            self._disk_size += len(data)
+            over = self._disk_size > self.disk_bytes
+        if over:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """磁盘缓存超过上限时删除最久未使用的文件，降到上限的90%"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_size = total
+
+    def _put_memory(self, key, thumbnail, size):
+        with self._lock:
+            if key in self._memory:
+                self._memory_size -= self._memory.pop(key)[1]
+            self._memory[key] = (thumbnail, size)
+            self._memory_size += size
+            while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+                _, (_, evicted) = self._memory.popitem(last=False)
+                self._memory_size -= evicted
+
+    def close(self):
+        """停止加载（丢弃排队中的任务）"""
+        with self._lock:
+            self._visible = set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
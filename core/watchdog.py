@@ -0,0 +1,163 @@
+import os
+import time
+from collections import Counter
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from .procstat import process_tree_usage
+
+'''浏览器资源看门狗
+    主页/喜欢等无限滚动页面滚动几十次后，页面里堆满了视频缩略图，Chromium内存不断上涨，配置低的机器上抓取越来越慢甚至浏览器崩溃。
+    1.每滚动一次采样浏览器进程树的内存和CPU，超过限制（或加载的列表页数超过上限）时回收浏览器
+    2.回收前记录列表接口的分页游标（max_cursor/cursor），重启浏览器后从游标处继续请求，不需要从头滚动
+    3.统计回收次数、原因和内存峰值
+    限制可通过环境变量配置：DOUYIN_BROWSER_MAX_RSS_MB（默认1536）、DOUYIN_BROWSER_MAX_PAGES（默认不限）、
+    DOUYIN_BROWSER_MAX_CPU（持续CPU占用百分比，默认不限）
+'''
+
+# 列表接口的签名参数，续抓时由页面重新签名
+SIGNATURE_PARAMS = ('a_bogus', 'X-Bogus')
+CURSOR_PARAMS = ('max_cursor', 'cursor')
+
+
+class ListingCheckpoint:
+    """列表接口的分页状态：根据监听到的数据包记录下一页的游标，用于重启浏览器后继续抓取"""
+    def __init__(self):
+        self.cursor = None
+        self.cursor_param = None
+        self.has_more = True
+        self.template = None  # 最近一次列表请求的地址（GET）
+        self.pages = 0
+
+    @classmethod
+    def from_url(cls, url):
+        """从指定的第一页请求地址开始的分页状态（在页面中直接请求列表接口时使用）"""
+        checkpoint = cls()
+        query = dict(parse_qsl(urlsplit(url).query))
+        for name in CURSOR_PARAMS:
+            if name in query:
+                checkpoint.cursor, checkpoint.cursor_param = query[name], name
+                break
+        checkpoint.template = url
+        return checkpoint
+
+    def update(self, packet):
+        """根据一个数据包更新游标，数据包无法解析时忽略"""
+        try:
+            body = packet.response.body
+            request_url = packet.url
+            method = getattr(packet, 'method', 'GET') or 'GET'
+        except AttributeError:
+            return
+        if not isinstance(body, dict):
+            return
+        self.pages += 1
+        for name in CURSOR_PARAMS:
+            if name in body:
+                self.cursor = body[name]
+                self.cursor_param = name
+                break
+        self.has_more = bool(body.get('has_more'))
+        # 只有GET请求可以通过改写地址续抓
+        self.template = request_url if method.upper() == 'GET' else None
+
+    @property
+    def resumable(self):
+        """记录的游标参数确实是请求地址中的一个参数时才能续抓（不能只在整个地址中查找子串，cursor 会匹配到 max_cursor）"""
+        if self.cursor is None or self.template is None:
+            return False
+        return self.cursor_param in dict(parse_qsl(urlsplit(self.template).query, keep_blank_values=True))
+
+    def next_url(self):
+        """下一页的请求地址：替换游标参数并去掉旧的签名参数"""
+        parts = urlsplit(self.template)
+        query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                 if key not in SIGNATURE_PARAMS]
+        query = [(key, str(self.cursor) if key == self.cursor_param else value) for key, value in query]
+        return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class BrowserWatchdog:
+    """采样浏览器进程树的资源占用，判断是否需要回收浏览器"""
+    def __init__(self, max_rss=1536 * 1024 * 1024, max_pages=None, max_cpu=None, cpu_samples=3, max_recycles=5):
+        """
+        :param max_rss: 浏览器进程树内存上限（字节）
+        :param max_pages: 一个浏览器实例最多加载的列表页数，为空表示不限
+        :param max_cpu: CPU占用上限（百分比，多核可超过100），连续 cpu_samples 次采样超过时回收，为空表示不限
+        :param max_recycles: 一次抓取最多回收的次数，避免资源始终超限时反复重启
+        """
+        self.max_rss = max_rss
+        self.max_pages = max_pages
+        self.max_cpu = max_cpu
+        self.cpu_samples = cpu_samples
+        self.max_recycles = max_recycles
+        self.total_recycles = 0  # 累计回收次数
+        self.recycles = 0  # 本次抓取的回收次数
+        self.reasons = Counter()
+        self.peak_rss = 0
+        self._start_pages = 0
+        self._last_cpu = None  # (采样时间, 累计CPU秒数)
+        self._high_cpu = 0
+
+    @classmethod
+    def from_env(cls):
+        def number(name, default):
+            value = os.environ.get(name)
+            try:
+                return float(value) if value else default
+            except ValueError:
+                print(f"⚠️ 环境变量 {name} 格式错误: {value}")
+                return default
+        max_rss_mb = number('DOUYIN_BROWSER_MAX_RSS_MB', 1536)
+        max_pages = number('DOUYIN_BROWSER_MAX_PAGES', None)
+        return cls(max_rss=int(max_rss_mb * 1024 * 1024) if max_rss_mb else None,
+                   max_pages=int(max_pages) if max_pages else None,
+                   max_cpu=number('DOUYIN_BROWSER_MAX_CPU', None))
+
+    def begin(self):
+        """开始一次新的抓取：清空本次抓取的统计"""
+        self.recycles = 0
+        self.reasons = Counter()
+        self.peak_rss = 0
+        self.reset()
+
+    def reset(self, pages=0):
+        """浏览器（重新）启动后调用，pages为此时已加载的列表页数"""
+        self._start_pages = pages
+        self._last_cpu = None
+        self._high_cpu = 0
+
+    def check(self, pid, pages):
+        """采样一次，需要回收时返回原因，否则返回None
+            :param pid: 浏览器主进程ID
+            :param pages: 本次抓取已加载的列表页数
+        """
+        if self.recycles >= self.max_recycles:
+            return None
+        if self.max_pages and pages - self._start_pages >= self.max_pages:
+            return 'pages'
+        if not pid:
+            return None
+        rss, cpu = process_tree_usage(pid)
+        self.peak_rss = max(self.peak_rss, rss)
+        if self.max_rss and rss > self.max_rss:
+            return 'memory'
+        now = time.monotonic()
+        if self.max_cpu and self._last_cpu:
+            elapsed = now - self._last_cpu[0]
+            percent = (cpu - self._last_cpu[1]) / elapsed * 100 if elapsed > 0 else 0
+            self._high_cpu = self._high_cpu + 1 if percent > self.max_cpu else 0
+            if self._high_cpu >= self.cpu_samples:
+                self._last_cpu = (now, cpu)
+                return 'cpu'
+        self._last_cpu = (now, cpu)
+        return None
+
+    def record_recycle(self, reason):
+        self.recycles += 1
+        self.total_recycles += 1
+        self.reasons[reason] += 1
+
+    def report(self):
+        mb = 1024 * 1024
+        reasons = '，'.join(f"{name} {count}次" for name, count in self.reasons.items()) or '无'
+        return f"浏览器回收 {self.recycles} 次（{reasons}），浏览器内存峰值 {self.peak_rss / mb:.1f}MB"
@@ -1,20 +1,69 @@
+import time
+START_TIME = time.perf_counter()  # 记录启动时间，用于启动耗时测试
+
 import sys
 import threading
 from pathlib import Path
 
-from PySide6.QtWidgets import (QApplication, QLineEdit, QPushButton, 
-                               QTableWidget, QMessageBox, 
+from PySide6.QtWidgets import (QApplication, QLineEdit, QPushButton, QSpinBox, QCheckBox,
+                               QTableWidget, QMessageBox, QMainWindow,
                                QHeaderView, QTableWidgetItem,QDialog, QProgressBar,
                                QVBoxLayout, QLabel, QFileDialog)
-from PySide6.QtUiTools import QUiLoader
-from PySide6.QtCore import QObject, Signal, Slot, Qt
+from PySide6.QtCore import QObject, Signal, Slot, Qt, QTimer, QSize
+from PySide6.QtGui import QImage, QPixmap
 
-from core.downloader import Downloader
-from core.spider import DouyinSpider
-from PySide6.QtWidgets import QFileDialog
 import os
-import time
-import re
+
+from core.links import extract_douyin_url, extract_douyin_urls, canonical_key, dedupe_urls
+from core.ratelimit import bandwidth_limiter
+from core.profile import AccountProfile
+from core.cancel import CancelToken
+from core.thumbnails import ThumbnailCache, thumbnail_key
+
+# 爬虫(DrissionPage)和下载器(requests)只在第一次点击时才需要，延迟导入以加快启动速度
+
+THUMB_WIDTH, THUMB_HEIGHT = 72, 96  # 封面缩略图大小
+
+
+def decode_cover(data):
+    """在后台线程中把封面图片解码为缩略图（QImage可以在非界面线程中使用，QPixmap不行）"""
+    image = QImage.fromData(data)
+    if image.isNull():
+        return None
+    image = image.scaled(THUMB_WIDTH, THUMB_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio,
+                         Qt.TransformationMode.SmoothTransformation)
+    return image, image.sizeInBytes()
+
+
+def get_base_path():
+    """获取资源根目录：打包后为临时目录，开发环境为源码目录"""
+    if getattr(sys, 'frozen', False):
+        # 打包后，UI文件在临时目录的ui文件夹下
+        return Path(sys._MEIPASS)
+    # 开发环境，使用原路径
+    return Path(__file__).parent
+
+
+def load_main_window():
+    """加载主窗口界面
+        优先使用 pyside6-uic 预编译的 ui/ui_main_window.py（由 tools/build_ui.py 生成），
+        无需在启动时解析XML；预编译文件不存在或已过期时，回退到 QUiLoader 加载 .ui 文件（只加载一次）
+    """
+    ui_path = get_base_path() / "ui" / "main_window.ui"
+    try:
+        from ui.ui_main_window import Ui_MainWindow
+        compiled_path = Path(sys.modules[Ui_MainWindow.__module__].__file__)
+        # 开发环境下如果 .ui 文件比预编译文件新，说明预编译文件已过期
+        if not getattr(sys, 'frozen', False) and ui_path.exists() \
+                and ui_path.stat().st_mtime > compiled_path.stat().st_mtime:
+            raise ImportError("预编译UI已过期")
+        window = QMainWindow()
+        Ui_MainWindow().setupUi(window)
+        return window
+    except ImportError as e:
+        print(f"未使用预编译UI({e})，改用QUiLoader加载")
+        from PySide6.QtUiTools import QUiLoader
+        return QUiLoader().load(str(ui_path))
 
 
 class MainWindow(QObject):
@@ -26,30 +75,31 @@ class MainWindow(QObject):
     show_error_signal = Signal(str, str)  # 参数为标题和错误消息
     create_operation_dialog_signal = Signal(str,str, bool, bool)  # 参数为窗口标题，消息文本, 是否添加确认按钮, 是否添加取消按钮
     close_operation_dialog_signal = Signal()  # 关闭操作弹窗信号
+    cover_loaded_signal = Signal(str, object)  # 封面缩略图加载完成(缓存键, QImage)
 
     def __init__(self):
         super().__init__()
-        # 加载UI文件
-        self.loader = QUiLoader()
-        ui_path = Path(__file__).parent / "ui" / "main_window.ui"
-        self.window = self.loader.load(str(ui_path))
-        # 判断是否是打包环境
-        if getattr(sys, 'frozen', False):
-            # 打包后，UI文件在临时目录的ui文件夹下
-            base_path = Path(sys._MEIPASS)
-        else:
-            # 开发环境，使用原路径
-            base_path = Path(__file__).parent
-            
-        ui_path = base_path / "ui" / "main_window.ui"
-        self.window = self.loader.load(str(ui_path))
+        # 加载UI（预编译优先，只加载一次）
+        self.window = load_main_window()
 
-        # 初始化爬虫实例(创建类实例)
-        self.spider = DouyinSpider()
+        # 账号配置（持久化浏览器目录和Cookie），爬虫和下载器共用
+        self.profile = AccountProfile()
+        # 爬虫实例在第一次使用时才创建，见 spider 属性
+        self._spider = None
+        self._verify_token = None  # 校验文件使用独立的取消令牌，不需要创建爬虫
         self.video_items = []  # 存储视频项的列表
+        # 封面缩略图：第一次显示结果时才创建缓存，只加载可见行的封面
+        self._thumbnails = None
+        self._cover_rows = {}  # {缓存键: [行号]}
+        self._cover_shown = set()  # 已显示缩略图的行，滚出视口后释放
+        self._cover_timer = QTimer(self)
+        self._cover_timer.setSingleShot(True)
+        self._cover_timer.setInterval(80)  # 滚动停顿后再加载，快速滚动时不为中间经过的行发请求
+        self._cover_timer.timeout.connect(self._load_visible_covers)
 
         # 添加下载管理相关属性
         self.downloader = None
+        self.stopping_downloaders = []  # 已取消但线程尚未退出的下载器，保持引用防止线程对象被提前回收
         self.cancel_download = False
         self.download_dialog = None
         self.download_progress_label = None
@@ -70,6 +120,12 @@ class MainWindow(QObject):
         self.btn_download = self.window.findChild(QPushButton, "btn_download")
         self.save_directory = self.window.findChild(QLineEdit, "save_directory")
         self.btn_login = self.window.findChild(QPushButton, "btn_login")  # 需要在UI文件中添加此按钮
+        self.btn_import = self.window.findChild(QPushButton, "btn_import")  # 批量导入按钮
+        self.speed_limit = self.window.findChild(QSpinBox, "speed_limit")  # 下载限速(KB/s)，0为不限速
+        self.btn_verify = self.window.findChild(QPushButton, "btn_verify")  # 校验文件库按钮
+        self.btn_export = self.window.findChild(QPushButton, "btn_export")  # 元数据导出开关
+        self.chk_postprocess = self.window.findChild(QCheckBox, "chk_postprocess")  # 下载后处理开关
+        self.export_path = None  # 元数据导出文件，为空时不导出
 
         # 设置默认保存路径
         self.set_default_download_path()                             
@@ -84,6 +140,11 @@ class MainWindow(QObject):
         self.btn_select_file.clicked.connect(self.save_path)
         self.btn_download.clicked.connect(self.download_videos)
         self.btn_login.clicked.connect(self.perform_login)
+        self.btn_import.clicked.connect(self.import_urls)
+        self.btn_verify.clicked.connect(self.verify_library)
+        self.btn_export.clicked.connect(self.toggle_export)
+        # 限速修改后立即作用于正在进行的下载（全局共享的限速器）
+        self.speed_limit.valueChanged.connect(self.set_speed_limit)
         
         # 连接自定义信号
         self.update_table_signal.connect(self.update_table)
@@ -92,36 +153,61 @@ class MainWindow(QObject):
         self.show_info_signal.connect(self.show_info_message)
         self.create_operation_dialog_signal.connect(self.create_operation_dialog)
         self.close_operation_dialog_signal.connect(self._close_operation_dialog)
+        self.cover_loaded_signal.connect(self._show_cover)
+        scroll_bar = self.table_widget.verticalScrollBar()
+        scroll_bar.valueChanged.connect(self._cover_timer.start)
+        scroll_bar.rangeChanged.connect(self._cover_timer.start)  # 窗口大小变化时可见行数也会变化
+        QApplication.instance().aboutToQuit.connect(self._close_thumbnails)
 
         
         # 连接下载管理器的信号
         # self.download.finished.connect(self.download_completed)
   
+    @property
+    def spider(self):
+        """爬虫实例，第一次访问时才导入DrissionPage并创建"""
+        if self._spider is None:
+            from core.spider import DouyinSpider
+            self._spider = DouyinSpider(profile=self.profile, detail_cache=self._create_detail_cache())
+            self._spider.export_path = self.export_path
+        return self._spider
+
     def init_table(self):
         """初始化表格设置"""
-        headers = ["标题", "URL"]
-        # 设置表格的列数。len(headers)获取headers列表的长度(这里是2)，所以表格会有2列。
+        headers = ["封面", "标题", "URL"]
+        # 设置表格的列数。len(headers)获取headers列表的长度(这里是3)，所以表格会有3列。
         self.table_widget.setColumnCount(len(headers))
-        # 设置表格的水平表头(列标题)为headers列表中的内容，即第一列标题为"标题"，第二列标题为"URL"。
+        # 设置表格的水平表头(列标题)为headers列表中的内容，即第一列标题为"封面"，第二列标题为"标题"，第三列为"URL"。
         self.table_widget.setHorizontalHeaderLabels(headers)
         
         # 设置列宽
         # self.table_widget.setColumnWidth(0, 50)   # 序号列
-        self.table_widget.setColumnWidth(0, 1000)  # 标题列
-        self.table_widget.setColumnWidth(1, 1000)  # URL列
+        self.table_widget.setColumnWidth(0, THUMB_WIDTH + 12)  # 封面列
+        self.table_widget.setColumnWidth(1, 1000)  # 标题列
+        self.table_widget.setColumnWidth(2, 1000)  # URL列
+        # 固定行高，上万行时不需要逐行计算高度
+        self.table_widget.setIconSize(QSize(THUMB_WIDTH, THUMB_HEIGHT))
+        self.table_widget.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.table_widget.verticalHeader().setDefaultSectionSize(THUMB_HEIGHT + 8)
         
         # 设置表头自适应
         # horizontalHeader()：这个方法返回表格的水平表头（QHeaderView 对象），控制表格的列。
         # setSectionResizeMode(column, mode)：这个方法设置指定列的调整模式。
         # QHeaderView.ResizeMode.Stretch：这个模式表示列会自动调整宽度以填充整个表格宽度。
-        self.table_widget.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)  # 标题列自适应
-        self.table_widget.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)  # URL列自适应
+        self.table_widget.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Fixed)  # 封面列固定宽度
+        self.table_widget.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)  # 标题列自适应
+        self.table_widget.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)  # URL列自适应
 
 
 
     def resolve_url(self):
         """解析URL按钮点击事件"""
         text = self.url_input.text().strip()
+        # 输入中包含多个链接时走批量解析
+        urls = extract_douyin_urls(text)
+        if len(urls) > 1:
+            self.resolve_batch(urls)
+            return
         url = self.extract_douyin_url(text)
         print(f"提取的URL为:{url}")
 
@@ -151,6 +237,12 @@ class MainWindow(QObject):
     def _resolve_url_thread(self, url):
         """在后台线程中解析URL"""
         try:            
+            # 解析过的视频（包括短链接）直接从详情缓存读取，不启动浏览器
+            cached = self.spider.get_cached_video(url)
+            if cached:
+                self.close_operation_dialog_signal.emit()
+                self.update_table_signal.emit([cached])
+                return
             # 将输入的URL传递给spider的resolve_url方法解析，得到最终的URL，该方法将抖音的URL短链转化为最终的跳转URL
             final_url = self.spider.resolve_url(url)
             if final_url is None:
@@ -159,7 +251,8 @@ class MainWindow(QObject):
                 return
             
             if "/video/" in final_url:
-                video_items = self.spider.get_single_video(final_url)
+                # 原始链接（短链接）也记入缓存，下次不需要再解析跳转
+                video_items = self.spider.get_single_video(final_url, aliases=(url,))
                 # 检查是否获取到视频项目,如果没有，弹出提示
                 if not video_items:  # 空列表判断
                     self.close_operation_dialog_signal.emit()
@@ -197,6 +290,9 @@ class MainWindow(QObject):
             # 发送信号更新表格（在主线程中执行）
             self.update_table_signal.emit(video_items)
             
+        except InterruptedError:
+            # 用户已取消，弹窗已由取消操作关闭，无需再提示
+            pass
         except Exception as e:
             # 错误处理：在主线程显示错误消息
             error_msg = f"解析失败: {str(e)}"
@@ -206,22 +302,69 @@ class MainWindow(QObject):
             
 
     def extract_douyin_url(self, text):
-        # 优先匹配抖音短链接格式
-        short_pattern = r'https://v\.douyin\.com/\S+[/]?'
-        short_match = re.search(short_pattern, text)
-        
-        if short_match:
-            return short_match.group(0).rstrip('/')  # 去除可能的多余斜杠
-        
-        # 如果没有短链接，尝试匹配普通抖音链接
-        normal_pattern = r'https://www\.douyin\.com/\S+[/]?'
-        normal_match = re.search(normal_pattern, text)
-        
-        if normal_match:
-            return normal_match.group(0).rstrip('/')  # 去除可能的多余斜杠
-        
-        # 如果都没有匹配到，返回空字符串
-        return ""
+        """提取第一个抖音链接（优先短链接），没有匹配到时返回空字符串"""
+        return extract_douyin_url(text)
+
+    def import_urls(self):
+        """批量导入按钮点击事件：从文本文件（如聊天记录导出）中读取全部分享链接"""
+        path, _ = QFileDialog.getOpenFileName(self.window, "选择包含分享链接的文本文件", "", "文本文件 (*.txt);;所有文件 (*)")
+        if not path:
+            return
+        try:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                urls = extract_douyin_urls(f.read())
+        except OSError as e:
+            QMessageBox.warning(self.window, "错误", f"读取文件失败: {e}")
+            return
+        if not urls:
+            QMessageBox.warning(self.window, "警告", "文件中没有找到抖音链接")
+            return
+        self.resolve_batch(urls)
+
+    def resolve_batch(self, urls):
+        """批量解析多个链接，结果合并显示在表格中"""
+        print(f"批量解析 {len(urls)} 个链接")
+        self.operation_type = "batch"
+        self.operation_cancelled = False
+        self.spider.cancel_flag = False
+        self.create_operation_dialog_signal.emit(
+            "批量解析",
+            f"正在批量解析 {len(urls)} 个链接下的视频信息...",
+            True,
+            False
+        )
+        threading.Thread(
+            target=self._resolve_batch_thread,
+            args=(urls,),
+            daemon=True
+        ).start()
+
+    def _resolve_batch_thread(self, urls):
+        """在后台线程中批量解析链接"""
+        try:
+            # 先按短码/视频ID/用户ID去重，避免重复解析同一个链接
+            resolved = self.spider.resolve_urls(dedupe_urls(urls))
+            final_urls = []
+            for final_url in resolved.values():
+                # 只支持视频链接和他人主页链接
+                if "/user/self" in final_url:
+                    continue
+                if canonical_key(final_url)[0] in ('video', 'user'):
+                    final_urls.append(final_url)
+            if not final_urls:
+                self.close_operation_dialog_signal.emit()
+                self.show_error_signal.emit("错误", "没有可解析的视频或主页链接")
+                return
+            video_items = self.spider.get_videos_batch(final_urls)
+            self.close_operation_dialog_signal.emit()
+            if not video_items:
+                self.show_error_signal.emit("警告", "未能获取视频信息，请检查链接或重试！")
+            self.update_table_signal.emit(video_items)
+        except InterruptedError:
+            pass
+        except Exception as e:
+            self.close_operation_dialog_signal.emit()
+            self.show_error_signal.emit("错误", f"批量解析失败: {str(e)}")
     def get_favorites(self):
         """处理收藏按钮点击事件"""
         # 设置操作类型
@@ -250,11 +393,9 @@ class MainWindow(QObject):
             # 检查操作是否被取消
             if self.operation_cancelled:
                 return           
-            # 创建不可见浏览器headless=True,调试时可以设置headless=False
-            self.spider.create_browser(headless=True)
-            
-            # 检查登录状态
-            is_logged_in = self.spider.check_login_status()
+            # 检查登录状态：优先用保存的Cookie快速判断，无效时才启动浏览器确认
+            # 浏览器模式与获取收藏时一致，确认后直接复用同一个浏览器
+            is_logged_in = self.spider.ensure_login(headless=False)
               
             if not is_logged_in:
                 # ✅ 使用信号关闭操作弹窗
@@ -315,11 +456,9 @@ class MainWindow(QObject):
             # 检查操作是否被取消
             if self.operation_cancelled:
                 return
-            # 创建不可见浏览器
-            self.spider.create_browser(headless=True)
-            
-            # 检查登录状态
-            is_logged_in = self.spider.check_login_status()
+            # 检查登录状态：优先用保存的Cookie快速判断，无效时才启动浏览器确认
+            # 浏览器模式与获取喜欢时一致，确认后直接复用同一个浏览器
+            is_logged_in = self.spider.ensure_login(headless=True)
         
             if not is_logged_in:
                 # 未登录状态处理
@@ -392,12 +531,13 @@ class MainWindow(QObject):
         try:
             if self.operation_cancelled:
                 return
-            # 创建可见浏览器
-            self.spider.create_browser(False)            
+            # 创建可见浏览器，打开首页供用户登录（浏览器使用持久化目录，之前登录过会直接检测为已登录）
+            self.spider.create_browser(False)
+            self.spider.page.get('https://www.douyin.com/')
             
             # 计时器
             start_time = time.time()
-            check_interval = 3  # 检查间隔(秒)
+            check_interval = 1  # 检查间隔(秒)，登录检查只读取Cookie，开销很小
             timeout = 60  # 超时时间(秒)
             
             # 检测循环
@@ -428,8 +568,9 @@ class MainWindow(QObject):
                     )
                     return
                 
-                # 等待下一次检查
-                time.sleep(check_interval)
+                # 等待下一次检查，取消时立即醒来
+                if self.spider.cancel_token.wait(check_interval):
+                    return
         
         except Exception as e:
             # 如果操作被取消，不显示错误信息
@@ -502,8 +643,11 @@ class MainWindow(QObject):
 
     def _cancel_operation(self):
         """处理操作取消"""
-        # 设置取消标志
-        self.spider.cancel_flag = True
+        # 设置取消标志（爬虫还没创建时没有需要取消的操作）
+        if self._spider is not None:
+            self._spider.cancel_flag = True
+        if self._verify_token is not None:
+            self._verify_token.cancel()
         self.operation_cancelled = True
         
         # 根据操作类型执行不同的取消处理
@@ -514,7 +658,7 @@ class MainWindow(QObject):
             except Exception as e:
                 print(f"关闭浏览器时出错: {str(e)}")
             self.show_info_signal.emit("操作取消", "登录操作已取消")           
-        elif self.operation_type in ["favorites", "likes" ,"resolve"]:
+        elif self.operation_type in ["favorites", "likes" ,"resolve", "batch", "verify"]:
             # 收藏/喜欢操作取消
             self.show_info_signal.emit("操作取消", "获取操作已取消")
         
@@ -541,6 +685,10 @@ class MainWindow(QObject):
         self.btn_download.setEnabled(enabled)
         self.btn_login.setEnabled(enabled)  # 如果存在登录按钮
         self.btn_select_file.setEnabled(enabled)  # 如果存在选择路径按钮
+        self.btn_import.setEnabled(enabled)
+        self.btn_verify.setEnabled(enabled)
+        self.btn_export.setEnabled(enabled)
+        self.chk_postprocess.setEnabled(enabled)
         
         # 输入控件
         self.url_input.setEnabled(enabled)
@@ -565,6 +713,27 @@ class MainWindow(QObject):
         # 设置控件文本
         self.save_directory.setText(download_path)
 
+    def set_speed_limit(self, kb_per_second):
+        """设置下载限速（KB/s），0表示不限速"""
+        bandwidth_limiter.set_rate(kb_per_second * 1024)
+
+    def toggle_export(self, checked):
+        """元数据导出开关：打开时选择导出文件，之后每次抓取都会把解析到的视频元数据逐条追加写入"""
+        if checked:
+            path, _ = QFileDialog.getSaveFileName(
+                self.window, "选择元数据导出文件", os.path.join(self.save_directory.text(), "douyin_metadata.jsonl"),
+                "JSON Lines (*.jsonl);;CSV (*.csv);;Parquet (*.parquet)")
+            if not path:
+                self.btn_export.setChecked(False)
+                return
+            self.export_path = path
+            self.btn_export.setText(f"导出: {os.path.basename(path)}")
+        else:
+            self.export_path = None
+            self.btn_export.setText("导出元数据")
+        if self._spider is not None:
+            self._spider.export_path = self.export_path
+
     def save_path(self):
         """打开文件夹选择对话框"""
         path = QFileDialog.getExistingDirectory(self.window, "选择保存路径")
@@ -575,32 +744,89 @@ class MainWindow(QObject):
     def update_table(self, video_items):
         """更新整个表格（在主线程执行）"""
         self.video_items = video_items
+        self._cover_shown.clear()
+        self.table_widget.clearContents()  # 清除上次结果的封面
         self.table_widget.setRowCount(len(video_items))
         
-        # 更新每一行
+        # 更新每一行，封面列由 _load_visible_covers 在该行可见时加载
+        self._cover_rows = {}
         for i, video in enumerate(video_items):
             self.update_table_row(i, video)
+            key = thumbnail_key(video)
+            if key:
+                self._cover_rows.setdefault(key, []).append(i)
+        self._cover_timer.start()
     
     @Slot(int, object)
     def update_table_row(self, row_index, video_item):
         """更新表格的某一行（在主线程执行）"""
 
         # 标题列
-        title_item = self.table_widget.item(row_index, 0)
+        title_item = self.table_widget.item(row_index, 1)
         if title_item is None:
             title_item = QTableWidgetItem()
-            self.table_widget.setItem(row_index, 0, title_item)
+            self.table_widget.setItem(row_index, 1, title_item)
         title_item.setText(video_item.title)
         title_item.setToolTip(video_item.title)  # 添加悬停提示
         
         # URL列
-        url_item = self.table_widget.item(row_index, 1)
+        url_item = self.table_widget.item(row_index, 2)
         if url_item is None:
             url_item = QTableWidgetItem()
-            self.table_widget.setItem(row_index, 1, url_item)
+            self.table_widget.setItem(row_index, 2, url_item)
         url_item.setText(video_item.url)
         url_item.setToolTip(video_item.url)  # 添加悬停提示
 
+    @property
+    def thumbnails(self):
+        """封面缩略图缓存（内存 + 磁盘），第一次使用时创建"""
+        if self._thumbnails is None:
+            self._thumbnails = ThumbnailCache(decode=decode_cover)
+        return self._thumbnails
+
+    def _load_visible_covers(self):
+        """加载可见行（以及上下各半屏）的封面，释放已滚出范围的缩略图"""
+        count = len(self.video_items)
+        first = self.table_widget.rowAt(0)
+        if not count or first < 0:
+            return
+        last = self.table_widget.rowAt(self.table_widget.viewport().height() - 1)
+        if last < 0:
+            last = count - 1
+        extra = (last - first + 1) // 2
+        rows = range(max(0, first - extra), min(count, last + extra + 1))
+        # 滚出范围的行释放缩略图，内存占用只与可见行数有关
+        for row in self._cover_shown - set(rows):
+            item = self.table_widget.item(row, 0)
+            if item:
+                item.setData(Qt.ItemDataRole.DecorationRole, None)
+        self._cover_shown &= set(rows)
+        wanted = [(row, thumbnail_key(self.video_items[row])) for row in rows if row not in self._cover_shown]
+        wanted = [(row, key) for row, key in wanted if key]
+        self.thumbnails.set_visible(key for _, key in wanted)
+        for row, key in wanted:
+            self.thumbnails.request(key, self.video_items[row].cover, self.cover_loaded_signal.emit)
+
+    @Slot(str, object)
+    def _show_cover(self, key, image):
+        """显示加载完成的封面（在主线程执行）"""
+        pixmap = None
+        for row in self._cover_rows.get(key, []):
+            if row >= len(self.video_items) or row in self._cover_shown:
+                continue
+            item = self.table_widget.item(row, 0)
+            if item is None:
+                item = QTableWidgetItem()
+                item.setFlags(Qt.ItemFlag.ItemIsEnabled)
+                self.table_widget.setItem(row, 0, item)
+            pixmap = pixmap or QPixmap.fromImage(image)
+            item.setData(Qt.ItemDataRole.DecorationRole, pixmap)
+            self._cover_shown.add(row)
+
+    def _close_thumbnails(self):
+        if self._thumbnails:
+            self._thumbnails.close()
+
     @Slot(str, str)
     def show_info_message(self, title, message):
         """显示信息消息对话框"""
@@ -624,8 +850,8 @@ class MainWindow(QObject):
         """启动下载过程"""
         save_path = self.save_directory.text()
         
-        # 验证路径
-        if not save_path or not os.path.isdir(save_path):
+        # 验证路径（s3:// 开头的保存位置直接上传到对象存储）
+        if not save_path or not (save_path.startswith('s3://') or os.path.isdir(save_path)):
             QMessageBox.warning(self.window, "路径错误", "请选择有效的保存路径")
             return
         
@@ -642,8 +868,26 @@ class MainWindow(QObject):
         # 重置取消标志
         self.cancel_download = False
         
-        # 创建并启动下载线程
-        self.downloader = Downloader(self.video_items, save_path)
+        # 清理已经退出的旧下载线程
+        self.stopping_downloaders = [d for d in self.stopping_downloaders if d.isRunning()]
+
+        # 创建并启动下载线程（第一次下载时才导入requests）
+        from core.downloader import Downloader
+        postprocessor = None
+        if self.chk_postprocess.isChecked():
+            from core.postprocess import PostProcessor
+            try:
+                postprocessor = PostProcessor()
+            except RuntimeError as e:
+                QMessageBox.warning(self.window, "下载后处理", f"{e}，本次只下载不处理")
+        # 播放地址会过期：下载前刷新即将过期的地址（需要时才启动浏览器）
+        from core.refresh import PlayUrlRefresher
+        refresher = PlayUrlRefresher(lambda aweme_ids: self.spider.refresh_videos(aweme_ids),
+                                     cancel=self._cancel_spider)
+        if self._spider is not None:
+            self._spider.cancel_flag = False
+        self.downloader = Downloader(self.video_items, save_path, profile=self.profile, postprocessor=postprocessor,
+                                     refresher=refresher)
 
         # 连接信号
         try:
@@ -656,8 +900,53 @@ class MainWindow(QObject):
         self.downloader.finished.connect(self.download_completed)
         self.downloader.error.connect(self.download_failed)
         self.downloader.progress.connect(self._update_download_progress)
+        self.downloader.postprocess_progress.connect(self._update_postprocess_progress)
         self.downloader.start()
 
+    def verify_library(self):
+        """校验文件按钮点击事件：重新校验保存位置中的全部视频文件"""
+        save_path = self.save_directory.text()
+        if not save_path or not os.path.isdir(save_path):
+            QMessageBox.warning(self.window, "路径错误", "请选择有效的保存路径")
+            return
+        self.operation_type = "verify"
+        self.operation_cancelled = False
+        # 纯文件操作，使用独立的取消令牌，不为此导入DrissionPage和创建爬虫
+        self._verify_token = CancelToken()
+        self.create_operation_dialog_signal.emit(
+            "校验文件",
+            "正在校验已下载的视频文件...",
+            True,
+            False
+        )
+        threading.Thread(
+            target=self._verify_library_thread,
+            args=(save_path, self._verify_token),
+            daemon=True
+        ).start()
+
+    def _verify_library_thread(self, save_path, cancel_token):
+        """在后台线程中校验文件库"""
+        from core.integrity import verify_library
+        try:
+            # 弹窗中的取消按钮可以中断校验
+            ok_count, bad = verify_library(save_path, cancel_token=cancel_token)
+            self.close_operation_dialog_signal.emit()
+            if bad:
+                names = "\n".join(f"{name}: {error}" for name, error in bad[:20])
+                more = f"\n...等共 {len(bad)} 个" if len(bad) > 20 else ""
+                self.show_error_signal.emit(
+                    "校验完成",
+                    f"校验通过 {ok_count} 个，失败 {len(bad)} 个（再次下载时会自动重新下载）：\n{names}{more}"
+                )
+            else:
+                self.show_info_signal.emit("校验完成", f"全部 {ok_count} 个文件校验通过")
+        except InterruptedError:
+            pass
+        except Exception as e:
+            self.close_operation_dialog_signal.emit()
+            self.show_error_signal.emit("错误", f"校验失败: {str(e)}")
+
     def _create_download_dialog(self):
         """创建下载进度弹窗"""
         # 检查是否已存在下载对话框（self.download_dialog），如果存在则先关闭它
@@ -668,8 +957,8 @@ class MainWindow(QObject):
         self.download_dialog.setWindowTitle("下载进度")
         # 设置为模态对话框（setModal(True)），这意味着显示此对话框时会阻止用户与其他窗口交互
         self.download_dialog.setModal(True)
-        # 固定对话框大小为400x150像素
-        self.download_dialog.setFixedSize(400, 150)
+        # 固定对话框大小为400x180像素
+        self.download_dialog.setFixedSize(400, 180)
         
         # 进度标签
         self.download_progress_label = QLabel("正在准备下载...", self.download_dialog)
@@ -683,6 +972,16 @@ class MainWindow(QObject):
         # 初始化进度条值为0
         self.progress_bar.setValue(0)
                 
+        # 限速设置：弹窗是模态的，下载过程中在这里调整限速，与主窗口的限速框同步
+        dialog_speed_limit = QSpinBox(self.download_dialog)
+        dialog_speed_limit.setRange(self.speed_limit.minimum(), self.speed_limit.maximum())
+        dialog_speed_limit.setSingleStep(self.speed_limit.singleStep())
+        dialog_speed_limit.setSpecialValueText(self.speed_limit.specialValueText())
+        dialog_speed_limit.setPrefix("限速：")
+        dialog_speed_limit.setSuffix(self.speed_limit.suffix())
+        dialog_speed_limit.setValue(self.speed_limit.value())
+        dialog_speed_limit.valueChanged.connect(self.speed_limit.setValue)
+
         # 取消按钮,创建了一个QPushButton按钮对象，并连接了点击事件
         self.download_cancel_button = QPushButton("取消下载", self.download_dialog)
         # 将按钮点击信号与_cancel_download槽函数连接
@@ -693,6 +992,7 @@ class MainWindow(QObject):
         # 将标签添加到布局中才能显示
         layout.addWidget(self.download_progress_label)
         layout.addWidget(self.progress_bar)
+        layout.addWidget(dialog_speed_limit)
         layout.addWidget(self.download_cancel_button)
         
         # 展示弹窗
@@ -712,11 +1012,41 @@ class MainWindow(QObject):
             # 表格数据自动滚动到最后，确保用户可以看到最新的下载进度信息
             self.table_widget.scrollToBottom()
 
+    @staticmethod
+    def _create_detail_cache():
+        """创建单个视频的详情缓存，失败时不使用缓存"""
+        from core.detail_cache import DetailCache
+        try:
+            return DetailCache()
+        except Exception as e:
+            print(f"⚠️ 打开详情缓存失败，将不使用缓存: {e}")
+            return None
+
+    def _cancel_spider(self):
+        """取消爬虫正在进行的操作（爬虫还没创建时什么都不做）"""
+        if self._spider is not None:
+            self._spider.cancel_flag = True
+
+    def _update_postprocess_progress(self, current, total, message):
+        """更新后处理进度（与下载进度显示在同一个弹窗中）"""
+        if self.download_progress_label:
+            self.download_progress_label.setText(f"后处理: {current}/{total} {message}")
+
     def _cancel_download(self):
         """取消下载操作"""
         self.cancel_download = True
         if self.downloader:
             self.downloader.cancel()
+            # 断开旧下载线程的信号，它稍后结束时不会干扰紧接着开始的新任务
+            try:
+                self.downloader.finished.disconnect()
+                self.downloader.error.disconnect()
+                self.downloader.progress.disconnect()
+                self.downloader.postprocess_progress.disconnect()
+            except:
+                pass
+            self.stopping_downloaders.append(self.downloader)
+            self.downloader = None
         
         if self.download_dialog:
             self.download_dialog.close()
@@ -754,8 +1084,29 @@ class MainWindow(QObject):
         except:
             pass
 
+def report_startup_time(app, report_file=None):
+    """启动耗时测试：窗口显示后立即输出耗时并退出，供 tools/bench_startup.py 使用
+        打包后的程序没有控制台，此时把结果写到 report_file 中
+    """
+    elapsed = (time.perf_counter() - START_TIME) * 1000
+    line = f"STARTUP_MS={elapsed:.1f}"
+    if report_file:
+        with open(report_file, 'w', encoding='utf-8') as f:
+            f.write(line)
+    else:
+        print(line, flush=True)
+    app.quit()
+
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
+    for arg in sys.argv[1:]:
+        # 用法：--startup-benchmark 或 --startup-benchmark=结果文件路径
+        if arg.startswith("--startup-benchmark"):
+            report_file = arg.partition("=")[2] or None
+            # 事件循环开始处理后（窗口已绘制）再统计
+            QTimer.singleShot(0, lambda: report_startup_time(app, report_file))
+            break
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,219 @@
+'''下载器基准测试：在本地模拟CDN（tools/fake_cdn.py）上运行 Downloader，报告吞吐量、单文件耗时、CPU和内存
+    每次修改下载路径后运行一次，与之前保存的结果对比，发现性能回退或正确性问题
+    用法：
+        python tools/bench_download.py                                  # 运行全部场景
+        python tools/bench_download.py --scenario baseline faults --count 100 --workers 4
+        python tools/bench_download.py --json result.json               # 保存结果
+        python tools/bench_download.py --compare result.json            # 与之前的结果对比
+    场景（模拟CDN的参数见 SCENARIOS）：
+        baseline  —— 无延迟、无故障，测下载器本身的开销
+        latency   —— 每个请求有延迟和抖动
+        throttled —— 每个连接限速，测并发下载的效果
+        faults    —— 随机403/429/传输中途断开，测重试和校验
+        expiring  —— 地址几秒后过期，测播放地址刷新
+    模拟CDN在独立进程中运行，统计的CPU和内存只包含下载器所在的进程
+    正确性：所有下载成功的文件大小必须与模拟CDN一致（内容已由下载器同步校验），失败数会单独列出
+'''
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+# 不使用系统/环境中配置的代理访问本地模拟CDN
+for name in ('DOUYIN_PROXIES', 'DOUYIN_PROXY_FILE'):
+    os.environ.pop(name, None)
+os.environ['NO_PROXY'] = '127.0.0.1,localhost'
+
+from core.downloader import Downloader
+from core.models import VideoItem
+from core.procstat import PeakRssTracker
+from core.ratelimit import BandwidthLimiter
+from core.refresh import PlayUrlRefresher
+
+SCENARIOS = {
+    'baseline': [],
+    'latency': ['--latency', '150', '--jitter', '100'],
+    'throttled': ['--bandwidth', '4MB'],
+    'faults': ['--p403', '0.02', '--p429', '0.05', '--p-reset', '0.05'],
+    'expiring': ['--expires', '3', '--bandwidth', '8MB'],
+}
+
+
+class BenchDownloader(Downloader):
+    """记录每个文件的下载耗时（重试的多次尝试累加）"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.file_times = {}
+        self.attempts = 0
+        self._times_lock = threading.Lock()
+
+    def _download_file(self, session, url, headers, file_path, size=None, aweme_id=None):
+        start = time.monotonic()
+        try:
+            return super()._download_file(session, url, headers, file_path, size, aweme_id)
+        finally:
+            with self._times_lock:
+                self.attempts += 1
+                self.file_times[file_path] = self.file_times.get(file_path, 0) + time.monotonic() - start
+
+
+def percentile(values, p):
+    """最近秩法百分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+def start_cdn(args):
+    """在子进程中启动模拟CDN，返回 (进程, 地址)"""
+    process = subprocess.Popen([sys.executable, str(ROOT / 'tools' / 'fake_cdn.py'), *args],
+                               stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline().strip()
+    if not line.startswith('READY '):
+        process.kill()
+        raise RuntimeError(f"模拟CDN启动失败: {line}")
+    return process, line.split(' ', 1)[1]
+
+
+def fetch_json(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return json.load(response)
+
+
+def sample_memory(tracker, stop):
+    while not stop.wait(0.05):
+        tracker.sample()
+
+
+def run_scenario(name, cdn_args, options):
+    process, base_url = start_cdn(cdn_args + ['--sizes', options.sizes, '--seed', str(options.seed)])
+    save_path = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    try:
+        manifest = fetch_json(f"{base_url}/manifest?count={options.count}")
+        expected = {entry['aweme_id']: entry['data_size'] for entry in manifest}
+        videos = [VideoItem(url=entry['url'], title=entry['title'], aweme_id=entry['aweme_id'],
+                            data_size=None if options.head else entry['data_size']) for entry in manifest]
+
+        def refresh(aweme_ids):
+            entries = fetch_json(f"{base_url}/manifest?ids={','.join(aweme_ids)}")
+            return {entry['aweme_id']: VideoItem(entry['url'], entry['title'], entry['aweme_id'], entry['data_size'])
+                    for entry in entries}
+
+        downloader = BenchDownloader(videos, save_path, chunk_size=options.chunk_size, max_workers=options.workers,
+                                     limiter=BandwidthLimiter(), retries=options.retries, reserve_bytes=0,
+                                     refresher=PlayUrlRefresher(refresh, margin=1, cooldown=1))
+        tracker = PeakRssTracker()
+        stop = threading.Event()
+        sampler = threading.Thread(target=sample_memory, args=(tracker, stop), daemon=True)
+        sampler.start()
+        cpu_start = os.times()
+        start = time.monotonic()
+        downloader.run()  # 直接在当前线程中运行
+        wall = time.monotonic() - start
+        cpu_end = os.times()
+        stop.set()
+        sampler.join()
+        tracker.sample()
+
+        succeeded = {path for ok, path in downloader.results.values() if ok}
+        mismatched = [path for aweme_id, (ok, path) in downloader.results.items()
+                      if ok and os.path.getsize(path) != expected[aweme_id]]
+        total_bytes = sum(os.path.getsize(path) for path in succeeded)
+        times = [seconds for path, seconds in downloader.file_times.items() if path in succeeded]
+        cpu = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+        return {
+            'scenario': name,
+            'files': len(videos),
+            'succeeded': len(succeeded),
+            'failed': len(videos) - len(succeeded),
+            'size_mismatch': len(mismatched),
+            'attempts': downloader.attempts,
+            'refreshed': downloader.refresher.refreshed,
+            'mb': total_bytes / 1024 / 1024,
+            'seconds': wall,
+            'throughput': total_bytes / 1024 / 1024 / wall if wall else 0.0,
+            'p50': percentile(times, 50),
+            'p99': percentile(times, 99),
+            'cpu_seconds': cpu,
+            'cpu_percent': cpu / wall * 100 if wall else 0.0,
+            'peak_rss_mb': tracker.peak / 1024 / 1024,
+            'rss_growth_mb': (tracker.peak - tracker.start) / 1024 / 1024,
+            'server': fetch_json(f"{base_url}/stats"),
+        }
+    finally:
+        process.terminate()
+        process.wait()
+        shutil.rmtree(save_path, ignore_errors=True)
+
+
+def print_result(result):
+    print(f"[{result['scenario']}] 成功 {result['succeeded']}/{result['files']}（失败 {result['failed']}，"
+          f"大小不符 {result['size_mismatch']}，请求 {result['attempts']} 次，刷新地址 {result['refreshed']} 个）")
+    print(f"    {result['mb']:.1f}MB 用时 {result['seconds']:.2f}秒，吞吐量 {result['throughput']:.1f}MB/s，"
+          f"单文件 p50={result['p50'] * 1000:.0f}ms p99={result['p99'] * 1000:.0f}ms")
+    print(f"    CPU {result['cpu_seconds']:.2f}秒（{result['cpu_percent']:.0f}%），内存峰值 {result['peak_rss_mb']:.1f}MB"
+          f"（增长 {result['rss_growth_mb']:.1f}MB），服务端 {result['server']}")
+
+
+def compare(results, path):
+    """与之前保存的结果对比，吞吐量下降或耗时增加超过10%时标出"""
+    with open(path, encoding='utf-8') as f:
+        previous = {entry['scenario']: entry for entry in json.load(f)}
+    print(f"\n与 {path} 对比：")
+    for result in results:
+        old = previous.get(result['scenario'])
+        if not old:
+            continue
+        changes = []
+        for key, higher_is_better in (('throughput', True), ('p50', False), ('p99', False), ('cpu_seconds', False),
+                                      ('peak_rss_mb', False)):
+            if not old[key]:
+                continue
+            change = (result[key] - old[key]) / old[key] * 100
+            worse = change < -10 if higher_is_better else change > 10
+            changes.append(f"{key} {change:+.0f}%{' ⚠️' if worse else ''}")
+        if result['failed'] > old['failed'] or result['size_mismatch']:
+            changes.append(f"失败 {old['failed']}→{result['failed']} ⚠️")
+        print(f"[{result['scenario']}] " + '，'.join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="下载器基准测试")
+    parser.add_argument("--scenario", nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--count", type=int, default=40, help="每个场景下载的文件数")
+    parser.add_argument("--sizes", default="lognormal:4MB:0.8", help="文件大小分布，格式见 tools/fake_cdn.py")
+    parser.add_argument("--workers", type=int, default=3, help="同时下载的文件数")
+    parser.add_argument("--chunk-size", type=int, default=1024 * 1024, help="下载块大小（字节）")
+    parser.add_argument("--retries", type=int, default=2, help="失败文件重新排队的次数")
+    parser.add_argument("--head", action="store_true", help="不提供 data_size，下载前用HEAD请求预取大小")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="把结果保存为JSON")
+    parser.add_argument("--compare", help="与之前保存的JSON结果对比")
+    options = parser.parse_args()
+
+    results = []
+    for name in options.scenario:
+        result = run_scenario(name, SCENARIOS[name], options)
+        print_result(result)
+        results.append(result)
+    if options.compare:
+        compare(results, options.compare)
+    if options.json:
+        with open(options.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {options.json}")
+
+
+if __name__ == "__main__":
+    main()
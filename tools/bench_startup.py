@@ -0,0 +1,60 @@
+'''启动耗时测试：分别测量源码运行和PyInstaller打包程序从启动到主窗口显示的耗时
+    用法：
+        python tools/bench_startup.py                 # 只测源码
+        python tools/bench_startup.py --exe dist/DouyinDownloader.exe   # 同时测打包程序
+        python tools/bench_startup.py --runs 10
+    输出两个时间：
+        wall   —— 进程启动到退出的总耗时（包含解释器启动、单文件解包等）
+        window —— 程序内部统计的 main.py 开始执行到主窗口显示的耗时
+'''
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def run_once(cmd):
+    """运行一次，返回(总耗时ms, 窗口耗时ms)"""
+    fd, report_file = tempfile.mkstemp(suffix=".txt")
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        subprocess.run(cmd + [f"--startup-benchmark={report_file}"], cwd=ROOT, check=True, timeout=120)
+        wall = (time.perf_counter() - start) * 1000
+        with open(report_file, encoding="utf-8") as f:
+            window = float(f.read().strip().partition("=")[2])
+        return wall, window
+    finally:
+        os.remove(report_file)
+
+
+def bench(name, cmd, runs):
+    """多次运行并打印统计结果（第一次为冷启动，单独显示）"""
+    results = [run_once(cmd) for _ in range(runs)]
+    walls = [r[0] for r in results]
+    windows = [r[1] for r in results]
+    print(f"{name}: 冷启动 wall={walls[0]:.0f}ms window={windows[0]:.0f}ms")
+    if runs > 1:
+        print(f"{name}: 热启动中位数 wall={statistics.median(walls[1:]):.0f}ms "
+              f"window={statistics.median(windows[1:]):.0f}ms (共{runs - 1}次)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时测试")
+    parser.add_argument("--runs", type=int, default=5, help="每种方式运行次数")
+    parser.add_argument("--exe", help="PyInstaller打包后的程序路径")
+    args = parser.parse_args()
+
+    bench("源码", [sys.executable, str(ROOT / "main.py")], args.runs)
+    if args.exe:
+        bench("打包", [str(Path(args.exe).resolve())], args.runs)
+
+
+if __name__ == "__main__":
+    main()
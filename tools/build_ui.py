@@ -0,0 +1,34 @@
+'''预编译界面文件：使用 pyside6-uic 把 ui/main_window.ui 编译为 ui/ui_main_window.py
+    程序启动时直接导入编译结果，省去 QUiLoader 解析XML的时间
+    只有 .ui 文件比编译结果新时才会重新编译（缓存），打包时由 DouyinDownloader.spec 自动调用
+    用法：python tools/build_ui.py [--force]
+'''
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+UI_FILE = ROOT / "ui" / "main_window.ui"
+COMPILED_FILE = ROOT / "ui" / "ui_main_window.py"
+
+
+def build_ui(force=False):
+    """编译UI文件，返回编译结果路径；编译工具不存在时返回None"""
+    if not force and COMPILED_FILE.exists() \
+            and COMPILED_FILE.stat().st_mtime >= UI_FILE.stat().st_mtime:
+        print(f"预编译UI已是最新: {COMPILED_FILE}")
+        return COMPILED_FILE
+
+    uic = shutil.which("pyside6-uic")
+    if not uic:
+        print("⚠️ 未找到 pyside6-uic，程序将回退到运行时加载 .ui 文件")
+        return None
+
+    subprocess.run([uic, str(UI_FILE), "-o", str(COMPILED_FILE)], check=True)
+    print(f"✅ 已生成预编译UI: {COMPILED_FILE}")
+    return COMPILED_FILE
+
+
+if __name__ == "__main__":
+    build_ui(force="--force" in sys.argv)
@@ -0,0 +1,157 @@
+'''无头模式指纹检查：不访问抖音，在本地页面中采集浏览器指纹，检查无头模式伪装是否自洽（见 core/stealth.py）
+    用法：
+        python tools/check_headless.py --offline        # 不启动浏览器：检查伪装设置（HeadlessProfile）推算出的指纹，
+                                                        # 并用 tools/fixtures/fingerprints.json 中的样本检查规则本身
+        python tools/check_headless.py                  # 启动伪装后的无头浏览器检查（主页面和新标签页）
+        python tools/check_headless.py --mode raw       # 未伪装的无头浏览器（对照，应当检查不通过）
+        python tools/check_headless.py --mode headful   # 可见浏览器（对照）
+    检查页面由本地HTTP服务提供（127.0.0.1，安全上下文下才有 navigator.userAgentData），同时记录请求头，
+    核对请求头中的UA/Client Hints/语言与页面中 navigator 上的值是否一致；有问题时退出码为1
+'''
+import argparse
+import json
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from core.stealth import COLLECT_SCRIPT, HeadlessProfile, check_fingerprint
+
+FIXTURES = ROOT / 'tools' / 'fixtures' / 'fingerprints.json'
+# 检查伪装设置时使用的浏览器版本（UA只带主版本号，Client Hints带完整版本号）
+VERSIONS = ('120.0.6099.71', '138.0.7204.97', '141.0.7390.55')
+PAGE = f"<!DOCTYPE html><html><head><meta charset='utf-8'><script>{COLLECT_SCRIPT}</script></head>" \
+       f"<body>fingerprint</body></html>".encode('utf-8')
+
+
+def check_profile(profile=None):
+    """检查伪装设置本身：按 HeadlessProfile 实际下发的UA/Client Hints/语言推算出的指纹和请求头应当检查通过，
+        修补脚本中的占位符应当全部替换
+    """
+    profile = profile or HeadlessProfile()
+    ok = True
+    for version in VERSIONS:
+        problems = check_fingerprint(*profile.fingerprint(version))
+        if '__' in profile.script().replace('__fingerprint', ''):
+            problems.append("修补脚本中有未替换的占位符")
+        ok = ok and not problems
+        print(f"{'✅' if not problems else '❌'} 伪装设置 Chrome {version}: {profile.user_agent(version)}")
+        for problem in problems:
+            print(f"    - {problem}")
+    return ok
+
+
+def check_offline():
+    """检查伪装设置，并用样本检查规则：正常桌面Chrome应当通过，其余样本应当检查出问题"""
+    profile_ok = check_profile()
+    with open(FIXTURES, encoding='utf-8') as f:
+        samples = json.load(f)
+    failed = 0
+    for name, sample in samples.items():
+        problems = check_fingerprint(sample['fingerprint'], sample.get('headers'))
+        ok = not problems
+        status = '✅' if ok == sample['expect_ok'] else '❌'
+        failed += ok != sample['expect_ok']
+        print(f"{status} {name}: {'通过' if ok else f'{len(problems)} 个问题'}（预期{'通过' if sample['expect_ok'] else '不通过'}）")
+        for problem in problems:
+            print(f"    - {problem}")
+    return profile_ok and failed == 0
+
+
+def start_server():
+    """本地检查页面，返回 (服务, 地址, 请求头记录)"""
+    records = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == '/':
+                records.append({key.lower(): value for key, value in self.headers.items()})
+                body = PAGE
+            else:
+                body = b''
+            self.send_response(200 if body else 404)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/", records
+
+
+def collect(page, url, records, timeout=10):
+    """打开检查页面，返回 (指纹, 请求头)"""
+    count = len(records)
+    page.get(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        fingerprint = page.run_js('return window.__fingerprint || null;')
+        if fingerprint:
+            return fingerprint, records[count] if len(records) > count else None
+        time.sleep(0.2)
+    raise TimeoutError("检查页面没有返回指纹")
+
+
+def report(name, fingerprint, headers):
+    problems = check_fingerprint(fingerprint, headers)
+    print(f"{'✅' if not problems else '❌'} {name}: {fingerprint.get('userAgent')}")
+    print(f"    视口 {fingerprint.get('innerWidth')}x{fingerprint.get('innerHeight')}，"
+          f"WebGL {fingerprint.get('webglRenderer')}，webdriver={fingerprint.get('webdriver')}")
+    for problem in problems:
+        print(f"    - {problem}")
+    return not problems
+
+
+def check_browser(mode, port):
+    from DrissionPage import ChromiumOptions, ChromiumPage
+    from core.profile import AccountProfile
+    from core.spider import DouyinSpider
+
+    server, url, records = start_server()
+    # 使用临时账号目录，不影响真实账号的登录状态
+    spider = DouyinSpider(profile=AccountProfile('headless-check', tempfile.mkdtemp(prefix='headless_check_')),
+                          port=port)
+    spider.resource_blocker = None
+    page = None
+    try:
+        if mode == 'raw':
+            co = ChromiumOptions().headless(True).set_local_port(port)
+            co.set_user_data_path(spider.profile.user_data_dir)
+            page = ChromiumPage(co)
+        else:
+            page = spider.create_browser(headless=mode == 'stealth')
+        ok = report(f"{mode} 主页面", *collect(page, url, records))
+        # 批量抓取时使用新标签页，同样需要伪装
+        tab = page.new_tab()
+        if mode == 'stealth':
+            spider.headless_profile.apply(tab)
+        ok = report(f"{mode} 新标签页", *collect(tab, url, records)) and ok
+        return ok
+    finally:
+        if mode == 'raw' and page:
+            page.quit()
+        spider.close_browser()
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无头模式指纹检查")
+    parser.add_argument("--offline", action="store_true", help="只用样本检查规则，不启动浏览器")
+    parser.add_argument("--mode", choices=('stealth', 'raw', 'headful'), default='stealth', help="浏览器模式")
+    parser.add_argument("--port", type=int, default=9555, help="浏览器调试端口")
+    args = parser.parse_args()
+    ok = check_offline() if args.offline else check_browser(args.mode, args.port)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+'''本地模拟视频CDN：为下载器的压力测试/基准测试提供可控的服务端（只依赖标准库）
+    用法：
+        python tools/fake_cdn.py --port 8000
+        python tools/fake_cdn.py --sizes lognormal:8MB:0.8 --latency 50 --bandwidth 5MB --p429 0.02 --p-reset 0.02
+        python tools/fake_cdn.py --expires 30 --certfile cert.pem --keyfile key.pem     # HTTPS + 30秒后过期的地址
+    接口：
+        GET /manifest?count=N         —— 视频列表（JSON: aweme_id, title, url, data_size），url中带 x-expires 过期时间
+        GET /manifest?ids=1,2,3       —— 按视频ID重新签发地址（模拟刷新播放地址）
+        GET|HEAD /video/{id}.mp4      —— 视频内容，支持Range请求；大小由视频ID和随机种子确定，多次请求内容一致
+        GET /stats                    —— 服务端统计（各状态码次数、发送字节数、主动断开次数）
+    视频内容是结构合法的MP4（ftyp/moov/mdat），可以通过下载器的同步校验
+    启动后向标准输出打印一行 "READY <地址>"，供基准测试脚本读取
+'''
+import argparse
+import json
+import math
+import random
+import re
+import socket
+import ssl
+import struct
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from core.ratelimit import BandwidthLimiter
+
+UNITS = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+# 文件头：ftyp(24) + moov(16) + mdat扩展头(16)
+HEADER_SIZE = 56
+MIN_SIZE = HEADER_SIZE + 1
+PATTERN = random.Random(0).randbytes(64 * 1024)  # mdat内容按此循环填充
+SEND_CHUNK = 64 * 1024
+VIDEO_PATH = re.compile(r'^/video/(\d+)\.mp4$')
+
+
+def parse_bytes(text):
+    """解析 "8MB"、"512KB"、"1048576" 格式的字节数"""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMG]?B?)\s*', text.upper())
+    if not match:
+        raise ValueError(f"大小格式错误: {text}")
+    return int(float(match.group(1)) * UNITS[match.group(2)])
+
+
+class SizeDistribution:
+    """文件大小分布：fixed:8MB / uniform:1MB:20MB / lognormal:8MB:0.8（中位数、标准差）"""
+    def __init__(self, spec):
+        kind, *args = spec.split(':')
+        if kind == 'fixed' and len(args) == 1:
+            self.params = (parse_bytes(args[0]),)
+        elif kind == 'uniform' and len(args) == 2:
+            self.params = (parse_bytes(args[0]), parse_bytes(args[1]))
+        elif kind == 'lognormal' and len(args) == 2:
+            self.params = (parse_bytes(args[0]), float(args[1]))
+        else:
+            raise ValueError(f"大小分布格式错误: {spec}")
+        self.kind = kind
+        self.spec = spec
+
+    def sample(self, rng):
+        if self.kind == 'fixed':
+            size = self.params[0]
+        elif self.kind == 'uniform':
+            size = rng.randint(*self.params)
+        else:
+            median, sigma = self.params
+            size = int(rng.lognormvariate(math.log(median), sigma))
+        return max(MIN_SIZE, size)
+
+
+def mp4_header(size):
+    """合成MP4的文件头，mdat使用64位扩展大小，延伸到文件末尾"""
+    ftyp = struct.pack('>I4s4sI4s4s', 24, b'ftyp', b'isom', 0x200, b'isom', b'mp42')
+    moov = struct.pack('>I4s8s', 16, b'moov', b'\0' * 8)
+    mdat = struct.pack('>I4sQ', 1, b'mdat', size - 40)
+    return ftyp + moov + mdat
+
+
+def payload(size, start, end):
+    """按块生成文件内容中 [start, end] 范围的字节（含end），不在内存中生成整个文件"""
+    header = mp4_header(size)
+    position = start
+    while position <= end:
+        if position < HEADER_SIZE:
+            chunk = header[position:min(end + 1, HEADER_SIZE)]
+        else:
+            offset = (position - HEADER_SIZE) % len(PATTERN)
+            chunk = PATTERN[offset:offset + min(SEND_CHUNK, end + 1 - position)]
+        yield chunk
+        position += len(chunk)
+
+
+class FakeCdn:
+    """模拟CDN的配置和统计"""
+    def __init__(self, sizes='lognormal:8MB:0.8', latency=0.0, jitter=0.0, bandwidth=0, total_bandwidth=0,
+                 p403=0.0, p429=0.0, p_reset=0.0, expires=0, seed=1):
+        """
+        :param sizes: 文件大小分布，见 SizeDistribution
+        :param latency: 返回响应头前的固定延迟（秒）
+        :param jitter: 额外的随机延迟上限（秒）
+        :param bandwidth: 每个连接的带宽上限（字节/秒），0表示不限
+        :param total_bandwidth: 服务端总带宽上限（字节/秒），0表示不限
+        :param p403/p429: 随机返回403/429的概率
+        :param p_reset: 传输中途随机断开连接（RST）的概率
+        :param expires: 签发的地址多少秒后过期（过期后返回403），0表示不过期
+        """
+        self.sizes = SizeDistribution(sizes)
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.total_limiter = BandwidthLimiter(rate=total_bandwidth)
+        self.p403 = p403
+        self.p429 = p429
+        self.p_reset = p_reset
+        self.expires = expires
+        self.seed = seed
+        self.base_url = ''
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def size_of(self, aweme_id):
+        return self.sizes.sample(random.Random(f"{self.seed}:{aweme_id}"))
+
+    def video_url(self, aweme_id):
+        url = f"{self.base_url}/video/{aweme_id}.mp4"
+        if self.expires:
+            url += f"?x-expires={int(time.time() + self.expires)}"
+        return url
+
+    def manifest(self, ids):
+        return [{'aweme_id': str(aweme_id), 'title': f"video_{aweme_id}", 'url': self.video_url(aweme_id),
+                 'data_size': self.size_of(aweme_id)} for aweme_id in ids]
+
+    def random(self):
+        with self._lock:
+            return self._rng.random()
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+
+    def stats_snapshot(self):
+        with self._lock:
+            return {str(key): value for key, value in self.stats.items()}
+
+
+class CdnHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支持长连接，和真实CDN一样可以复用连接
+    cdn = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', headers=None):
+        self.cdn.count(status)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        try:
+            if parts.path == '/manifest':
+                if 'ids' in query:
+                    ids = [value for value in query['ids'][0].split(',') if value]
+                else:
+                    start = int(query.get('start', ['1'])[0])
+                    ids = range(start, start + int(query.get('count', ['20'])[0]))
+                body = json.dumps(self.cdn.manifest(ids)).encode('utf-8')
+                return self._send(200, body, {'Content-Type': 'application/json'})
+            if parts.path == '/stats':
+                body = json.dumps(self.cdn.stats_snapshot()).encode('utf-8')
+                return self._send(200, body, {'Content-Type': 'application/json'})
+            match = VIDEO_PATH.match(parts.path)
+            if not match:
+                return self._send(404)
+            self._serve_video(match.group(1), query)
+        except (BrokenPipeError, ConnectionResetError, ssl.SSLError):
+            # 客户端中途断开（例如下载被取消）
+            self.close_connection = True
+
+    def _serve_video(self, aweme_id, query):
+        cdn = self.cdn
+        delay = cdn.latency + (cdn.random() * cdn.jitter if cdn.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        expires = (query.get('x-expires') or [''])[0]
+        if expires.isdigit() and int(expires) <= time.time():
+            cdn.count('expired')
+            return self._send(403)
+        roll = cdn.random()
+        if roll < cdn.p403:
+            return self._send(403)
+        if roll < cdn.p403 + cdn.p429:
+            return self._send(429, headers={'Retry-After': '1'})
+
+        size = cdn.size_of(aweme_id)
+        start, end = 0, size - 1
+        status = 200
+        headers = {'Content-Type': 'video/mp4', 'Accept-Ranges': 'bytes'}
+        range_header = self.headers.get('Range')
+        if range_header:
+            byte_range = self._parse_range(range_header, size)
+            if byte_range is None:
+                return self._send(416, headers={'Content-Range': f"bytes */{size}"})
+            start, end = byte_range
+            status = 206
+            headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+        length = end - start + 1
+        cdn.count(status)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+
+        # 需要中途断开时，随机选一个断开位置
+        cut = start + int(length * (0.1 + 0.8 * cdn.random())) if cdn.random() < cdn.p_reset else None
+        began = time.monotonic()
+        sent = 0
+        for chunk in payload(size, start, end):
+            if cut is not None and start + sent + len(chunk) > cut:
+                self.wfile.write(chunk[:cut - start - sent])
+                self._reset()
+                return
+            cdn.total_limiter.consume(len(chunk))
+            self.wfile.write(chunk)
+            sent += len(chunk)
+            cdn.count('bytes', len(chunk))
+            if cdn.bandwidth:
+                # 单连接限速：发送进度领先于限速时等待
+                ahead = sent / cdn.bandwidth - (time.monotonic() - began)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    @staticmethod
+    def _parse_range(header, size):
+        """解析 bytes=a-b / bytes=a- / bytes=-n，只支持单个范围，无效时返回None"""
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip())
+        if not match or match.groups() == ('', ''):
+            return None
+        first, last = match.groups()
+        if not first:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        return (start, end) if start <= end < size else None
+
+    def _reset(self):
+        """发送RST立即断开连接，模拟CDN或中间网络中途断流"""
+        self.cdn.count('reset')
+        self.close_connection = True
+        try:
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        except OSError:
+            pass
+        self.connection.close()
+
+
+def create_server(cdn, host='127.0.0.1', port=0, certfile=None, keyfile=None):
+    """创建服务（未启动），port为0时随机分配端口，地址写入 cdn.base_url"""
+    handler = type('Handler', (CdnHandler,), {'cdn': cdn})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    scheme = 'http'
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = 'https'
+    cdn.base_url = f"{scheme}://{host}:{server.server_address[1]}"
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟视频CDN")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="监听端口，0表示随机分配")
+    parser.add_argument("--sizes", default="lognormal:8MB:0.8",
+                        help="文件大小分布：fixed:8MB / uniform:1MB:20MB / lognormal:中位数:标准差")
+    parser.add_argument("--latency", type=float, default=0, help="响应头延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0, help="随机附加延迟上限（毫秒）")
+    parser.add_argument("--bandwidth", default="0", help="每个连接的带宽上限，例如 5MB（每秒），0表示不限")
+    parser.add_argument("--total-bandwidth", default="0", help="服务端总带宽上限，0表示不限")
+    parser.add_argument("--p403", type=float, default=0, help="随机返回403的概率")
+    parser.add_argument("--p429", type=float, default=0, help="随机返回429的概率")
+    parser.add_argument("--p-reset", type=float, default=0, help="传输中途断开连接的概率")
+    parser.add_argument("--expires", type=float, default=0, help="地址有效期（秒），0表示不过期")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子（决定文件大小和故障序列）")
+    parser.add_argument("--certfile", help="HTTPS证书（自签名证书需要客户端信任，例如设置 REQUESTS_CA_BUNDLE）")
+    parser.add_argument("--keyfile", help="HTTPS私钥")
+    args = parser.parse_args()
+
+    cdn = FakeCdn(sizes=args.sizes, latency=args.latency / 1000, jitter=args.jitter / 1000,
+                  bandwidth=parse_bytes(args.bandwidth), total_bandwidth=parse_bytes(args.total_bandwidth),
+                  p403=args.p403, p429=args.p429, p_reset=args.p_reset, expires=args.expires, seed=args.seed)
+    server = create_server(cdn, args.host, args.port, args.certfile, args.keyfile)
+    print(f"READY {cdn.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()